@@ -1,19 +1,81 @@
 """Google Gemini integration for generating stock insights and sentiment analysis."""
+import asyncio
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import google.generativeai as genai
-from typing import Dict, Optional
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 import config
+import metrics
+from insight_cache import CachedInsight, InsightCache, insight_key
+from rate_limiter import Priority, RequestScheduler
+
+
+SYSTEM_PREAMBLE = "You are an expert financial analyst specializing in Indian stock market analysis. " \
+                  "Provide clear, concise, and actionable insights."
+
+BATCH_INSTRUCTIONS = """You are a financial analyst. Analyze the scraped data for each stock below.
+For every stock provide:
+
+1. Bullish insights (2-3 key positive points)
+2. Bearish risks (2-3 key concerns)
+3. Overall sentiment (Positive/Neutral/Negative)
+4. Actionable summary in 2-4 lines
+
+Respond with ONLY a JSON object keyed by the stock IDs given below, where each value is
+{"bullish": [strings], "bearish": [strings], "sentiment": "Positive|Neutral|Negative", "summary": string}.
+Include every stock ID exactly once."""
+
+_JSON_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+# Bump when a prompt template changes so cached insights from the old prompt are not reused
+PROMPT_TEMPLATE_VERSION = "single-v1"
+BATCH_TEMPLATE_VERSION = "batch-v1"
+
+
+QUOTA_EXHAUSTED_MESSAGE = "⚠️ **Free Tier Quota Exhausted**\n\n" \
+                          "Your daily free tier quota (1,500 requests/day) has been exhausted.\n\n" \
+                          "**What to do:**\n" \
+                          "• Wait until midnight UTC for quota reset\n" \
+                          "• Check your usage: https://ai.dev/usage\n" \
+                          "• Consider upgrading to a paid plan for higher limits\n\n" \
+                          "The stock metrics above are still available!"
 
 
 class AIInsightsGenerator:
     """Generate AI-powered insights using Google Gemini API."""
     
-    def __init__(self):
-        """Initialize Gemini client."""
+    MAX_RETRIES = 3
+    INITIAL_RETRY_DELAY = 2
+    
+    MODEL_NAME = 'gemini-2.0-flash-lite'
+    
+    def __init__(self, max_workers: int = 8, cache: Optional[InsightCache] = None,
+                 scheduler: Optional[RequestScheduler] = None):
+        """
+        Initialize Gemini client.
+        
+        Args:
+            max_workers: Size of the thread pool that runs blocking Gemini SDK calls
+            cache: Persistent insight cache, or None to always call Gemini
+            scheduler: Client-side quota scheduler for async requests, or None for no limiting
+        """
         # Configure Gemini API
         genai.configure(api_key=config.GEMINI_API_KEY)
         
         # Initialize the model (using free tier: gemini-2.0-flash-lite)
-        self.model = genai.GenerativeModel('gemini-2.0-flash-lite')
+        self.model = genai.GenerativeModel(self.MODEL_NAME)
+        
+        # The Gemini SDK is synchronous, so async callers run it in this bounded pool
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gemini")
+        
+        self.cache = cache
+        self.scheduler = scheduler
+        # Cache keys with a background refresh in progress -> task/future
+        self._refreshing: Dict[str, object] = {}
+        self._refresh_lock = threading.Lock()
     
     def format_data_for_prompt(self, data: Dict[str, Optional[str]]) -> str:
         """
@@ -31,20 +93,78 @@ class AIInsightsGenerator:
                 formatted_lines.append(f"{key}: {value}")
         return "\n".join(formatted_lines)
     
-    def generate_insights(self, stock_name: str, data: Dict[str, Optional[str]]) -> Optional[str]:
+    def cache_key(self, data: Dict[str, Optional[str]], template_version: str = PROMPT_TEMPLATE_VERSION) -> str:
         """
-        Generate AI insights and sentiment analysis for stock data.
+        Content-addressed cache key for the insights of a set of metrics.
         
         Args:
-            stock_name: Name of the stock
             data: Scraped stock metrics
+            template_version: Version of the prompt template the insights come from
             
         Returns:
-            Formatted insights string or None on error
+            Hex digest of the model name, template version and normalized prompt data
         """
-        if "error" in data:
+        return insight_key(self.MODEL_NAME, template_version, self.format_data_for_prompt(data))
+    
+    def _cache_get(self, *keys: str) -> Optional[CachedInsight]:
+        """Return the youngest cached insight found under any of the keys."""
+        if self.cache is None:
             return None
+        best = None
+        for key in keys:
+            try:
+                cached = self.cache.get(key)
+            except Exception as e:
+                print(f"Error reading insight cache: {e}")
+                return None
+            # A fresh entry under one key (e.g. a batch refresh) beats a stale one under another
+            if cached is not None and (best is None or cached.age < best.age):
+                best = cached
+        if best is None:
+            metrics.inc("insight_cache_misses")
+        else:
+            metrics.inc("insight_cache_hits" if best.fresh else "insight_cache_stale_hits")
+        return best
+    
+    def _cache_set(self, key: str, text: str):
+        if self.cache is None:
+            return
+        try:
+            self.cache.set(key, text)
+        except Exception as e:
+            print(f"Error writing insight cache: {e}")
+    
+    def _start_refresh(self, key: str, start) -> None:
+        """Start a background refresh for key unless one is already running."""
+        with self._refresh_lock:
+            if key in self._refreshing:
+                return
+            handle = start()
+            self._refreshing[key] = handle
+        handle.add_done_callback(lambda _: self._refreshing.pop(key, None))
+    
+    def _refresh_sync(self, key: str, full_prompt: str):
+        try:
+            self._cache_set(key, self._generate(full_prompt))
+        except Exception as e:
+            print(f"Background insight refresh failed: {e}")
+    
+    async def _refresh_async(self, key: str, full_prompt: str):
+        text, _ = await self._generate_with_retries_async(full_prompt, priority=Priority.BACKGROUND)
+        if text is not None:
+            self._cache_set(key, text)
+    
+    def build_prompt(self, stock_name: str, data: Dict[str, Optional[str]]) -> str:
+        """
+        Build the full Gemini prompt for a stock.
         
+        Args:
+            stock_name: Name of the stock
+            data: Scraped stock metrics
+            
+        Returns:
+            Prompt including the system instructions
+        """
         formatted_data = self.format_data_for_prompt(data)
         
         prompt = f"""You are a financial analyst. Analyze the following scraped data for {stock_name}.
@@ -59,78 +179,475 @@ Data:
 {formatted_data}
 
 Format your response clearly with headings for each section."""
-
-        import time
         
-        max_retries = 3
-        retry_delay = 2
-        
-        for attempt in range(max_retries):
-            try:
-                # Create the full prompt with system instructions
-                full_prompt = f"""You are an expert financial analyst specializing in Indian stock market analysis. Provide clear, concise, and actionable insights.
+        # Create the full prompt with system instructions
+        return f"""{SYSTEM_PREAMBLE}
 
 {prompt}"""
+    
+    def build_batch_prompt(self, stocks: List[Tuple[str, str, Dict[str, Optional[str]]]]) -> str:
+        """
+        Build one prompt asking for structured insights on several stocks.
+        
+        Args:
+            stocks: List of (stock ID, stock name, scraped metrics)
+            
+        Returns:
+            Prompt including the system instructions
+        """
+        sections = [
+            f"### {stock_id}: {stock_name}\n{self.format_data_for_prompt(data)}"
+            for stock_id, stock_name, data in stocks
+        ]
+        return f"""{SYSTEM_PREAMBLE}
 
-                # Generate content using Gemini
-                response = self.model.generate_content(
-                    full_prompt,
-                    generation_config=genai.types.GenerationConfig(
-                        temperature=0.7,
-                        max_output_tokens=800,
-                    )
-                )
-                
-                return response.text.strip()
+{BATCH_INSTRUCTIONS}
+
+{chr(10).join(sections)}"""
+    
+    def parse_batch_response(self, text: str, stock_ids: List[str]) -> Dict[str, str]:
+        """
+        Split a batched JSON response into per-stock insight text.
+        
+        Args:
+            text: Raw model response
+            stock_ids: IDs that were asked for
+            
+        Returns:
+            Stock ID -> formatted insights, only for IDs with a usable section
+        """
+        try:
+            payload = json.loads(_JSON_FENCE_RE.sub("", text.strip()))
+        except ValueError:
+            return {}
+        if not isinstance(payload, dict):
+            return {}
+        
+        insights = {}
+        for stock_id in stock_ids:
+            section = payload.get(stock_id)
+            if not isinstance(section, dict) or not section.get("sentiment"):
+                continue
+            lines = ["**Bullish insights:**"]
+            lines.extend(f"• {point}" for point in section.get("bullish") or [])
+            lines.append("\n**Bearish risks:**")
+            lines.extend(f"• {point}" for point in section.get("bearish") or [])
+            lines.append(f"\n**Overall sentiment:** {section['sentiment']}")
+            if section.get("summary"):
+                lines.append(f"\n**Actionable summary:**\n{section['summary']}")
+            insights[stock_id] = "\n".join(lines)
+        return insights
+    
+    def _generation_config(self, max_output_tokens: int = 800, json_output: bool = False):
+        return genai.types.GenerationConfig(
+            temperature=0.7,
+            max_output_tokens=max_output_tokens,
+            response_mime_type="application/json" if json_output else None,
+        )
+    
+    def _generate(self, full_prompt: str, max_output_tokens: int = 800, json_output: bool = False) -> str:
+        """Run a single blocking Gemini request and return the response text."""
+        metrics.inc("gemini_requests")
+        with metrics.span("gemini"):
+            response = self.model.generate_content(
+                full_prompt,
+                generation_config=self._generation_config(max_output_tokens, json_output)
+            )
+            return response.text.strip()
+    
+    def _stream_to_queue(self, full_prompt: str, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue,
+                         cancelled: threading.Event):
+        """
+        Run a blocking streaming Gemini request, handing each chunk to the event loop.
+        
+        Stops reading the stream, without reporting anything, once cancelled is set.
+        """
+        metrics.inc("gemini_requests")
+        start = time.perf_counter()
+        try:
+            response = self.model.generate_content(
+                full_prompt,
+                generation_config=self._generation_config(),
+                stream=True
+            )
+            first = True
+            for chunk in response:
+                if cancelled.is_set():
+                    metrics.inc("gemini_streams_cancelled")
+                    return
+                if first:
+                    metrics.observe("gemini_first_chunk", time.perf_counter() - start)
+                    first = False
+                loop.call_soon_threadsafe(queue.put_nowait, ("chunk", chunk.text))
+            metrics.observe("gemini", time.perf_counter() - start)
+            loop.call_soon_threadsafe(queue.put_nowait, ("done", None))
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, ("error", e))
+    
+    def _handle_error(self, error_msg: str, attempt: int, retry_delay: float) -> Tuple[bool, Optional[str], float]:
+        """
+        Decide how to proceed after a failed Gemini request.
+        
+        Args:
+            error_msg: Text of the raised exception
+            attempt: Zero-based attempt number that failed
+            retry_delay: Current backoff delay in seconds
+            
+        Returns:
+            Tuple of (should_retry, result_if_not_retrying, delay_before_retry)
+        """
+        print(f"Error generating AI insights (attempt {attempt + 1}/{self.MAX_RETRIES}): {error_msg}")
+        metrics.inc("gemini_errors")
+        
+        # Check for rate limit errors (429) - retry with delay
+        if "429" in error_msg or "quota" in error_msg.lower() or "rate_limit" in error_msg.lower():
+            metrics.inc("gemini_rate_limited")
+            # Check if it's free tier quota exhausted
+            if "free_tier" in error_msg.lower() or ("limit: 0" in error_msg.lower() and "429" in error_msg):
+                metrics.inc("gemini_quota_exhausted")
+                print("Free tier daily quota exhausted.")
+                print("Free tier limits: 15 requests/minute, 1,500 requests/day.")
+                print("Quota resets at midnight UTC. Check usage: https://ai.dev/usage")
+                # Return a helpful message instead of None so bot can show it
+                return False, QUOTA_EXHAUSTED_MESSAGE, retry_delay
+            
+            if attempt < self.MAX_RETRIES - 1:
+                # Extract retry delay from error if available
+                if "retry in" in error_msg.lower():
+                    try:
+                        delay_match = re.search(r'retry in ([\d.]+)s', error_msg.lower())
+                        if delay_match:
+                            retry_delay = int(float(delay_match.group(1))) + 1
+                    except:
+                        pass
                 
+                print(f"Rate limit hit. Retrying in {retry_delay} seconds...")
+                metrics.inc("gemini_retries")
+                return True, None, retry_delay
+            else:
+                print("Gemini API rate limit exceeded after retries. Please wait and try again later.")
+                return False, None, retry_delay
+        elif "invalid" in error_msg.lower() or "401" in error_msg or "403" in error_msg:
+            print("Gemini API key is invalid. Please check your API key in .env file.")
+            return False, None, retry_delay
+        elif "safety" in error_msg.lower():
+            print("Content was blocked by safety filters. Try rephrasing the query.")
+            return False, None, retry_delay
+        else:
+            # For other errors, don't retry
+            print(f"Unexpected error: {error_msg}")
+            return False, None, retry_delay
+    
+    def generate_insights(self, stock_name: str, data: Dict[str, Optional[str]]) -> Optional[str]:
+        """
+        Generate AI insights and sentiment analysis for stock data.
+        
+        Args:
+            stock_name: Name of the stock
+            data: Scraped stock metrics
+            
+        Returns:
+            Formatted insights string or None on error
+        """
+        if "error" in data:
+            return None
+        
+        full_prompt = self.build_prompt(stock_name, data)
+        key = self.cache_key(data)
+        cached = self._cache_get(key)
+        if cached is not None:
+            if not cached.fresh:
+                # Serve the stale answer now and refresh it in the thread pool
+                self._start_refresh(key, lambda: self.executor.submit(self._refresh_sync, key, full_prompt))
+            return cached.text
+        
+        retry_delay = self.INITIAL_RETRY_DELAY
+        
+        for attempt in range(self.MAX_RETRIES):
+            try:
+                text = self._generate(full_prompt)
+                self._cache_set(key, text)
+                return text
             except Exception as e:
-                error_msg = str(e)
-                print(f"Error generating AI insights (attempt {attempt + 1}/{max_retries}): {error_msg}")
-                
-                # Check for rate limit errors (429) - retry with delay
-                if "429" in error_msg or "quota" in error_msg.lower() or "rate_limit" in error_msg.lower():
-                    # Check if it's free tier quota exhausted
-                    if "free_tier" in error_msg.lower() or ("limit: 0" in error_msg.lower() and "429" in error_msg):
-                        print("Free tier daily quota exhausted.")
-                        print("Free tier limits: 15 requests/minute, 1,500 requests/day.")
-                        print("Quota resets at midnight UTC. Check usage: https://ai.dev/usage")
-                        # Return a helpful message instead of None so bot can show it
-                        return "⚠️ **Free Tier Quota Exhausted**\n\n" \
-                               "Your daily free tier quota (1,500 requests/day) has been exhausted.\n\n" \
-                               "**What to do:**\n" \
-                               "• Wait until midnight UTC for quota reset\n" \
-                               "• Check your usage: https://ai.dev/usage\n" \
-                               "• Consider upgrading to a paid plan for higher limits\n\n" \
-                               "The stock metrics above are still available!"
-                    
-                    if attempt < max_retries - 1:
-                        # Extract retry delay from error if available
-                        if "retry in" in error_msg.lower():
-                            try:
-                                import re
-                                delay_match = re.search(r'retry in ([\d.]+)s', error_msg.lower())
-                                if delay_match:
-                                    retry_delay = int(float(delay_match.group(1))) + 1
-                            except:
-                                pass
-                        
-                        print(f"Rate limit hit. Retrying in {retry_delay} seconds...")
-                        time.sleep(retry_delay)
-                        retry_delay *= 2  # Exponential backoff
-                        continue
+                should_retry, result, retry_delay = self._handle_error(str(e), attempt, retry_delay)
+                if not should_retry:
+                    return result
+                time.sleep(retry_delay)
+                retry_delay *= 2  # Exponential backoff
+        
+        return None
+    
+    async def estimated_wait(self, chat_id=None, priority: Priority = Priority.INTERACTIVE) -> float:
+        """
+        Estimate seconds before a new Gemini request from a chat would be sent.
+        
+        Args:
+            chat_id: Telegram chat ID
+            priority: Request priority
+            
+        Returns:
+            Estimated queueing delay, 0 without a scheduler
+        """
+        if self.scheduler is None:
+            return 0.0
+        return await self.scheduler.estimate_wait(chat_id, priority)
+    
+    async def generate_insights_async(self, stock_name: str, data: Dict[str, Optional[str]], chat_id=None,
+                                      priority: Priority = Priority.INTERACTIVE) -> Optional[str]:
+        """
+        Async version of generate_insights for use inside the bot's event loop.
+        
+        The blocking SDK call runs in the generator's thread pool and retry
+        backoff uses asyncio.sleep, so other chats keep being served meanwhile.
+        Cached insights are returned straight away; stale ones are refreshed
+        by a background task.
+        
+        Args:
+            stock_name: Name of the stock
+            data: Scraped stock metrics
+            chat_id: Telegram chat the request is for (fair queuing across chats)
+            priority: Scheduler priority of the request
+            
+        Returns:
+            Formatted insights string or None on error
+        """
+        if "error" in data:
+            return None
+        
+        full_prompt = self.build_prompt(stock_name, data)
+        key = self.cache_key(data)
+        cached = self._cache_get(key)
+        if cached is not None:
+            if not cached.fresh:
+                self._start_refresh(key, lambda: asyncio.ensure_future(self._refresh_async(key, full_prompt)))
+            return cached.text
+        
+        text, failure = await self._generate_with_retries_async(full_prompt, chat_id, priority)
+        if text is not None:
+            self._cache_set(key, text)
+            return text
+        return failure
+    
+    async def _generate_with_retries_async(self, full_prompt: str, chat_id=None,
+                                           priority: Priority = Priority.INTERACTIVE,
+                                           **generate_kwargs) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Run a Gemini request in the thread pool, retrying rate limits with backoff.
+        
+        With a scheduler, every attempt first waits for its turn in the quota;
+        a request the scheduler sheds returns (None, None).
+        
+        Args:
+            full_prompt: Complete prompt
+            chat_id: Telegram chat the request is for
+            priority: Scheduler priority of the request
+            **generate_kwargs: Extra arguments for _generate
+            
+        Returns:
+            Tuple of (response text, None) on success or (None, failure result) otherwise
+        """
+        retry_delay = self.INITIAL_RETRY_DELAY
+        loop = asyncio.get_running_loop()
+        
+        for attempt in range(self.MAX_RETRIES):
+            if self.scheduler is not None and not await self._acquire_turn(chat_id, priority):
+                print("Gemini request shed to preserve quota for interactive queries")
+                return None, None
+            try:
+                text = await loop.run_in_executor(
+                    self.executor, lambda: self._generate(full_prompt, **generate_kwargs)
+                )
+                return text, None
+            except Exception as e:
+                should_retry, result, retry_delay = self._handle_error(str(e), attempt, retry_delay)
+                await self._report_to_scheduler(should_retry, result, retry_delay)
+                if not should_retry:
+                    return None, result
+                await asyncio.sleep(retry_delay)
+                retry_delay *= 2  # Exponential backoff
+        
+        return None, None
+    
+    async def _acquire_turn(self, chat_id, priority: Priority) -> bool:
+        """Wait for the scheduler to grant a request, recording the queueing time."""
+        with metrics.span("gemini_queue"):
+            granted = await self.scheduler.acquire(chat_id, priority)
+        if not granted:
+            metrics.inc("gemini_shed", priority=priority.name.lower())
+        return granted
+    
+    async def _report_to_scheduler(self, should_retry: bool, result: Optional[str], retry_delay: float):
+        """Let the scheduler hold back other chats' requests after a rate limit."""
+        if self.scheduler is None:
+            return
+        if result == QUOTA_EXHAUSTED_MESSAGE:
+            await self.scheduler.report_quota_exhausted()
+        elif should_retry:
+            await self.scheduler.report_rate_limited(retry_delay)
+    
+    async def stream_insights_async(self, stock_name: str, data: Dict[str, Optional[str]],
+                                    on_text: Callable[[str], Awaitable[None]], chat_id=None,
+                                    priority: Priority = Priority.INTERACTIVE) -> Optional[str]:
+        """
+        Generate insights with the streaming API, reporting text as it arrives.
+        
+        on_text is awaited with the accumulated text after every chunk (once
+        with the full text for a cache hit). Rate limits are retried only
+        before the first chunk; a stream that breaks later returns the text
+        received so far, which is not cached. Cancelling the call (e.g. when
+        a newer query supersedes it) stops reading the stream at the next chunk.
+        
+        Args:
+            stock_name: Name of the stock
+            data: Scraped stock metrics
+            on_text: Coroutine called with the text received so far
+            chat_id: Telegram chat the request is for
+            priority: Scheduler priority of the request
+            
+        Returns:
+            Full insights string, a failure message (quota exhausted) or None on error
+        """
+        if "error" in data:
+            return None
+        
+        full_prompt = self.build_prompt(stock_name, data)
+        key = self.cache_key(data)
+        cached = self._cache_get(key)
+        if cached is not None:
+            if not cached.fresh:
+                self._start_refresh(key, lambda: asyncio.ensure_future(self._refresh_async(key, full_prompt)))
+            await on_text(cached.text)
+            return cached.text
+        
+        retry_delay = self.INITIAL_RETRY_DELAY
+        loop = asyncio.get_running_loop()
+        
+        for attempt in range(self.MAX_RETRIES):
+            if self.scheduler is not None and not await self._acquire_turn(chat_id, priority):
+                print("Gemini request shed to preserve quota for interactive queries")
+                return None
+            
+            queue: asyncio.Queue = asyncio.Queue()
+            cancelled = threading.Event()
+            producer = loop.run_in_executor(
+                self.executor, self._stream_to_queue, full_prompt, loop, queue, cancelled
+            )
+            text = ""
+            error = None
+            try:
+                while True:
+                    kind, value = await queue.get()
+                    if kind == "chunk":
+                        text += value
+                        await on_text(text)
+                    elif kind == "error":
+                        error = value
+                        break
                     else:
-                        print("Gemini API rate limit exceeded after retries. Please wait and try again later.")
-                        return None
-                elif "invalid" in error_msg.lower() or "401" in error_msg or "403" in error_msg:
-                    print("Gemini API key is invalid. Please check your API key in .env file.")
-                    return None
-                elif "safety" in error_msg.lower():
-                    print("Content was blocked by safety filters. Try rephrasing the query.")
-                    return None
-                else:
-                    # For other errors, don't retry
-                    print(f"Unexpected error: {error_msg}")
-                    return None
+                        break
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            await producer
+            
+            if error is None:
+                text = text.strip()
+                self._cache_set(key, text)
+                return text
+            if text:
+                print(f"AI insights stream interrupted: {error}")
+                return text.strip()
+            
+            should_retry, result, retry_delay = self._handle_error(str(error), attempt, retry_delay)
+            await self._report_to_scheduler(should_retry, result, retry_delay)
+            if not should_retry:
+                return result
+            await asyncio.sleep(retry_delay)
+            retry_delay *= 2  # Exponential backoff
         
         return None
-
+    
+    async def generate_batch_insights_async(self, stocks: List[Tuple[str, Dict[str, Optional[str]]]],
+                                            batch_size: int = 5, chat_id=None) -> Dict[str, Optional[str]]:
+        """
+        Generate insights for several stocks with one Gemini request per batch.
+        
+        Each batch asks for per-stock JSON sections, so N stocks cost about
+        N / batch_size requests instead of N. Stocks whose section is missing
+        or unparsable fall back to a single generate_insights_async call; when
+        the batched request itself fails or is shed, its stocks get the failure.
+        Cached insights (from either prompt) are reused; stale ones are
+        returned and regenerated together in a background batch.
+        
+        Args:
+            stocks: List of (stock name, scraped metrics)
+            batch_size: Maximum stocks per request
+            chat_id: Telegram chat the request is for
+            
+        Returns:
+            Stock name -> insights string (or None on error), in input order
+        """
+        results: Dict[str, Optional[str]] = {}
+        valid = []
+        stale = []
+        for name, data in stocks:
+            if "error" in data:
+                results[name] = None
+                continue
+            cached = self._cache_get(self.cache_key(data), self.cache_key(data, BATCH_TEMPLATE_VERSION))
+            if cached is None:
+                valid.append((name, data))
+                continue
+            results[name] = cached.text
+            if not cached.fresh:
+                stale.append((name, data))
+        
+        if stale:
+            refresh_key = "batch:" + ",".join(self.cache_key(data) for _, data in stale)
+            self._start_refresh(
+                refresh_key, lambda: asyncio.ensure_future(
+                    self._generate_batches_async(stale, batch_size, chat_id, Priority.BACKGROUND)
+                )
+            )
+        
+        results.update(await self._generate_batches_async(valid, batch_size, chat_id, Priority.BATCH))
+        return {name: results.get(name) for name, _ in stocks}
+    
+    async def _generate_batches_async(self, valid: List[Tuple[str, Dict[str, Optional[str]]]],
+                                      batch_size: int, chat_id=None,
+                                      priority: Priority = Priority.BATCH) -> Dict[str, Optional[str]]:
+        """Generate and cache batched insights for stocks without usable cache entries."""
+        results: Dict[str, Optional[str]] = {}
+        for start in range(0, len(valid), batch_size):
+            chunk = valid[start:start + batch_size]
+            ids = [f"S{i + 1}" for i in range(len(chunk))]
+            prompt = self.build_batch_prompt([(stock_id, name, data) for stock_id, (name, data) in zip(ids, chunk)])
+            text, failure = await self._generate_with_retries_async(
+                prompt, chat_id, priority, max_output_tokens=min(8192, 400 * len(chunk) + 200), json_output=True
+            )
+            
+            if text is None:
+                # The request failed or was shed: single requests would only hit the same limits
+                for name, _ in chunk:
+                    results[name] = failure
+                continue
+            
+            parsed = self.parse_batch_response(text, ids)
+            if len(parsed) < len(chunk):
+                print(f"Batched insights incomplete ({len(parsed)}/{len(chunk)}), falling back to single requests")
+            for stock_id, (name, data) in zip(ids, chunk):
+                if stock_id in parsed:
+                    results[name] = parsed[stock_id]
+                    self._cache_set(self.cache_key(data, BATCH_TEMPLATE_VERSION), parsed[stock_id])
+                else:
+                    results[name] = await self.generate_insights_async(name, data, chat_id, priority)
+        
+        return results
+    
+    def close(self):
+        """Shut down the Gemini thread pool, the scheduler and the insight cache."""
+        self.executor.shutdown(wait=False)
+        if self.scheduler is not None:
+            self.scheduler.close()
+        if self.cache is not None:
+            self.cache.close()
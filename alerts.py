@@ -0,0 +1,267 @@
+"""Persistent price/metric alerts, evaluated incrementally as stocks are refreshed."""
+import os
+import re
+import sqlite3
+import threading
+import time
+from bisect import insort
+from typing import Callable, Dict, List, NamedTuple, Set, Tuple
+
+from history_store import METRIC_UNITS, format_value, parse_number
+from screening import resolve_metric
+from snapshot import StockSnapshot
+
+_ALERT_RE = re.compile(r"(?P<left>.+?)\s*(?P<op>>=|<=|>|<)\s*(?P<value>.+)")
+
+
+class AlertRule(NamedTuple):
+    id: int
+    chat_id: int
+    slug: str
+    field: str
+    op: str
+    threshold: float
+    created: float
+    
+    def matches(self, value: float) -> bool:
+        """Return True if a metric value satisfies the rule."""
+        if self.op == ">":
+            return value > self.threshold
+        if self.op == ">=":
+            return value >= self.threshold
+        if self.op == "<":
+            return value < self.threshold
+        return value <= self.threshold
+    
+    def describe(self) -> str:
+        """Return the condition as text, e.g. "Current Price < ₹2,400.00"."""
+        return f"{self.field} {self.op} {format_value(self.field, self.threshold)}"
+
+
+class AlertTrigger(NamedTuple):
+    rule: AlertRule
+    value: float
+    snapshot: StockSnapshot
+
+
+def parse_alert(text: str) -> Tuple[str, str, str, float]:
+    """
+    Parse an alert such as "RELIANCE price < 2400" or "INFY P/E > 30".
+    
+    The metric is the last words before the comparison and the stock is
+    everything before it; the number is read in the metric's unit, as on
+    Screener.in (ROE > 20 means 20%).
+    
+    Args:
+        text: Alert text
+        
+    Returns:
+        Tuple of (stock query, metric, operator, threshold)
+        
+    Raises:
+        ValueError: If the text is not a stock, a metric, a comparison and a number
+    """
+    match = _ALERT_RE.fullmatch(text.strip())
+    if match is None:
+        raise ValueError("Expected <stock> <metric> <, <=, > or >= <number>")
+    words = match.group("left").split()
+    for length in range(min(3, len(words) - 1), 0, -1):
+        field = resolve_metric(" ".join(words[-length:]))
+        if field is not None:
+            break
+    else:
+        raise ValueError(f"No metric found in '{match.group('left')}'")
+    threshold = parse_number(match.group("value"), METRIC_UNITS[field])
+    if threshold is None:
+        raise ValueError(f"Expected a number after {field} {match.group('op')}")
+    return " ".join(words[:-length]), field, match.group("op"), threshold
+
+
+class AlertStore:
+    """
+    Alert rules in SQLite, indexed in memory by slug and metric.
+    
+    For each (slug, metric) the rules are kept in two lists sorted by
+    threshold: one for ">"/">=" and one for "<"/"<=". A new value only walks
+    the end of each list whose thresholds it has crossed, so evaluating a
+    refreshed stock costs time in proportion to its triggered rules, however
+    many rules exist. Alerts are one-shot: a triggered rule is deleted.
+    
+    Replicas may share the database file. Each one picks up the rules the
+    others added or removed before it reads its index, and a rule that
+    fires on several replicas at once is reported by only one of them.
+    """
+    
+    def __init__(self, path: str = "alerts.sqlite3", clock: Callable[[], float] = time.time):
+        """
+        Open (or create) the alert database and load its rules.
+        
+        Args:
+            path: SQLite database file, or ":memory:"
+            clock: Wall-clock time source
+        """
+        self.path = path
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._rules: Dict[int, AlertRule] = {}
+        # slug -> metric -> (rules firing above a threshold, rules firing below one),
+        # each a list of (threshold, rule id) sorted by threshold
+        self._index: Dict[str, Dict[str, Tuple[List[Tuple[float, int]], List[Tuple[float, int]]]]] = {}
+        self.triggered = 0
+        # Changes when another connection commits to the database
+        self._data_version = None
+        
+        directory = os.path.dirname(path)
+        if directory and path != ":memory:":
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS alerts ("
+            " id INTEGER PRIMARY KEY,"
+            " chat_id INTEGER NOT NULL,"
+            " slug TEXT NOT NULL,"
+            " field TEXT NOT NULL,"
+            " op TEXT NOT NULL,"
+            " threshold REAL NOT NULL,"
+            " created REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS alerts_by_chat ON alerts (chat_id)")
+        self._sync()
+    
+    def _sync(self):
+        """Bring the index up to date with rules other replicas changed (caller holds the lock)."""
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._data_version:
+            return
+        self._data_version = version
+        rows = {row[0]: row for row in self._conn.execute(
+            "SELECT id, chat_id, slug, field, op, threshold, created FROM alerts")}
+        for rule_id in [rule_id for rule_id in self._rules if rule_id not in rows]:
+            self._unindex_rule(self._rules[rule_id])
+        for rule_id, row in rows.items():
+            if rule_id not in self._rules:
+                self._index_rule(AlertRule(*row))
+    
+    def _index_rule(self, rule: AlertRule):
+        self._rules[rule.id] = rule
+        above, below = self._index.setdefault(rule.slug, {}).setdefault(rule.field, ([], []))
+        insort(above if rule.op.startswith(">") else below, (rule.threshold, rule.id))
+    
+    def _unindex_rule(self, rule: AlertRule):
+        del self._rules[rule.id]
+        fields = self._index[rule.slug]
+        above, below = fields[rule.field]
+        (above if rule.op.startswith(">") else below).remove((rule.threshold, rule.id))
+        if not above and not below:
+            del fields[rule.field]
+            if not fields:
+                del self._index[rule.slug]
+    
+    def __len__(self) -> int:
+        return len(self._rules)
+    
+    def add(self, chat_id: int, slug: str, field: str, op: str, threshold: float) -> AlertRule:
+        """
+        Store a rule.
+        
+        Args:
+            chat_id: Chat to notify
+            slug: Company slug
+            field: Metric from METRIC_UNITS
+            op: One of >, >=, <, <=
+            threshold: Value in the metric's unit
+            
+        Returns:
+            The stored AlertRule
+        """
+        if field not in METRIC_UNITS or op not in (">", ">=", "<", "<="):
+            raise ValueError(f"Unsupported alert {field} {op}")
+        created = self._clock()
+        with self._lock:
+            rule_id = self._conn.execute(
+                "INSERT INTO alerts (chat_id, slug, field, op, threshold, created) VALUES (?, ?, ?, ?, ?, ?)",
+                (chat_id, slug, field, op, threshold, created),
+            ).lastrowid
+            rule = AlertRule(rule_id, chat_id, slug, field, op, threshold, created)
+            self._index_rule(rule)
+        return rule
+    
+    def remove(self, chat_id: int, rule_id: int) -> bool:
+        """Delete one of a chat's rules; returns False if the chat has no such rule."""
+        with self._lock:
+            self._sync()
+            rule = self._rules.get(rule_id)
+            if rule is None or rule.chat_id != chat_id:
+                return False
+            self._conn.execute("DELETE FROM alerts WHERE id = ?", (rule_id,))
+            self._unindex_rule(rule)
+        return True
+    
+    def for_chat(self, chat_id: int) -> List[AlertRule]:
+        """Return a chat's rules, oldest first."""
+        with self._lock:
+            self._sync()
+            ids = [row[0] for row in self._conn.execute(
+                "SELECT id FROM alerts WHERE chat_id = ? ORDER BY id", (chat_id,))]
+            return [self._rules[rule_id] for rule_id in ids if rule_id in self._rules]
+    
+    def slugs(self) -> Set[str]:
+        """Return the slugs that have rules."""
+        with self._lock:
+            self._sync()
+            return set(self._index)
+    
+    def evaluate(self, snapshot: StockSnapshot) -> List[AlertTrigger]:
+        """
+        Check a refreshed stock against its rules, removing the ones that fire.
+        
+        Args:
+            snapshot: Freshly scraped metrics of one stock
+            
+        Returns:
+            Triggered rules with the values that fired them
+        """
+        triggers = []
+        with self._lock:
+            self._sync()
+            for field, (above, below) in list(self._index.get(snapshot.slug, {}).items()):
+                value = snapshot.get(field)
+                if value is None:
+                    continue
+                fired = []
+                # Thresholds at or under the value, from the lowest up
+                for threshold, rule_id in above:
+                    if threshold > value:
+                        break
+                    fired.append(rule_id)
+                # Thresholds at or over the value, from the highest down
+                for threshold, rule_id in reversed(below):
+                    if threshold < value:
+                        break
+                    fired.append(rule_id)
+                for rule_id in fired:
+                    rule = self._rules[rule_id]
+                    # Strict comparisons do not fire exactly at the threshold
+                    if rule.matches(value):
+                        triggers.append(AlertTrigger(rule, value, snapshot))
+            claimed = []
+            for trigger in triggers:
+                self._unindex_rule(trigger.rule)
+                # Another replica that saw the same value may have deleted (and reported) it first
+                if self._conn.execute("DELETE FROM alerts WHERE id = ?", (trigger.rule.id,)).rowcount:
+                    claimed.append(trigger)
+            self.triggered += len(claimed)
+        return claimed
+    
+    def stats(self) -> Dict[str, int]:
+        """Return rule and stock counts and how many rules have fired."""
+        with self._lock:
+            self._sync()
+            return {"rules": len(self._rules), "stocks": len(self._index), "triggered": self.triggered}
+    
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,49 @@
+"""
+Batch throughput benchmark for ScreenerScraper.get_many.
+
+Fetches a watchlist of distinct tickers from the local Screener.in stand-in
+at several per-host concurrency caps and reports wall time and throughput.
+
+Usage:
+    python -m benchmarks.bench_batch --tickers 40 --caps 1 4 8 16 --page-delay 0.2
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.stub_server import StubScreenerServer
+from benchmarks.universe import stock_mapping, synthetic_companies
+from scraper import ScreenerScraper
+
+
+async def run(args):
+    companies = synthetic_companies(max(args.tickers, 50))[:args.tickers]
+    queries = [symbol for _, symbol in companies]
+    with StubScreenerServer(delay=args.page_delay) as server:
+        print(f"{args.tickers} tickers, {args.page_delay * 1000:.0f} ms per page")
+        print(f"{'cap':>4} {'wall s':>8} {'pages/s':>8} {'ideal s':>8} {'requests':>9}")
+        for cap in args.caps:
+            scraper = ScreenerScraper(max_concurrency=cap)
+            scraper.BASE_URL = server.base_url
+            scraper.stock_mapping = stock_mapping(companies)
+            before = server.request_count
+            start = time.perf_counter()
+            results = await scraper.get_many(queries)
+            wall = time.perf_counter() - start
+            failed = sum(1 for data in results.values() if "error" in data)
+            ideal = -(-args.tickers // cap) * args.page_delay
+            print(f"{cap:>4} {wall:>8.2f} {args.tickers / wall:>8.1f} {ideal:>8.2f} "
+                  f"{server.request_count - before:>9}{'  (' + str(failed) + ' failed)' if failed else ''}")
+            await scraper.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tickers", type=int, default=40)
+    parser.add_argument("--caps", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--page-delay", type=float, default=0.2)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
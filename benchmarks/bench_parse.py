@@ -0,0 +1,212 @@
+"""
+Per-page parse benchmark on saved company pages.
+
+Compares the original extraction (every metric synonym re-scanning the whole
+soup through the extract_* helpers below) with the single-pass PageIndex
+extractor, for both the extraction step alone and the full parse.
+
+Usage:
+    python -m benchmarks.bench_parse --repeat 20
+"""
+import argparse
+import glob
+import os
+import re
+import statistics
+import time
+from typing import Optional
+
+from bs4 import BeautifulSoup
+
+from benchmarks.stub_server import FIXTURES_DIR
+from extractor import METRIC_SYNONYMS, extract_metrics
+
+
+def extract_value(soup: BeautifulSoup, label: str) -> Optional[str]:
+    """
+    Extract a value from the company page by label.
+    
+    Args:
+        soup: BeautifulSoup object of the page
+        label: Label text to search for
+        
+    Returns:
+        Value as string or None
+    """
+    try:
+        # Find the label element
+        label_elem = soup.find("span", string=re.compile(label, re.I))
+        if label_elem:
+            # Find the next sibling or parent's next sibling that contains the value
+            parent = label_elem.find_parent()
+            if parent:
+                value_elem = parent.find("span", class_="number")
+                if value_elem:
+                    return value_elem.get_text(strip=True)
+                # Alternative: look for next sibling
+                next_sibling = parent.find_next_sibling()
+                if next_sibling:
+                    value_elem = next_sibling.find("span", class_="number")
+                    if value_elem:
+                        return value_elem.get_text(strip=True)
+    except Exception as e:
+        print(f"Error extracting {label}: {e}")
+    return None
+
+
+def extract_from_table(soup: BeautifulSoup, row_label: str) -> Optional[str]:
+    """
+    Extract value from a table row by label.
+    
+    Args:
+        soup: BeautifulSoup object
+        row_label: Label in the table row
+        
+    Returns:
+        Value as string or None
+    """
+    try:
+        # Find table rows
+        rows = soup.find_all("tr")
+        for row in rows:
+            cells = row.find_all("td")
+            if len(cells) >= 2:
+                if row_label.lower() in cells[0].get_text(strip=True).lower():
+                    value = cells[1].get_text(strip=True)
+                    return value if value else None
+    except Exception as e:
+        print(f"Error extracting from table {row_label}: {e}")
+    return None
+
+
+def extract_from_key_metrics(soup: BeautifulSoup, label: str) -> Optional[str]:
+    """
+    Extract value from key metrics section using various selectors.
+    
+    Args:
+        soup: BeautifulSoup object
+        label: Label to search for
+        
+    Returns:
+        Value as string or None
+    """
+    # Try multiple strategies to find the metric
+    strategies = [
+        # Strategy 1: Look for data attributes
+        lambda: soup.find(attrs={"data-name": re.compile(label, re.I)}),
+        # Strategy 2: Look for spans with specific classes
+        lambda: soup.find("span", string=re.compile(f"^{label}", re.I)),
+        # Strategy 3: Look in key metrics divs
+        lambda: soup.find("div", class_=re.compile("key-metric", re.I)),
+    ]
+    
+    for strategy in strategies:
+        try:
+            elem = strategy()
+            if elem:
+                # Try to find value near the element
+                parent = elem.find_parent()
+                if parent:
+                    # Look for number class
+                    value_elem = parent.find(class_=re.compile("number|value", re.I))
+                    if value_elem:
+                        return value_elem.get_text(strip=True)
+                    # Look for next sibling
+                    next_elem = parent.find_next_sibling()
+                    if next_elem:
+                        value_elem = next_elem.find(class_=re.compile("number|value", re.I))
+                        if value_elem:
+                            return value_elem.get_text(strip=True)
+        except:
+            continue
+    
+    return None
+
+
+def legacy_extract(soup: BeautifulSoup) -> dict:
+    """The metric loop scrape_company_data used before the single-pass extractor."""
+    data = {}
+    name_elem = soup.find("h1")
+    if name_elem:
+        data["Company Name"] = name_elem.get_text(strip=True)
+    
+    price_elem = soup.find("span", id="top-price")
+    if not price_elem:
+        price_elem = soup.find("span", class_=re.compile("price", re.I))
+    if not price_elem:
+        price_elem = soup.find(string=re.compile("Current Price", re.I))
+        if price_elem:
+            parent = price_elem.find_parent()
+            if parent:
+                price_elem = parent.find_next_sibling()
+    if price_elem:
+        price_text = price_elem.get_text(strip=True) if hasattr(price_elem, 'get_text') else str(price_elem)
+        price_text = re.sub(r'[^\d.,]', '', price_text)
+        if price_text:
+            data["Current Price"] = f"₹{price_text}"
+    
+    for metric_key, search_terms in METRIC_SYNONYMS.items():
+        value = None
+        for term in search_terms:
+            value = (extract_from_key_metrics(soup, term) or
+                     extract_value(soup, term) or
+                     extract_from_table(soup, term))
+            if value:
+                break
+        if value:
+            data[metric_key] = value
+    
+    if "High / Low" not in data or not data["High / Low"]:
+        high = low = None
+        for term in ["High", "52W High"]:
+            high = extract_from_table(soup, term) or extract_value(soup, term)
+            if high:
+                break
+        for term in ["Low", "52W Low"]:
+            low = extract_from_table(soup, term) or extract_value(soup, term)
+            if low:
+                break
+        if high and low:
+            data["High / Low"] = f"{high} / {low}"
+    return data
+
+
+def time_call(func, repeat: int) -> float:
+    """Return the median wall time of func() in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--fixtures", default=FIXTURES_DIR)
+    parser.add_argument("--show-diff", action="store_true", help="Print metrics where the two extractors disagree")
+    args = parser.parse_args()
+    
+    print(f"{'page':<14} {'KB':>5} {'soup ms':>8} {'old ext ms':>11} {'new ext ms':>11} {'old total':>10} {'new total':>10} {'speedup':>8}")
+    for path in sorted(glob.glob(os.path.join(args.fixtures, "*.html"))):
+        with open(path, "rb") as f:
+            content = f.read()
+        soup = BeautifulSoup(content, "lxml")
+        
+        soup_ms = time_call(lambda: BeautifulSoup(content, "lxml"), args.repeat)
+        old_ms = time_call(lambda: legacy_extract(soup), args.repeat)
+        new_ms = time_call(lambda: extract_metrics(soup), args.repeat)
+        name = os.path.splitext(os.path.basename(path))[0]
+        print(f"{name:<14} {len(content) // 1024:>5} {soup_ms:>8.2f} {old_ms:>11.2f} {new_ms:>11.2f} "
+              f"{soup_ms + old_ms:>10.2f} {soup_ms + new_ms:>10.2f} {(soup_ms + old_ms) / (soup_ms + new_ms):>7.1f}x")
+        
+        if args.show_diff:
+            old, new = legacy_extract(soup), extract_metrics(soup)
+            for key in sorted(set(old) | set(new)):
+                if old.get(key) != new.get(key):
+                    print(f"    {key}: {old.get(key)!r} -> {new.get(key)!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Symbol lookup benchmark for ScreenerScraper.search_stock.
+
+Times exact, prefix, in-sentence and misspelt queries against the Nifty 50
+and a synthetic universe of listed companies, for the indexed resolver and
+the original linear scan.
+
+Usage:
+    python -m benchmarks.bench_search --sizes 50 5000
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks.universe import NIFTY_50, stock_mapping, synthetic_companies
+from symbol_index import SymbolResolver
+
+QUERIES = ["tcs", "reliance", "HDFC Bank", "infosis", "relianse", "tata mot", "kotak", "tcs share price", "a", "xyzzy"]
+
+
+def linear_search(mapping, query):
+    """The partial-match scan search_stock used before the resolver."""
+    query_lower = query.lower().strip()
+    if query_lower in mapping:
+        return mapping[query_lower]
+    for term, stock_info in mapping.items():
+        if (query_lower in term or term in query_lower or
+                query_lower in stock_info['name'].lower() or
+                query_lower in stock_info['symbol'].lower() or
+                stock_info['symbol'].lower() in query_lower):
+            return stock_info
+    return None
+
+
+def time_us(func, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 5000])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    
+    for size in args.sizes:
+        companies = NIFTY_50[:size] if size <= len(NIFTY_50) else synthetic_companies(size)
+        mapping = stock_mapping(companies)
+        start = time.perf_counter()
+        resolver = SymbolResolver(mapping)
+        build_ms = (time.perf_counter() - start) * 1000
+        print(f"\nuniverse={len(resolver)} stocks, index build {build_ms:.1f} ms")
+        print(f"{'query':<18} {'resolve us':>10} {'suggest us':>10} {'linear us':>10}  {'resolved':<12} {'old scan':<12} top suggestions")
+        for query in QUERIES:
+            resolved = resolver.resolve(query)
+            old = linear_search(mapping, query)
+            top = ", ".join(f"{s['symbol']}:{score:.2f}" for s, score in resolver.suggest(query, 3))
+            print(f"{query:<18} {time_us(lambda: resolver.resolve(query), args.repeat):>10.1f} "
+                  f"{time_us(lambda: resolver.suggest(query, 5), args.repeat):>10.1f} "
+                  f"{time_us(lambda: linear_search(mapping, query), args.repeat):>10.1f}  "
+                  f"{(resolved or {}).get('symbol', '-'):<12} {(old or {}).get('symbol', '-'):<12} {top}")
+
+
+if __name__ == "__main__":
+    main()
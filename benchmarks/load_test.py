@@ -0,0 +1,180 @@
+"""
+Load test for FinSightBot.handle_message with many simultaneous chats.
+
+Runs the real handler against a local Screener.in stand-in and a fake Gemini
+model with fixed latency, with the blocking (sync) pipeline, the async
+pipeline and the async pipeline streaming insights, and prints per-request
+latency, time to the first insight text and Telegram API calls per query at
+each concurrency.
+
+Usage:
+    python -m benchmarks.load_test --chats 1 10 50 --page-delay 0.2 --gemini-latency 0.3
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import time
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+# Every chat must reach the fake model, not the insight cache
+os.environ.setdefault("INSIGHT_CACHE_PATH", "")
+os.environ.setdefault("HISTORY_DB_PATH", "")
+os.environ.setdefault("ALERTS_DB_PATH", "")
+# Every simulated chat should run its pipeline rather than get a "busy" reply
+os.environ.setdefault("MAX_INFLIGHT_QUERIES", "0")
+
+import config  # noqa: E402
+from benchmarks.stub_server import StubScreenerServer  # noqa: E402
+from bot import FinSightBot  # noqa: E402
+
+FAKE_INSIGHTS = [
+    "**Bullish insights:**\n- ok\n\n",
+    "**Bearish risks:**\n- none\n\n",
+    "**Overall sentiment:** Neutral\n\n",
+    "**Actionable summary:**\nHold.",
+]
+
+
+class FakeGeminiResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGeminiModel:
+    """Stand-in for genai.GenerativeModel with a fixed blocking latency."""
+    
+    def __init__(self, latency: float):
+        self.latency = latency
+    
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        if stream:
+            return self._stream()
+        time.sleep(self.latency)
+        return FakeGeminiResponse("".join(FAKE_INSIGHTS))
+    
+    def _stream(self):
+        # The total latency is spread over the chunks, as with a real streamed response
+        for chunk in FAKE_INSIGHTS:
+            time.sleep(self.latency / len(FAKE_INSIGHTS))
+            yield FakeGeminiResponse(chunk)
+
+
+class FakeMessage:
+    """Minimal telegram.Message replacement that records when insights first appear."""
+    
+    def __init__(self, text: str = "", update=None):
+        self.text = text
+        self.update = update
+    
+    def _record(self, text: str):
+        if self.update is not None and self.update.first_insight is None and "Bullish" in text:
+            self.update.first_insight = time.perf_counter()
+    
+    async def reply_text(self, text, **kwargs):
+        self._record(text)
+        if self.update is not None:
+            self.update.telegram_calls += 1
+        return FakeMessage(text, self.update)
+    
+    async def edit_text(self, text, **kwargs):
+        self._record(text)
+        if self.update is not None:
+            self.update.telegram_calls += 1
+        return self
+
+
+class FakeChat:
+    def __init__(self, chat_id: int):
+        self.id = chat_id
+
+
+class FakeUpdate:
+    def __init__(self, text: str, chat_id: int = 0):
+        self.message = FakeMessage(text, self)
+        self.effective_chat = FakeChat(chat_id)
+        self.first_insight = None
+        self.telegram_calls = 0
+
+
+def build_bot(base_url: str, gemini_latency: float, blocking: bool) -> FinSightBot:
+    """Create a bot wired to the stub server and the fake model."""
+    bot = FinSightBot()
+    bot.scraper.BASE_URL = base_url
+    bot.scraper.stock_mapping = {
+        "reliance": {"slug": "RELIANCE", "name": "Reliance Industries Ltd", "symbol": "RELIANCE"},
+    }
+    bot.ai_generator.model = FakeGeminiModel(gemini_latency)
+    # The fake model has no quota, so measure the pipeline without client-side limiting
+    bot.ai_generator.scheduler = None
+    
+    if blocking:
+        # Reproduce the old pipeline: synchronous calls made directly on the event loop
+        async def get_stock_data_blocking(query):
+            return bot.scraper.get_stock_data(query)
+        
+        async def generate_insights_blocking(stock_name, data, chat_id=None):
+            return bot.ai_generator.generate_insights(stock_name, data)
+        
+        bot.scraper.get_stock_data_async = get_stock_data_blocking
+        bot.ai_generator.generate_insights_async = generate_insights_blocking
+    return bot
+
+
+async def run_chats(bot: FinSightBot, chats: int):
+    """
+    Fire one query per chat at the same time.
+    
+    Returns sorted per-request latencies, sorted times to the first insight
+    text, the mean number of Telegram API calls per query and the wall time.
+    """
+    start = time.perf_counter()
+    
+    async def one_chat(chat_id: int):
+        # Latency is measured from the shared arrival time, so queueing counts
+        update = FakeUpdate("reliance", chat_id)
+        await bot.handle_message(update, None)
+        first = (update.first_insight or time.perf_counter()) - start
+        return time.perf_counter() - start, first, update.telegram_calls
+    
+    results = await asyncio.gather(*(one_chat(chat_id) for chat_id in range(chats)))
+    latencies = sorted(total for total, _, _ in results)
+    first_insights = sorted(first for _, first, _ in results)
+    calls = statistics.mean(count for _, _, count in results)
+    return latencies, first_insights, calls, time.perf_counter() - start
+
+
+def percentile(values, pct: float) -> float:
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+async def main_async(args):
+    logging.getLogger().setLevel(logging.WARNING)
+    with StubScreenerServer(delay=args.page_delay) as server:
+        print(f"{'mode':<9} {'chats':>5} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'1st AI p50':>11} "
+              f"{'calls/q':>8} {'wall s':>8}")
+        for mode in ("blocking", "async", "stream"):
+            config.STREAM_INSIGHTS = mode == "stream"
+            bot = build_bot(server.base_url, args.gemini_latency, blocking=(mode == "blocking"))
+            for chats in args.chats:
+                latencies, first_insights, calls, wall = await run_chats(bot, chats)
+                print(f"{mode:<9} {chats:>5} {statistics.median(latencies) * 1000:>9.1f} "
+                      f"{percentile(latencies, 95) * 1000:>9.1f} {latencies[-1] * 1000:>9.1f} "
+                      f"{statistics.median(first_insights) * 1000:>11.1f} {calls:>8.1f} {wall:>8.2f}")
+            await bot.scraper.aclose()
+            bot.ai_generator.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chats", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--page-delay", type=float, default=0.2, help="Stub server latency per page (s)")
+    parser.add_argument("--gemini-latency", type=float, default=0.3, help="Fake Gemini latency per call (s)")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
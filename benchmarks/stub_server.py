@@ -0,0 +1,151 @@
+"""Local stand-in for Screener.in that serves saved company pages."""
+import gzip
+import hashlib
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+class StubScreenerServer:
+    """
+    Serve /company/<slug>/ from HTML fixtures with an optional artificial delay.
+    
+    Like the real site, pages carry an ETag, conditional requests get a 304
+    and gzip is used when the client accepts it. fail_next() makes upcoming
+    requests return an error status for retry and circuit breaker runs.
+    """
+    
+    def __init__(self, fixtures_dir: str = FIXTURES_DIR, delay: float = 0.0,
+                 default_fixture: Optional[str] = "RELIANCE", compress: bool = True,
+                 etags: bool = True):
+        """
+        Initialize the server.
+        
+        Args:
+            fixtures_dir: Directory containing <SLUG>.html files
+            delay: Seconds to wait before answering each request
+            default_fixture: Slug served for unknown companies, or None to return 404
+            compress: Gzip pages for clients sending Accept-Encoding: gzip
+            etags: Send ETags and answer If-None-Match with 304
+        """
+        self.fixtures_dir = fixtures_dir
+        self.delay = delay
+        self.default_fixture = default_fixture
+        self.compress = compress
+        self.etags = etags
+        self.request_count = 0
+        self.not_modified_count = 0
+        self.bytes_sent = 0
+        self._failures = []
+        self._pages = {}
+        self._lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+    
+    def _load_page(self, slug: str) -> Optional[tuple]:
+        """Return (body, gzipped body, etag) for a slug, reading each file only once."""
+        with self._lock:
+            if slug not in self._pages:
+                path = os.path.join(self.fixtures_dir, f"{slug}.html")
+                if os.path.exists(path):
+                    with open(path, "rb") as f:
+                        body = f.read()
+                    etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+                    self._pages[slug] = (body, gzip.compress(body, 6), etag)
+                else:
+                    self._pages[slug] = None
+            return self._pages[slug]
+    
+    def fail_next(self, count: int, status: int = 503, retry_after: Optional[str] = None):
+        """Answer the next count requests with an error status (and optional Retry-After)."""
+        with self._lock:
+            self._failures.extend([(status, retry_after)] * count)
+    
+    def _make_handler(self):
+        server = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are separate writes; without this, delayed ACKs add ~40 ms per keep-alive request
+            disable_nagle_algorithm = True
+            
+            def _empty_response(self, status: int, headers: Optional[dict] = None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            
+            def do_GET(self):
+                with server._lock:
+                    server.request_count += 1
+                    failure = server._failures.pop(0) if server._failures else None
+                parts = [p for p in self.path.split("?")[0].split("/") if p]
+                page = None
+                if len(parts) >= 2 and parts[0] == "company":
+                    page = server._load_page(parts[1])
+                    if page is None and server.default_fixture:
+                        page = server._load_page(server.default_fixture)
+                if server.delay:
+                    time.sleep(server.delay)
+                if failure is not None:
+                    status, retry_after = failure
+                    self._empty_response(status, {"Retry-After": retry_after} if retry_after else None)
+                    return
+                if page is None:
+                    self._empty_response(404)
+                    return
+                body, gzipped, etag = page
+                if server.etags and self.headers.get("If-None-Match") == etag:
+                    with server._lock:
+                        server.not_modified_count += 1
+                    self._empty_response(304, {"ETag": etag})
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                if server.etags:
+                    self.send_header("ETag", etag)
+                if server.compress and "gzip" in self.headers.get("Accept-Encoding", ""):
+                    body = gzipped
+                    self.send_header("Content-Encoding", "gzip")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with server._lock:
+                    server.bytes_sent += len(body)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        return Handler
+    
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def start(self) -> str:
+        """Start serving on a free local port and return the base URL."""
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+    
+    def stop(self):
+        """Stop the server."""
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+    
+    def __enter__(self):
+        self.start()
+        return self
+    
+    def __exit__(self, *exc):
+        self.stop()
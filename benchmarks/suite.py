@@ -0,0 +1,267 @@
+"""
+Offline benchmark suite for the scraping hot paths.
+
+Runs entirely against the saved pages in benchmarks/fixtures (including
+degraded layouts: missing or reordered ratios, a legacy ratios table, a
+truncated page, non-breaking-space labels and a login wall) served by the
+local Screener.in stand-in. Reports per-stage timings for search_stock,
+fetch, BeautifulSoup parse and metric extraction, plus end-to-end
+get_stock_data_async throughput at several concurrency levels (cold, and
+revalidating expired pages with conditional requests), and can export
+everything as JSON to compare runs across commits.
+
+Usage:
+    python -m benchmarks.suite --json bench.json
+    python -m benchmarks.suite --quick --compare bench.json
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+
+from bs4 import BeautifulSoup
+
+from benchmarks.bench_search import QUERIES
+from benchmarks.stub_server import FIXTURES_DIR, StubScreenerServer
+from http_fetch import Validators
+from benchmarks.universe import stock_mapping, synthetic_companies
+from extractor import METRIC_SYNONYMS, extract_metrics, extract_metrics_fast
+from scraper import ScreenerScraper
+
+# Metrics a complete page yields (Company Name and Current Price included)
+EXPECTED_METRICS = len(METRIC_SYNONYMS) + 2
+
+
+def sample_ms(func: Callable[[], object], repeat: int) -> Dict[str, float]:
+    """Time func() repeat times and return median/p95/min in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "median_ms": round(statistics.median(samples), 4),
+        "p95_ms": round(samples[min(len(samples) - 1, int(0.95 * len(samples)))], 4),
+        "min_ms": round(samples[0], 4),
+    }
+
+
+def load_fixtures(fixtures_dir: str) -> Dict[str, bytes]:
+    """Return slug -> page bytes for every fixture."""
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(fixtures_dir, "*.html"))):
+        with open(path, "rb") as f:
+            pages[os.path.splitext(os.path.basename(path))[0]] = f.read()
+    return pages
+
+
+def bench_search(universe_size: int, repeat: int) -> Dict[str, Dict[str, float]]:
+    """Time search_stock for a mix of exact, partial and misspelt queries."""
+    scraper = ScreenerScraper()
+    scraper.stock_mapping = stock_mapping(synthetic_companies(universe_size))
+    results = {}
+    for query in QUERIES:
+        results[query] = sample_ms(lambda: scraper.search_stock(query), repeat)
+    return results
+
+
+def bench_pages(pages: Dict[str, bytes], base_url: str, repeat: int) -> Dict[str, Dict]:
+    """Time fetch, conditional re-fetch, parse and extraction separately for every fixture."""
+    scraper = ScreenerScraper()
+    results = {}
+    for slug, content in pages.items():
+        url = f"{base_url}/company/{slug}/"
+        soup = BeautifulSoup(content, "lxml")
+        metrics = extract_metrics(soup)
+        response = scraper.session.get(url, timeout=scraper.timeout)
+        conditional = Validators.from_headers(response.headers)
+        conditional = conditional.request_headers() if conditional else {}
+        results[slug] = {
+            "bytes": len(content),
+            "wire_bytes": response.raw.tell(),
+            "metrics_found": len(metrics),
+            "metrics_missing": EXPECTED_METRICS - len(metrics),
+            "fetch": sample_ms(lambda: scraper.session.get(url, timeout=scraper.timeout).content, repeat),
+            "revalidate": sample_ms(
+                lambda: scraper.session.get(url, headers=conditional, timeout=scraper.timeout).content, repeat
+            ),
+            "parse": sample_ms(lambda: BeautifulSoup(content, "lxml"), repeat),
+            "extract": sample_ms(lambda: extract_metrics(soup), repeat),
+            "fast_parse": sample_ms(lambda: extract_metrics_fast(content), repeat),
+            "fast_path": extract_metrics_fast(content) is not None,
+        }
+    return results
+
+
+async def bench_throughput(server: StubScreenerServer, levels: List[int], requests_per_level: int,
+                           parse_processes: int = 0) -> List[Dict]:
+    """
+    Run get_stock_data_async for distinct tickers with N callers at a time.
+    
+    Each level runs twice: with a cold cache, then after the page cache has
+    expired so every page is revalidated with a conditional request.
+    """
+    companies = synthetic_companies(max(requests_per_level, 50))[:requests_per_level]
+    queries = [symbol for _, symbol in companies]
+    results = []
+    for level in levels:
+        scraper = ScreenerScraper(max_concurrency=level, parse_processes=parse_processes)
+        scraper.BASE_URL = server.base_url
+        scraper.stock_mapping = stock_mapping(companies)
+        semaphore = asyncio.Semaphore(level)
+        
+        for mode in ("cold", "revalidate"):
+            if mode == "revalidate":
+                scraper.page_cache.clear()
+            latencies = []
+            
+            async def one(query: str):
+                async with semaphore:
+                    start = time.perf_counter()
+                    data = await scraper.get_stock_data_async(query)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    return "error" not in data
+            
+            bytes_before = server.bytes_sent
+            start = time.perf_counter()
+            ok = await asyncio.gather(*(one(q) for q in queries))
+            wall = time.perf_counter() - start
+            latencies.sort()
+            results.append({
+                "concurrency": level,
+                "mode": mode,
+                "requests": len(queries),
+                "failed": ok.count(False),
+                "kb_transferred": round((server.bytes_sent - bytes_before) / 1024, 1),
+                "wall_s": round(wall, 4),
+                "requests_per_s": round(len(queries) / wall, 2),
+                "p50_ms": round(statistics.median(latencies), 3),
+                "p95_ms": round(latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))], 3),
+            })
+        await scraper.aclose()
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def flatten(results: Dict) -> Dict[str, float]:
+    """Map 'stage/item' -> median ms (or requests/s for throughput) for comparisons."""
+    flat = {}
+    for query, stats in results["search"].items():
+        flat[f"search/{query}"] = stats["median_ms"]
+    for slug, page in results["pages"].items():
+        for stage in ("fetch", "revalidate", "parse", "extract", "fast_parse"):
+            if stage in page:
+                flat[f"{stage}/{slug}"] = page[stage]["median_ms"]
+    for row in results["throughput"]:
+        suffix = "" if row.get("mode", "cold") == "cold" else f"/{row['mode']}"
+        flat[f"throughput/c{row['concurrency']}{suffix}"] = row["requests_per_s"]
+    return flat
+
+
+def print_report(results: Dict):
+    print(f"commit {results['meta']['commit']}  python {results['meta']['python']}")
+    print(f"\nsearch_stock over {results['meta']['universe_size']} stocks (median us)")
+    for query, stats in results["search"].items():
+        print(f"  {query:<18} {stats['median_ms'] * 1000:>9.1f}")
+    
+    print(f"\n{'page':<11} {'KB':>4} {'wire KB':>7} {'fetch ms':>9} {'304 ms':>7} {'parse ms':>9} "
+          f"{'extract ms':>11} {'fast ms':>8} {'metrics':>8}")
+    for slug, page in results["pages"].items():
+        fast = f"{page['fast_parse']['median_ms']:>8.2f}" if page["fast_path"] else f"{'fallback':>8}"
+        print(f"{slug:<11} {page['bytes'] // 1024:>4} {page['wire_bytes'] / 1024:>7.1f} "
+              f"{page['fetch']['median_ms']:>9.2f} {page['revalidate']['median_ms']:>7.2f} "
+              f"{page['parse']['median_ms']:>9.2f} {page['extract']['median_ms']:>11.3f} "
+              f"{fast} {page['metrics_found']:>4}/{EXPECTED_METRICS}")
+    
+    processes = results["meta"].get("parse_processes", 0)
+    print(f"\nget_stock_data_async, {results['meta']['page_delay'] * 1000:.0f} ms per page"
+          + (f", {processes} parse processes" if processes else ""))
+    print(f"{'callers':>8} {'mode':>11} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'KB':>8} {'wall s':>8}")
+    for row in results["throughput"]:
+        print(f"{row['concurrency']:>8} {row['mode']:>11} {row['requests_per_s']:>8.1f} {row['p50_ms']:>9.1f} "
+              f"{row['p95_ms']:>9.1f} {row['kb_transferred']:>8.1f} {row['wall_s']:>8.2f}"
+              f"{'  (' + str(row['failed']) + ' failed)' if row['failed'] else ''}")
+
+
+def print_comparison(baseline: Dict, results: Dict, threshold: float):
+    """Print entries that got slower (or less throughput) than the baseline by more than threshold."""
+    old, new = flatten(baseline), flatten(results)
+    print(f"\nvs {baseline['meta']['commit']} (flagging changes over {threshold:.0%})")
+    flagged = 0
+    for key in sorted(set(old) & set(new)):
+        if not old[key] or not new[key]:
+            continue
+        # Throughput is better when higher, timings when lower
+        ratio = old[key] / new[key] if key.startswith("throughput/") else new[key] / old[key]
+        if abs(ratio - 1) > threshold:
+            flagged += 1
+            label = "REGRESSION" if ratio > 1 else "improved"
+            print(f"  {key:<32} {old[key]:>10.3f} -> {new[key]:>10.3f}  {label}")
+    if not flagged:
+        print("  no significant changes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--fixtures", default=FIXTURES_DIR)
+    parser.add_argument("--repeat", type=int, default=20, help="Samples per timed stage")
+    parser.add_argument("--universe", type=int, default=5000, help="Synthetic stocks for search_stock")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--requests", type=int, default=48, help="get_stock_data calls per concurrency level")
+    parser.add_argument("--page-delay", type=float, default=0.05, help="Stub server latency per page (s)")
+    parser.add_argument("--parse-processes", type=int, default=0,
+                        help="Parse in this many worker processes during the throughput runs")
+    parser.add_argument("--quick", action="store_true", help="Fewer samples and requests, for a smoke run")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative change flagged by --compare")
+    args = parser.parse_args()
+    if args.quick:
+        args.repeat, args.requests, args.universe = 5, 16, 1000
+    
+    pages = load_fixtures(args.fixtures)
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "universe_size": args.universe,
+            "page_delay": args.page_delay,
+            "parse_processes": args.parse_processes,
+        },
+        "search": bench_search(args.universe, args.repeat * 10),
+    }
+    with StubScreenerServer(args.fixtures) as server:
+        results["pages"] = bench_pages(pages, server.base_url, args.repeat)
+    with StubScreenerServer(args.fixtures, delay=args.page_delay) as server:
+        results["throughput"] = asyncio.run(bench_throughput(server, args.concurrency, args.requests, args.parse_processes))
+    
+    print_report(results)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            print_comparison(json.load(f), results, args.threshold)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Stock universes for offline benchmarks: the Nifty 50 plus a synthetic large one."""
+import random
+from typing import Dict, List, Tuple
+
+NIFTY_50: List[Tuple[str, str]] = [
+    ("Adani Enterprises Ltd", "ADANIENT"), ("Adani Ports and Special Economic Zone Ltd", "ADANIPORTS"),
+    ("Apollo Hospitals Enterprise Ltd", "APOLLOHOSP"), ("Asian Paints Ltd", "ASIANPAINT"),
+    ("Axis Bank Ltd", "AXISBANK"), ("Bajaj Auto Ltd", "BAJAJ-AUTO"), ("Bajaj Finance Ltd", "BAJFINANCE"),
+    ("Bajaj Finserv Ltd", "BAJAJFINSV"), ("Bharat Electronics Ltd", "BEL"), ("Bharti Airtel Ltd", "BHARTIARTL"),
+    ("Cipla Ltd", "CIPLA"), ("Coal India Ltd", "COALINDIA"), ("Dr. Reddy's Laboratories Ltd", "DRREDDY"),
+    ("Eicher Motors Ltd", "EICHERMOT"), ("Grasim Industries Ltd", "GRASIM"), ("HCL Technologies Ltd", "HCLTECH"),
+    ("HDFC Bank Ltd", "HDFCBANK"), ("HDFC Life Insurance Company Ltd", "HDFCLIFE"), ("Hero MotoCorp Ltd", "HEROMOTOCO"),
+    ("Hindalco Industries Ltd", "HINDALCO"), ("Hindustan Unilever Ltd", "HINDUNILVR"), ("ICICI Bank Ltd", "ICICIBANK"),
+    ("IndusInd Bank Ltd", "INDUSINDBK"), ("Infosys Ltd", "INFY"), ("ITC Ltd", "ITC"), ("JSW Steel Ltd", "JSWSTEEL"),
+    ("Kotak Mahindra Bank Ltd", "KOTAKBANK"), ("Larsen & Toubro Ltd", "LT"), ("Mahindra & Mahindra Ltd", "M&M"),
+    ("Maruti Suzuki India Ltd", "MARUTI"), ("Nestle India Ltd", "NESTLEIND"), ("NTPC Ltd", "NTPC"),
+    ("Oil and Natural Gas Corporation Ltd", "ONGC"), ("Power Grid Corporation of India Ltd", "POWERGRID"),
+    ("Reliance Industries Ltd", "RELIANCE"), ("SBI Life Insurance Company Ltd", "SBILIFE"),
+    ("Shriram Finance Ltd", "SHRIRAMFIN"), ("State Bank of India", "SBIN"), ("Sun Pharmaceutical Industries Ltd", "SUNPHARMA"),
+    ("Tata Consultancy Services Ltd", "TCS"), ("Tata Consumer Products Ltd", "TATACONSUM"), ("Tata Motors Ltd", "TATAMOTORS"),
+    ("Tata Steel Ltd", "TATASTEEL"), ("Tech Mahindra Ltd", "TECHM"), ("Titan Company Ltd", "TITAN"),
+    ("Trent Ltd", "TRENT"), ("UltraTech Cement Ltd", "ULTRACEMCO"), ("Wipro Ltd", "WIPRO"),
+    ("Jio Financial Services Ltd", "JIOFIN"), ("Zomato Ltd", "ZOMATO"),
+]
+
+_WORDS = [
+    "Adarsh", "Bharat", "Capital", "Deccan", "Eastern", "Focus", "Global", "Hind", "Indo", "Jai", "Kaveri",
+    "Lakshmi", "Madras", "National", "Orient", "Prakash", "Quality", "Rajesh", "Sagar", "Triveni", "Unity",
+    "Vardhman", "Western", "Yash", "Zenith", "Alpha", "Bright", "Crystal", "Dynamic", "Everest", "Fortune",
+]
+_SECTORS = [
+    "Steel", "Textiles", "Pharma", "Chemicals", "Finance", "Cement", "Power", "Foods", "Motors", "Infra",
+    "Paper", "Sugar", "Polymers", "Software", "Logistics", "Realty", "Agro", "Plastics", "Glass", "Energy",
+]
+
+
+def stock_mapping(companies: List[Tuple[str, str]]) -> Dict[str, Dict[str, str]]:
+    """Build a ScreenerScraper-style mapping from (company name, NSE symbol) pairs."""
+    mapping = {}
+    for name, symbol in companies:
+        info = {"slug": symbol, "name": name, "symbol": symbol}
+        for term in (name.lower(), symbol.lower(), name.split()[0].lower()):
+            mapping[term] = info
+            if term.endswith(" ltd"):
+                mapping[term[:-4]] = info
+    return mapping
+
+
+def synthetic_companies(count: int, seed: int = 7) -> List[Tuple[str, str]]:
+    """Generate a deterministic universe of plausible company names, Nifty 50 included."""
+    rnd = random.Random(seed)
+    companies = list(NIFTY_50)
+    seen = {symbol for _, symbol in companies}
+    while len(companies) < count:
+        name = f"{rnd.choice(_WORDS)} {rnd.choice(_WORDS)} {rnd.choice(_SECTORS)} Ltd"
+        symbol = (name.split()[0][:4] + name.split()[1][:3] + name.split()[2][:3]).upper()
+        if symbol in seen:
+            symbol = f"{symbol}{len(companies)}"
+        seen.add(symbol)
+        companies.append((name, symbol))
+    return companies
@@ -1,27 +1,106 @@
 """Main Telegram bot module for FinSight."""
+import asyncio
 import logging
+import time
+from typing import Dict, List, Optional, Tuple
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
 from telegram.error import Conflict
+from alerts import AlertRule, AlertStore, AlertTrigger, parse_alert
+from cache import ChatInFlight, InFlightOutcome
 from scraper import ScreenerScraper
-from ai_insights import AIInsightsGenerator
+from ai_insights import AIInsightsGenerator, QUOTA_EXHAUSTED_MESSAGE
+from history_store import METRIC_UNITS, HistoryStore, format_change, format_value
+from insight_cache import InsightCache
+from notifier import BatchedSender, LiveMessage, StackedReply
+from prefetch import PrefetchScheduler
+from quick_insights import QuickInsights, parse_thresholds
+from rate_limiter import RequestScheduler
+from snapshot import StockSnapshot
+from state_backend import open_backend
+from statements import SECTIONS, split_section_query
 import config
+import metrics
 
 # Configure logging
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     level=logging.INFO
 )
+# httpx logs every request at INFO, which drowns out the bot's own logs
+logging.getLogger("httpx").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
+# Shown under the rule-based take when Gemini's quota is gone
+QUOTA_FALLBACK_NOTE = "_Gemini's daily quota is used up; AI insights resume after midnight UTC._"
+
 
 class FinSightBot:
     """Main bot class for FinSight."""
     
     def __init__(self):
         """Initialize the bot with scraper and AI generator."""
-        self.scraper = ScreenerScraper()
-        self.ai_generator = AIInsightsGenerator()
+        # Caches and rate limits shared with other replicas (in-process by default)
+        self.state = open_backend(config.STATE_BACKEND)
+        self.history = HistoryStore(config.HISTORY_DB_PATH) if config.HISTORY_DB_PATH else None
+        self.scraper = ScreenerScraper(
+            max_workers=config.SCRAPER_WORKERS,
+            cache_ttl=config.PAGE_CACHE_TTL,
+            cache_ttl_market_hours=config.PAGE_CACHE_TTL_MARKET_HOURS,
+            cache_max_entries=config.PAGE_CACHE_MAX_ENTRIES,
+            max_concurrency=config.SCREENER_MAX_CONCURRENCY,
+            breaker_threshold=config.SCREENER_BREAKER_THRESHOLD,
+            breaker_reset=config.SCREENER_BREAKER_RESET,
+            history=self.history,
+            parse_processes=config.PARSE_PROCESSES,
+            fast_parse=config.FAST_PARSE,
+            state=self.state,
+            statement_cache_max_bytes=config.STATEMENT_CACHE_MAX_BYTES,
+        )
+        insight_cache = None
+        if config.INSIGHT_CACHE_PATH:
+            insight_cache = InsightCache(
+                config.INSIGHT_CACHE_PATH,
+                ttl=config.INSIGHT_CACHE_TTL,
+                max_stale=config.INSIGHT_CACHE_MAX_STALE,
+                max_entries=config.INSIGHT_CACHE_MAX_ENTRIES,
+            )
+        scheduler = RequestScheduler(
+            requests_per_minute=config.GEMINI_REQUESTS_PER_MINUTE,
+            requests_per_day=config.GEMINI_REQUESTS_PER_DAY,
+            background_reserve=config.GEMINI_BACKGROUND_RESERVE,
+            backend=self.state,
+        )
+        self.ai_generator = AIInsightsGenerator(
+            max_workers=config.AI_WORKERS, cache=insight_cache, scheduler=scheduler
+        )
+        # Rule-based take shown while Gemini works, and instead of it when Gemini fails
+        self.quick_insights = None
+        if config.QUICK_INSIGHTS_ENABLED:
+            self.quick_insights = QuickInsights(parse_thresholds(config.QUICK_INSIGHT_THRESHOLDS))
+        # One running stock query per chat, and a global cap on running queries
+        self.inflight = ChatInFlight(config.MAX_INFLIGHT_QUERIES)
+        # Queue for everything the bot sends, paced to Telegram's limits once the bot is running
+        self.telegram_bot = None
+        self.notifier = BatchedSender(
+            self.send_notification,
+            messages_per_second=config.TELEGRAM_MESSAGES_PER_SECOND,
+            chat_interval=config.TELEGRAM_CHAT_INTERVAL,
+        )
+        self.alerts = AlertStore(config.ALERTS_DB_PATH) if config.ALERTS_DB_PATH else None
+        if self.alerts is not None:
+            self.scraper.snapshot_listeners.append(self.check_alerts)
+        metrics.enable(config.METRICS_ENABLED)
+        self.metrics_server = None
+        self.prefetcher = None
+        if config.PREFETCH_ENABLED:
+            self.prefetcher = PrefetchScheduler(
+                self.scraper,
+                requests_per_minute=config.PREFETCH_REQUESTS_PER_MINUTE,
+                max_stocks=config.PREFETCH_MAX_STOCKS,
+                backend=self.state,
+                watched=self.alerts.slugs if self.alerts is not None else None,
+            )
     
     def format_metrics(self, data: dict) -> str:
         """
@@ -61,6 +140,228 @@ class FinSightBot:
         
         return "\n".join(lines)
     
+    def format_comparison_table(self, results: Dict[str, dict]) -> str:
+        """
+        Format several stocks' metrics as a side-by-side comparison table.
+        
+        Args:
+            results: Query -> scraped metrics (or error dict)
+            
+        Returns:
+            Monospaced table wrapped in a Markdown code block
+        """
+        columns = [
+            ("Stock", "NSE Symbol"), ("Price", "Current Price"), ("P/E", "P/E"),
+            ("ROE", "ROE"), ("ROCE", "ROCE"), ("MCap Cr", "Market Cap"),
+        ]
+        rows = []
+        for query, data in results.items():
+            if "error" in data:
+                continue
+            row = [str(data.get("NSE Symbol") or query.upper())]
+            for _, key in columns[1:]:
+                value = data.get(key) or "-"
+                row.append(value.replace("₹", "").strip())
+            rows.append(row)
+        
+        if not rows:
+            return "⚠️ No data could be fetched for these stocks."
+        
+        widths = [max(len(header), *(len(row[i]) for row in rows)) for i, (header, _) in enumerate(columns)]
+        header = "  ".join(h.ljust(w) for (h, _), w in zip(columns, widths)).rstrip()
+        lines = [header, "-" * len(header)]
+        for row in rows:
+            lines.append("  ".join(value.ljust(w) for value, w in zip(row, widths)).rstrip())
+        return "📊 **Comparison**\n```\n" + "\n".join(lines) + "\n```"
+    
+    def split_message(self, text: str, limit: int = 4000) -> List[str]:
+        """
+        Split a long message on paragraph boundaries to fit Telegram's size limit.
+        
+        Args:
+            text: Message text
+            limit: Maximum characters per message
+            
+        Returns:
+            List of message chunks
+        """
+        chunks = []
+        current = ""
+        for paragraph in text.split("\n\n"):
+            candidate = f"{current}\n\n{paragraph}" if current else paragraph
+            if len(candidate) <= limit:
+                current = candidate
+                continue
+            if current:
+                chunks.append(current)
+            # A single oversized paragraph is hard-wrapped
+            while len(paragraph) > limit:
+                chunks.append(paragraph[:limit])
+                paragraph = paragraph[limit:]
+            current = paragraph
+        if current:
+            chunks.append(current)
+        return chunks
+    
+    def parse_batch_queries(self, text: str) -> Tuple[List[str], str]:
+        """
+        Turn /batch arguments into stock queries.
+        
+        Accepts a comma or space separated list ("TCS, INFY, WIPRO") or
+        "sector <name>" for a whole sector from the stock universe.
+        
+        Args:
+            text: Text after the /batch command
+            
+        Returns:
+            Tuple of (queries, title for the reply); queries is empty if nothing matched
+        """
+        text = text.strip()
+        if text.lower().startswith("sector "):
+            found = self.scraper.find_sector(text[len("sector "):])
+            if not found:
+                return [], text[len("sector "):].strip()
+            sector, stocks = found
+            return [stock["symbol"] for stock in stocks], sector
+        
+        separator = "," if "," in text else None
+        queries = [q.strip() for q in text.split(separator) if q.strip()]
+        return list(dict.fromkeys(queries)), ", ".join(queries)
+    
+    def format_history(self, company_name: str, deltas: list, days: int) -> str:
+        """
+        Format metric changes from the history store.
+        
+        Args:
+            company_name: Company to show in the title
+            deltas: Delta tuples from HistoryStore.deltas
+            days: Window the deltas cover
+            
+        Returns:
+            Formatted string
+        """
+        lines = [f"📈 **{company_name}** over the last {days} days\n"]
+        for delta in deltas:
+            line = (f"• **{delta.metric}**: {format_value(delta.metric, delta.start.value)} → "
+                    f"{format_value(delta.metric, delta.end.value)} ({format_change(delta.metric, delta.change)}")
+            if delta.relative is not None and METRIC_UNITS.get(delta.metric) != "fraction":
+                line += f", {delta.relative:+.1%}"
+            lines.append(line + ")")
+        first = min(delta.start.day for delta in deltas)
+        last = max(delta.end.day for delta in deltas)
+        lines.append(f"\n_{first:%d %b} – {last:%d %b %Y}_")
+        return "\n".join(lines)
+    
+    def format_statement(self, company_name: str, table, periods: int = 4) -> str:
+        """
+        Format the latest periods of a financial statement table.
+        
+        Args:
+            company_name: Company to show in the title
+            table: FinancialTable from the scraper
+            periods: Number of most recent periods to show
+            
+        Returns:
+            Monospaced table wrapped in a Markdown code block
+        """
+        shown = table.periods[-periods:]
+        rows = []
+        for item, unit in zip(table.items, table.units):
+            values = table.row(item)[-periods:]
+            cells = []
+            for value in values:
+                if value is None:
+                    cells.append("-")
+                elif unit == "fraction":
+                    cells.append(f"{value * 100:.0f}%")
+                elif unit == "crore" or abs(value) >= 1000:
+                    cells.append(f"{value:,.0f}")
+                else:
+                    cells.append(f"{value:,.2f}")
+            rows.append([item[:20]] + cells)
+        
+        headers = ["₹ Cr"] + list(shown)
+        widths = [max(len(headers[i]), *(len(row[i]) for row in rows)) for i in range(len(headers))]
+        lines = ["  ".join([headers[0].ljust(widths[0])] + [h.rjust(w) for h, w in zip(headers[1:], widths[1:])])]
+        lines.append("-" * len(lines[0]))
+        for row in rows:
+            lines.append("  ".join([row[0].ljust(widths[0])] + [v.rjust(w) for v, w in zip(row[1:], widths[1:])]))
+        return f"📑 **{company_name}: {table.title}**\n```\n" + "\n".join(lines) + "\n```"
+    
+    def format_screen(self, result, universe: int) -> str:
+        """
+        Format the matches of a /screen query.
+        
+        Args:
+            result: ScreenResult from the scraper
+            universe: Number of stocks in the universe
+            
+        Returns:
+            Formatted string
+        """
+        query = result.query
+        order = "highest" if query.descending else "lowest"
+        lines = [
+            f"🔎 **Screen:** {query.text or 'all stocks'}",
+            f"**{result.matched}** of {result.screened} stocks match, by {query.sort_by} ({order} first)\n",
+        ]
+        # Show the metrics the query is about, then the sort metric
+        shown = list(dict.fromkeys(query.metrics + (query.sort_by,)))[:4]
+        for rank, snapshot in enumerate(result.matches[:config.SCREEN_MAX_RESULTS], 1):
+            values = " · ".join(
+                f"{metric} {format_value(metric, snapshot.get(metric)) if metric in snapshot else 'n/a'}"
+                for metric in shown
+            )
+            lines.append(f"{rank}. **{snapshot.symbol or snapshot.name or snapshot.slug}**: {values}")
+        if result.screened < universe:
+            lines.append(f"\n_Only the {result.screened} of {universe} stocks looked up so far are screened._")
+        return "\n".join(lines)
+    
+    def quick_take(self, data: dict) -> Optional[str]:
+        """Return the rule-based take on a stock's metrics, or None if it is off or no rule applies."""
+        if self.quick_insights is None:
+            return None
+        snapshot = self.scraper.snapshots.get(data.get("slug") or "")
+        if snapshot is None:
+            snapshot = StockSnapshot.from_data(data)
+        return self.quick_insights.insights(snapshot)
+    
+    async def stream_insights(self, reply: StackedReply, stock_name: str, data: dict, chat_id=None) -> Optional[str]:
+        """
+        Stream AI insights into a reply as Gemini generates them.
+        
+        The reply is only updated when a new paragraph has been completed
+        and at most once every STREAM_EDIT_INTERVAL seconds, which keeps the
+        number of edits within Telegram's rate limits.
+        
+        Args:
+            reply: Reply to show the insights in (below the metrics)
+            stock_name: Name of the stock
+            data: Scraped stock metrics
+            chat_id: Telegram chat ID
+            
+        Returns:
+            Insights text (already shown in the reply), quota message, or None on error
+        """
+        header = "💡 **AI Insights & Sentiment Analysis**\n\n"
+        shown = 0
+        last_edit = 0.0
+        
+        async def on_text(text: str):
+            nonlocal shown, last_edit
+            # Only whole paragraphs are shown, so sections never appear half-written
+            boundary = text.rfind("\n\n")
+            now = time.monotonic()
+            if boundary <= shown or now - last_edit < config.STREAM_EDIT_INTERVAL:
+                return
+            shown, last_edit = boundary, now
+            reply.set(f"{header}{text[:boundary]}\n\n⏳ ...")
+        
+        insights = await self.ai_generator.stream_insights_async(stock_name, data, on_text, chat_id)
+        if insights and insights != QUOTA_EXHAUSTED_MESSAGE:
+            await reply.show(header + insights)
+        return insights
+    
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /start command."""
         welcome_message = """
@@ -80,54 +381,138 @@ Simply send me a stock name or NSE symbol (e.g., "reliance", "tcs", "hdfcbank",
 • "hdfcbank" → HDFC Bank
 • "infosys" → Infosys
 
+**Several stocks at once:**
+• /batch TCS, INFY, WIPRO, HCLTECH
+• /batch sector Banking
+
+**How metrics moved:**
+• /history TCS ROE 7
+
+**Financial statements:**
+• "TCS quarterly results", "Infosys balance sheet"
+
+**Screen all stocks:**
+• /screen ROE > 20 and P/E < 30 and debt low
+
+**Alerts:**
+• /alert RELIANCE price < 2400
+• /alert list, /alert remove 3
+
 **Note:** I support Nifty 50 stocks only. Use company name or NSE symbol.
 
 Let's get started! 📈
 """
         await update.message.reply_text(welcome_message, parse_mode='Markdown')
     
+    def query_key(self, query: str) -> str:
+        """Return the key under which repeats of a query are recognised (the stock's slug if known)."""
+        stock_query, section = split_section_query(query)
+        stock_info = self.scraper.search_stock(stock_query) if stock_query else None
+        key = stock_info["slug"] if stock_info else stock_query.lower()
+        return f"{key}:{section}" if section else key
+    
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle text messages with stock queries."""
+        """
+        Handle text messages with stock queries.
+        
+        Repeating the query that is still being answered in a chat is ignored,
+        and a different query cancels it; when too many queries are running
+        across all chats the user is asked to try again instead.
+        """
+        metrics.inc("messages")
+        query = update.message.text.strip()
+        chat_id = update.effective_chat.id if update.effective_chat else update.update_id
+        
+        async def answer():
+            with metrics.span("handle_message"):
+                await self._handle_message(update, context)
+        
+        outcome = await self.inflight.run(chat_id, self.query_key(query), answer)
+        if outcome is InFlightOutcome.BUSY:
+            metrics.inc("queries_refused")
+            await update.message.reply_text(
+                "⏳ FinSight is handling a lot of requests right now. Please try again in a minute."
+            )
+        elif outcome is InFlightOutcome.ATTACHED:
+            metrics.inc("queries_deduplicated")
+        elif outcome is InFlightOutcome.SUPERSEDED:
+            metrics.inc("queries_superseded")
+    
+    async def _handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         query = update.message.text.strip()
         
         if not query:
             await update.message.reply_text("Please send a stock name or symbol.")
             return
         
-        # Send "processing" message
-        processing_msg = await update.message.reply_text("🔍 Fetching stock data...")
+        # "TCS quarterly results" asks for a statement table instead of the usual analysis
+        stock_query, section = split_section_query(query)
+        if section is not None:
+            await self.reply_statement(update, stock_query, section)
+            return
+        
+        chat_id = update.effective_chat.id if update.effective_chat else None
+        # Progress notes, metrics and insights build up in as few messages as fit;
+        # a note superseded before Telegram's queue reaches it is never sent
+        reply = StackedReply(self.notifier, update.message, chat_id)
+        reply.set("🔍 Fetching stock data from Screener.in...")
+        # Set once the answer is complete; until then a newer query marks this one cancelled
+        answered = False
         
         try:
-            # Scrape data
-            await processing_msg.edit_text("📊 Scraping data from Screener.in...")
-            data = self.scraper.get_stock_data(query)
+            with metrics.span("get_stock_data"):
+                data = await self.scraper.get_stock_data_async(query)
             
             if "error" in data:
                 error_msg = f"❌ {data['error']}\n\n"
+                if data.get("suggestions"):
+                    error_msg += "🤔 **Did you mean:**\n"
+                    for suggestion in data["suggestions"]:
+                        error_msg += f"• {suggestion['symbol']} ({suggestion['name']})\n"
+                    error_msg += "\n"
                 error_msg += "💡 **Tip:** Use company name or NSE symbol from Nifty 50.\n"
                 error_msg += "Examples: 'tcs', 'reliance', 'hdfcbank', 'infosys'"
-                await processing_msg.edit_text(error_msg, parse_mode='Markdown')
+                answered = True
+                await reply.show(error_msg)
                 return
             
-            # Format metrics
-            metrics_text = self.format_metrics(data)
-            await processing_msg.edit_text(metrics_text, parse_mode='Markdown')
+            # Metrics stay at the top while the insights are generated below them
+            reply.set(self.format_metrics(data))
+            reply.commit()
             
             # Generate AI insights
-            await update.message.reply_text("🤖 Generating AI insights...")
+            status_text = "🤖 Generating AI insights..."
+            wait = await self.ai_generator.estimated_wait(chat_id)
+            if wait >= 2:
+                status_text += f"\n⏳ Gemini is busy, your request is queued (about {wait:.0f}s)"
+            # An instant rule-based take is shown until Gemini's insights replace it
+            quick = self.quick_take(data)
+            reply.set(f"{quick}\n\n{status_text}" if quick else status_text)
             
             stock_name = data.get("Company Name", query.upper())
             
             try:
-                insights = self.ai_generator.generate_insights(stock_name, data)
+                with metrics.span("insights"):
+                    if config.STREAM_INSIGHTS:
+                        insights = await self.stream_insights(reply, stock_name, data, chat_id)
+                    else:
+                        insights = await self.ai_generator.generate_insights_async(stock_name, data, chat_id)
+                answered = True
+                if config.STREAM_INSIGHTS and insights and insights != QUOTA_EXHAUSTED_MESSAGE:
+                    return
                 
                 if insights:
                     # Check if it's a quota exhausted message (starts with warning emoji)
                     if "⚠️" in insights or "Free Tier Quota" in insights:
-                        await update.message.reply_text(insights, parse_mode='Markdown')
+                        # Without Gemini the rule-based take is the answer
+                        if quick:
+                            await reply.show(f"{quick}\n\n{QUOTA_FALLBACK_NOTE}")
+                        else:
+                            await reply.show(insights)
                     else:
-                        insights_text = f"💡 **AI Insights & Sentiment Analysis**\n\n{insights}"
-                        await update.message.reply_text(insights_text, parse_mode='Markdown')
+                        await reply.show(f"💡 **AI Insights & Sentiment Analysis**\n\n{insights}")
+                elif quick:
+                    await reply.show(f"{quick}\n\n_AI insights are unavailable right now._")
                 else:
                     error_msg = "⚠️ Could not generate AI insights.\n\n"
                     error_msg += "**Free Tier Limits:**\n"
@@ -139,9 +524,13 @@ Let's get started! 📈
                     error_msg += "• API key issue - verify your Gemini API key\n\n"
                     error_msg += "💡 **Tip:** Free tier resets daily at midnight UTC.\n"
                     error_msg += "Check usage: https://ai.dev/usage"
-                    await update.message.reply_text(error_msg, parse_mode='Markdown')
+                    await reply.show(error_msg)
             except Exception as e:
                 logger.error(f"Error in AI insights generation: {e}")
+                answered = True
+                if quick:
+                    await reply.show(f"{quick}\n\n_AI insights are unavailable right now._")
+                    return
                 error_msg = "⚠️ Error generating AI insights.\n\n"
                 error_msg += "**Free Tier Info:**\n"
                 error_msg += "• 15 requests/minute\n"
@@ -151,40 +540,395 @@ Let's get started! 📈
                 error_msg += "• Free tier quota not exhausted\n"
                 error_msg += "• Your internet connection is stable\n\n"
                 error_msg += "Check usage: https://ai.dev/usage"
-                await update.message.reply_text(error_msg, parse_mode='Markdown')
-        
+                await reply.show(error_msg)
+                
+        except asyncio.CancelledError:
+            if not answered:
+                try:
+                    await reply.show("⏹ Cancelled: you sent a newer request.")
+                except Exception as e:
+                    logger.warning(f"Could not mark cancelled query: {e}")
+            raise
         except Exception as e:
             logger.error(f"Error processing message: {e}")
-            await update.message.reply_text(
+            answered = True
+            await reply.show(
                 "❌ An error occurred while processing your request. Please try again later."
             )
+        finally:
+            # Telegram API calls per answered query, to keep the outbound traffic measurable
+            metrics.inc("stock_queries")
+            metrics.inc("stock_query_telegram_calls", reply.calls)
+            metrics.inc("telegram_texts_coalesced", reply.coalesced)
     
-    async def post_init(self, application: Application):
-        """Post-initialization callback to delete webhook."""
+    async def history_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /history command: show how a stock's metrics moved, from the local history store."""
+        args = list(context.args or [])
+        days = 7
+        if args and args[-1].isdigit():
+            days = max(1, int(args.pop()))
+        if not args or self.history is None:
+            await update.message.reply_text(
+                "Usage: /history TCS [metric] [days]\ne.g. /history TCS ROE 7"
+                if self.history is not None else "⚠️ Metric history is turned off."
+            )
+            return
+        
+        stock_info = self.scraper.search_stock(args[0])
+        if not stock_info:
+            await update.message.reply_text(f"❌ Stock '{args[0]}' not found.")
+            return
+        
+        metric = None
+        if len(args) > 1:
+            wanted = " ".join(args[1:]).lower()
+            metric = next((name for name in METRIC_UNITS if name.lower() == wanted), None)
+            if metric is None:
+                await update.message.reply_text(f"❌ Unknown metric. Available: {', '.join(METRIC_UNITS)}")
+                return
+        
+        deltas = self.history.deltas(stock_info["slug"], days=days, metric=metric)
+        if not deltas:
+            await update.message.reply_text(
+                f"ℹ️ Not enough history for {stock_info['name']} yet. "
+                "Values are recorded each day the stock is looked up."
+            )
+            return
+        await update.message.reply_text(
+            self.format_history(stock_info["name"], deltas, days), parse_mode='Markdown'
+        )
+    
+    async def reply_statement(self, update: Update, stock_query: str, section: str):
+        """
+        Reply with a stock's financial statement table.
+        
+        The table is read from the page already downloaded for the stock's
+        metrics when there is one, so it usually costs no extra request.
+        
+        Args:
+            update: Update to reply to
+            stock_query: Stock name or symbol
+            section: Section id from statements.SECTIONS
+        """
+        stock_info = self.scraper.search_stock(stock_query)
+        if not stock_info:
+            await update.message.reply_text(f"❌ Stock '{stock_query}' not found.")
+            return
         try:
-            await application.bot.delete_webhook(drop_pending_updates=True)
-            logger.info("Webhook deleted successfully")
+            with metrics.span("get_statement"):
+                table = await self.scraper.get_statement_async(stock_info["slug"], section)
         except Exception as e:
-            logger.warning(f"Could not delete webhook: {e}")
+            logger.error(f"Error reading {section} of {stock_info['slug']}: {e}")
+            table = None
+        if table is None:
+            await update.message.reply_text(
+                f"⚠️ {SECTIONS[section]} for {stock_info['name']} are not available right now."
+            )
+            return
+        await update.message.reply_text(
+            self.format_statement(stock_info["name"], table), parse_mode='Markdown'
+        )
+    
+    async def financials_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /financials command: show a financial statement table of a stock."""
+        stock_query, section = split_section_query(" ".join(context.args or []))
+        if section is None:
+            await update.message.reply_text(
+                "Usage: /financials TCS quarterly\n"
+                "Sections: quarterly, p&l, balance sheet, cash flow, ratios, shareholding"
+            )
+            return
+        await self.reply_statement(update, stock_query, section)
+    
+    async def screen_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /screen command: filter every stock with scraped metrics, without fetching."""
+        text = " ".join(context.args or [])
+        if not text:
+            await update.message.reply_text(
+                "Usage: /screen <conditions> [sort by <metric> asc|desc] [top N]\n"
+                "e.g. /screen ROE > 20 and P/E < 30 and debt low top 10"
+            )
+            return
+        try:
+            result = self.scraper.screen(text)
+        except ValueError as e:
+            await update.message.reply_text(
+                f"❌ {e}.\n\nMetrics: {', '.join(METRIC_UNITS)}\n"
+                "Percentages as on Screener.in (ROE > 20), amounts in crores (Debt < 5000)."
+            )
+            return
+        if not result.screened:
+            await update.message.reply_text(
+                "ℹ️ No stock data yet. Metrics are collected as stocks are looked up."
+            )
+            return
+        await update.message.reply_text(
+            self.format_screen(result, len(self.scraper.universe_slugs())), parse_mode='Markdown'
+        )
+    
+    def format_alert(self, trigger: AlertTrigger) -> str:
+        """Format a triggered alert as a notification."""
+        snapshot = trigger.snapshot
+        name = snapshot.name or snapshot.slug
+        if snapshot.symbol:
+            name = f"{name} ({snapshot.symbol})"
+        value = format_value(trigger.rule.field, trigger.value)
+        return f"🔔 **{name}**: {trigger.rule.field} is {value} (alert: {trigger.rule.describe()})"
+    
+    def check_alerts(self, snapshot):
+        """Evaluate the alerts of a freshly scraped stock and queue a message for each that fires."""
+        for trigger in self.alerts.evaluate(snapshot):
+            metrics.inc("alerts_triggered")
+            self.notifier.submit(trigger.rule.chat_id, self.format_alert(trigger))
+    
+    async def send_notification(self, chat_id, text: str):
+        """Send a bot-initiated message (called by the notifier)."""
+        if self.telegram_bot is None:
+            raise RuntimeError("Bot is not running")
+        await self.telegram_bot.send_message(chat_id, text, parse_mode='Markdown')
+    
+    async def alert_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /alert command: add, list and remove alerts on a stock's metrics."""
+        if self.alerts is None:
+            await update.message.reply_text("⚠️ Alerts are turned off.")
+            return
+        chat_id = update.effective_chat.id
+        args = list(context.args or [])
+        
+        if args and args[0].lower() == "list":
+            rules = self.alerts.for_chat(chat_id)
+            if not rules:
+                await update.message.reply_text("ℹ️ You have no alerts. e.g. /alert RELIANCE price < 2400")
+                return
+            names = {stock_info["slug"]: stock_info["name"] for stock_info in self.scraper.resolver.stocks}
+            lines = ["🔔 **Your alerts**", ""]
+            for rule in rules:
+                lines.append(f"{rule.id}. {names.get(rule.slug, rule.slug)}: {rule.describe()}")
+            lines.append("")
+            lines.append("_Remove one with /alert remove <number>_")
+            await update.message.reply_text("\n".join(lines), parse_mode='Markdown')
+            return
+        
+        if args and args[0].lower() in ("remove", "delete"):
+            if len(args) != 2 or not args[1].isdigit():
+                await update.message.reply_text("Usage: /alert remove <number> (see /alert list)")
+                return
+            if self.alerts.remove(chat_id, int(args[1])):
+                await update.message.reply_text(f"✅ Alert {args[1]} removed.")
+            else:
+                await update.message.reply_text(f"❌ You have no alert {args[1]}.")
+            return
+        
+        try:
+            stock_query, field, op, threshold = parse_alert(" ".join(args))
+        except ValueError as e:
+            await update.message.reply_text(
+                f"❌ {e}.\n\nUsage: /alert <stock> <metric> <, <=, > or >= <number>\n"
+                "e.g. /alert RELIANCE price < 2400, /alert INFY ROE > 30\n"
+                "/alert list, /alert remove <number>"
+            )
+            return
+        stock_info = self.scraper.search_stock(stock_query)
+        if not stock_info:
+            await update.message.reply_text(f"❌ Stock '{stock_query}' not found.")
+            return
+        if len(self.alerts.for_chat(chat_id)) >= config.ALERTS_PER_CHAT:
+            await update.message.reply_text(
+                f"❌ You already have {config.ALERTS_PER_CHAT} alerts. Remove one first (/alert list)."
+            )
+            return
+        
+        # An alert that would fire on the values already known is answered right away
+        snapshot = self.scraper.snapshots.get(stock_info["slug"])
+        value = snapshot.get(field) if snapshot is not None else None
+        if value is not None and AlertRule(0, chat_id, stock_info["slug"], field, op, threshold, 0).matches(value):
+            await update.message.reply_text(
+                f"ℹ️ {stock_info['name']}: {field} is already {format_value(field, value)}, "
+                "so no alert was set."
+            )
+            return
+        rule = self.alerts.add(chat_id, stock_info["slug"], field, op, threshold)
+        await update.message.reply_text(
+            f"✅ Alert {rule.id} set: {stock_info['name']} {rule.describe()}.\n"
+            "You'll get a message when a refresh of the stock meets it."
+        )
+    
+    async def batch_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /batch command: fetch several stocks concurrently and compare them."""
+        queries, title = self.parse_batch_queries(" ".join(context.args or []))
+        
+        if not queries:
+            if title:
+                sectors = ", ".join(sorted(self.scraper.sectors)) or "none loaded"
+                await update.message.reply_text(f"❌ Unknown sector '{title}'.\n\nAvailable sectors: {sectors}")
+            else:
+                await update.message.reply_text(
+                    "Usage: /batch TCS, INFY, WIPRO\nor: /batch sector <name>"
+                )
+            return
+        
+        if len(queries) > config.MAX_BATCH_SIZE:
+            await update.message.reply_text(
+                f"⚠️ Only the first {config.MAX_BATCH_SIZE} of {len(queries)} stocks will be fetched."
+            )
+            queries = queries[:config.MAX_BATCH_SIZE]
+        
+        chat_id = update.effective_chat.id if update.effective_chat else None
+        status = LiveMessage(self.notifier, update.message, chat_id)
+        status.set(f"📦 Fetching {len(queries)} stocks: {title}...")
+        
+        try:
+            results = {}
+            progress = []
+            last_edit = time.monotonic()
+            async for query, data in self.scraper.iter_many(queries):
+                results[query] = data
+                symbol = data.get("NSE Symbol") or query.upper()
+                progress.append(f"❌ {query}" if "error" in data else f"✅ {symbol}")
+                
+                # Stream progress, throttled to respect Telegram's edit limits
+                now = time.monotonic()
+                if len(results) < len(queries) and now - last_edit >= config.BATCH_EDIT_INTERVAL:
+                    last_edit = now
+                    status.set(f"📦 Fetched {len(results)}/{len(queries)}\n" + " ".join(progress))
+            
+            failed = [query for query, data in results.items() if "error" in data]
+            summary = f"📦 Fetched {len(results) - len(failed)}/{len(queries)} stocks: {title}"
+            if failed:
+                summary += f"\n❌ Not found or failed: {', '.join(failed)}"
+            await status.show(summary)
+            
+            ordered = {query: results[query] for query in queries}
+            await LiveMessage(self.notifier, update.message, chat_id).show(
+                self.format_comparison_table(ordered), markdown=True
+            )
+            
+            # Insights are generated a group of stocks per Gemini request
+            analysed = [
+                (data.get("Company Name") or query.upper(), data)
+                for query, data in ordered.items() if "error" not in data
+            ]
+            if analysed:
+                status_text = f"🤖 Generating AI insights for {len(analysed)} stocks..."
+                wait = await self.ai_generator.estimated_wait(chat_id)
+                if wait >= 2:
+                    status_text += f"\n⏳ Gemini is busy, your request is queued (about {wait:.0f}s)"
+                # The first part of the insights replaces this note instead of following it
+                insights_msg = LiveMessage(self.notifier, update.message, chat_id)
+                insights_msg.set(status_text)
+                insights = await self.ai_generator.generate_batch_insights_async(
+                    analysed, batch_size=config.INSIGHTS_BATCH_SIZE, chat_id=chat_id
+                )
+                quota_exhausted = QUOTA_EXHAUSTED_MESSAGE in insights.values()
+                if quota_exhausted and self.quick_insights is None:
+                    await insights_msg.show(QUOTA_EXHAUSTED_MESSAGE, markdown=True)
+                    return
+                sections = []
+                for stock_name, data in analysed:
+                    text = insights.get(stock_name)
+                    quick = self.quick_take(data) if not text or text == QUOTA_EXHAUSTED_MESSAGE else None
+                    if quick:
+                        # Stocks Gemini could not analyse get the rule-based take instead
+                        sections.append(f"💡 **{stock_name}**\n{quick}")
+                    elif text and text != QUOTA_EXHAUSTED_MESSAGE:
+                        sections.append(f"💡 **{stock_name}**\n{text}")
+                    else:
+                        sections.append(f"⚠️ **{stock_name}**: AI insights unavailable right now.")
+                if quota_exhausted:
+                    sections.append(QUOTA_FALLBACK_NOTE)
+                for chunk in self.split_message("\n\n".join(sections)):
+                    await insights_msg.show(chunk, markdown=True)
+                    insights_msg = LiveMessage(self.notifier, update.message, chat_id)
+                    
+        except Exception as e:
+            logger.error(f"Error processing batch: {e}")
+            await update.message.reply_text(
+                "❌ An error occurred while processing your request. Please try again later."
+            )
+    
+    async def post_init(self, application: Application):
+        """Post-initialization callback to delete webhook (polling mode) and start background services."""
+        if config.BOT_MODE != "webhook":
+            try:
+                await application.bot.delete_webhook(drop_pending_updates=True)
+                logger.info("Webhook deleted successfully")
+            except Exception as e:
+                logger.warning(f"Could not delete webhook: {e}")
+        
+        if config.METRICS_ENABLED and config.METRICS_PORT:
+            try:
+                self.metrics_server = metrics.MetricsServer(config.METRICS_HOST, config.METRICS_PORT)
+                logger.info(f"Metrics available at {self.metrics_server.start()}")
+            except OSError as e:
+                logger.warning(f"Could not start metrics endpoint: {e}")
+                self.metrics_server = None
+        
+        if self.prefetcher is not None:
+            self.prefetcher.start()
+            logger.info("Background prefetch started")
+        
+        self.telegram_bot = application.bot
+        self.notifier.start()
+    
+    async def post_shutdown(self, application: Application):
+        """Release HTTP clients and worker pools on shutdown."""
+        if self.prefetcher is not None:
+            await self.prefetcher.stop()
+        await self.notifier.stop()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        await self.scraper.aclose()
+        self.ai_generator.close()
+        if self.history is not None:
+            self.history.close()
+        if self.alerts is not None:
+            self.alerts.close()
+        self.state.close()
     
     def run(self):
         """Start the bot."""
-        application = Application.builder().token(config.TELEGRAM_BOT_TOKEN).build()
+        # Handle updates concurrently so one slow chat doesn't stall the others
+        application = (
+            Application.builder()
+            .token(config.TELEGRAM_BOT_TOKEN)
+            .concurrent_updates(config.MAX_CONCURRENT_UPDATES)
+            .build()
+        )
         
-        # Set post_init to delete webhook
+        # Set post_init to delete webhook and start background services
         application.post_init = self.post_init
+        application.post_shutdown = self.post_shutdown
         
         # Add handlers
         application.add_handler(CommandHandler("start", self.start_command))
+        application.add_handler(CommandHandler("batch", self.batch_command))
+        application.add_handler(CommandHandler("history", self.history_command))
+        application.add_handler(CommandHandler("screen", self.screen_command))
+        application.add_handler(CommandHandler("financials", self.financials_command))
+        application.add_handler(CommandHandler("alert", self.alert_command))
         application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_message))
         
         # Start the bot with error handling
         logger.info("FinSight bot is starting...")
         try:
-            application.run_polling(
-                allowed_updates=Update.ALL_TYPES,
-                drop_pending_updates=True
-            )
+            if config.BOT_MODE == "webhook":
+                # Every replica registers the same public URL and the load balancer spreads
+                # updates between them; pending updates are kept across rolling restarts
+                logger.info(f"Serving webhook on {config.WEBHOOK_LISTEN}:{config.WEBHOOK_PORT}")
+                application.run_webhook(
+                    listen=config.WEBHOOK_LISTEN,
+                    port=config.WEBHOOK_PORT,
+                    url_path=config.WEBHOOK_PATH,
+                    webhook_url=f"{config.WEBHOOK_URL.rstrip('/')}/{config.WEBHOOK_PATH}",
+                    secret_token=config.WEBHOOK_SECRET or None,
+                    allowed_updates=Update.ALL_TYPES,
+                    drop_pending_updates=False,
+                )
+            else:
+                application.run_polling(
+                    allowed_updates=Update.ALL_TYPES,
+                    drop_pending_updates=True
+                )
         except Conflict as e:
             logger.error(f"Conflict error: {e}")
             logger.error("Another bot instance is running or webhook is still active.")
@@ -192,6 +936,7 @@ Let's get started! 📈
             logger.error("1. Stop any other running bot instances (check all terminal windows)")
             logger.error("2. Wait a few seconds and try again")
             logger.error("3. If problem persists, delete webhook manually")
+            logger.error("To run several instances, use BOT_MODE=webhook behind a load balancer")
             raise
         except KeyboardInterrupt:
             logger.info("Bot stopped by user")
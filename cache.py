@@ -0,0 +1,332 @@
+"""In-memory caching helpers: a TTL/LRU cache, in-flight request coalescing and per-chat query tracking."""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, time as dt_time, timedelta, timezone
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+# NSE trades 09:15-15:30 IST, Monday to Friday
+IST = timezone(timedelta(hours=5, minutes=30))
+MARKET_OPEN = dt_time(9, 15)
+MARKET_CLOSE = dt_time(15, 30)
+
+
+def is_market_open(now: Optional[datetime] = None) -> bool:
+    """
+    Check whether the Indian equity market is currently in session.
+    
+    Args:
+        now: Time to check (defaults to the current time)
+        
+    Returns:
+        True during NSE trading hours on weekdays
+    """
+    now = (now or datetime.now(timezone.utc)).astimezone(IST)
+    return now.weekday() < 5 and MARKET_OPEN <= now.time() <= MARKET_CLOSE
+
+
+def market_aware_ttl(market_hours_ttl: float, off_hours_ttl: float) -> Callable[[], float]:
+    """
+    Build a TTL function that is shorter while the market is open.
+    
+    Args:
+        market_hours_ttl: TTL in seconds during trading hours
+        off_hours_ttl: TTL in seconds outside trading hours
+        
+    Returns:
+        Callable returning the TTL to use right now
+    """
+    def ttl() -> float:
+        return market_hours_ttl if is_market_open() else off_hours_ttl
+    return ttl
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after a TTL."""
+    
+    def __init__(self, max_entries: int = 512, ttl: float = 300,
+                 ttl_func: Optional[Callable[[], float]] = None,
+                 max_bytes: Optional[int] = None,
+                 sizeof: Optional[Callable[[Any], int]] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Initialize the cache.
+        
+        Args:
+            max_entries: Maximum number of entries before the least recently used is evicted
+            ttl: Default time-to-live in seconds
+            ttl_func: Optional callable returning the TTL at insert time (overrides ttl)
+            max_bytes: Optional limit on the summed size of all values
+            sizeof: Function returning the size of a value, required with max_bytes
+            clock: Monotonic clock, injectable for tests
+        """
+        if max_bytes is not None and sizeof is None:
+            raise ValueError("sizeof is required when max_bytes is set")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.ttl_func = ttl_func
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.clock = clock
+        
+        # key -> (expires_at, stored_at, size, value)
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, count=False) is not None
+    
+    def _remove(self, key: Hashable):
+        _, _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+    
+    def get(self, key: Hashable, count: bool = True) -> Optional[Any]:
+        """
+        Return a cached value, or None if missing or expired.
+        
+        Args:
+            key: Cache key
+            count: Whether to update the hit/miss counters
+            
+        Returns:
+            Cached value or None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= self.clock():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                if count:
+                    self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if count:
+                self.hits += 1
+            return entry[3]
+    
+    def age(self, key: Hashable) -> Optional[float]:
+        """Return how many seconds ago a live entry was stored, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self.clock():
+                return None
+            return self.clock() - entry[1]
+    
+    def expires_in(self, key: Hashable) -> Optional[float]:
+        """Return how many seconds a live entry has left before it expires, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self.clock():
+                return None
+            return entry[0] - self.clock()
+    
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """
+        Store a value, evicting least recently used entries if over the limits.
+        
+        Args:
+            key: Cache key
+            value: Value to store
+            ttl: Optional TTL in seconds for this entry
+        """
+        if ttl is None:
+            ttl = self.ttl_func() if self.ttl_func else self.ttl
+        size = self.sizeof(value) if self.sizeof else 0
+        now = self.clock()
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (now + ttl, now, size, value)
+            self._bytes += size
+            while self._entries and (
+                len(self._entries) > self.max_entries
+                or (self.max_bytes is not None and self._bytes > self.max_bytes)
+            ):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+    
+    def invalidate(self, key: Hashable):
+        """Drop a single entry if present."""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+    
+    def clear(self):
+        """Drop all entries (counters are kept)."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+    
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss/eviction counters and current size."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class SingleFlight:
+    """Coalesce concurrent async calls for the same key into one execution."""
+    
+    def __init__(self):
+        """Initialize with no calls in flight."""
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+        # Callers currently awaiting each task
+        self._waiters: Dict[asyncio.Task, int] = {}
+        self.coalesced = 0
+    
+    def in_flight(self, key: Hashable) -> bool:
+        """Return True if a call for key is currently running."""
+        return key in self._tasks
+    
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run factory() once per key; concurrent callers share its result.
+        
+        A caller being cancelled does not cancel the shared call for the
+        others; the call itself is cancelled only when its last caller is.
+        
+        Args:
+            key: Key identifying the call
+            factory: Zero-argument callable returning the awaitable to run
+            
+        Returns:
+            Result of the shared call
+        """
+        task = self._tasks.get(key)
+        if task is None or task.done():
+            task = asyncio.ensure_future(factory())
+            self._tasks[key] = task
+            
+            def forget(done: asyncio.Task, key=key):
+                if self._tasks.get(key) is done:
+                    del self._tasks[key]
+            task.add_done_callback(forget)
+        else:
+            self.coalesced += 1
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters[task] == 1:
+                # Forget it now, so a caller arriving before it finishes starts a new call
+                if self._tasks.get(key) is task:
+                    del self._tasks[key]
+                task.cancel()
+            raise
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+
+
+class InFlightOutcome(Enum):
+    """What ChatInFlight.run did with a query."""
+    DONE = "done"
+    ATTACHED = "attached"
+    SUPERSEDED = "superseded"
+    BUSY = "busy"
+
+
+class ChatInFlight:
+    """
+    Track the query each chat has in flight, with a global cap.
+    
+    A chat has at most one running query. Repeating it attaches to the
+    running one instead of starting another; a different query cancels the
+    older one first. New queries are refused while ``max_running`` queries
+    are running across all chats.
+    """
+    
+    def __init__(self, max_running: int):
+        """
+        Initialize with nothing in flight.
+        
+        Args:
+            max_running: Maximum queries running across all chats (0 for no limit)
+        """
+        self.max_running = max_running
+        # chat -> (query key, task)
+        self._running: Dict[Hashable, Tuple[Hashable, asyncio.Task]] = {}
+        self.attached = 0
+        self.superseded = 0
+        self.refused = 0
+    
+    def running(self) -> int:
+        """Return the number of queries running across all chats."""
+        return len(self._running)
+    
+    async def run(self, chat_id: Hashable, key: Hashable,
+                  factory: Callable[[], Awaitable[Any]]) -> InFlightOutcome:
+        """
+        Run a chat's query unless it is already running or the bot is full.
+        
+        An attached caller returns at once, since the running query already
+        answers the chat. Exceptions from factory() propagate to the caller
+        that started it.
+        
+        Args:
+            chat_id: Chat the query came from
+            key: Key identifying the query, e.g. the resolved stock
+            factory: Zero-argument callable returning the awaitable to run
+            
+        Returns:
+            DONE when it ran to completion, SUPERSEDED if a newer query of the
+            chat cancelled it, ATTACHED or BUSY when it was not started
+        """
+        current = self._running.get(chat_id)
+        if current is not None:
+            if current[0] == key:
+                self.attached += 1
+                return InFlightOutcome.ATTACHED
+            # The newer query replaces the older one, so the chat's slot is reused
+            current[1].cancel()
+            self.superseded += 1
+        elif self.max_running and len(self._running) >= self.max_running:
+            self.refused += 1
+            return InFlightOutcome.BUSY
+        
+        task = asyncio.ensure_future(factory())
+        entry = (key, task)
+        self._running[chat_id] = entry
+        try:
+            await asyncio.wait((task,))
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        finally:
+            if self._running.get(chat_id) is entry:
+                del self._running[chat_id]
+        if task.cancelled():
+            return InFlightOutcome.SUPERSEDED
+        task.result()
+        return InFlightOutcome.DONE
+    
+    def stats(self) -> Dict[str, int]:
+        """Return running queries and attached/superseded/refused counters."""
+        return {
+            "running": len(self._running),
+            "attached": self.attached,
+            "superseded": self.superseded,
+            "refused": self.refused,
+        }
@@ -6,10 +6,107 @@ load_dotenv()
 
 # Telegram Bot Configuration
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+# "polling" (single instance) or "webhook" (one or more replicas behind a load balancer)
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+# Public HTTPS base URL of the load balancer (WEBHOOK_PATH is appended), and where
+# this replica listens for the updates Telegram posts there
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+# Checked against Telegram's X-Telegram-Bot-Api-Secret-Token header
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+# State shared between replicas: "memory" (this process only) or "sqlite:<path>"
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")
 
 # Google Gemini Configuration
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
+# Concurrency Configuration
+# Number of Telegram updates handled at the same time
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "64"))
+# Stock queries running at once across all chats before new ones get a "busy" reply (0 for no limit)
+MAX_INFLIGHT_QUERIES = int(os.getenv("MAX_INFLIGHT_QUERIES", "48"))
+# Thread pool sizes for page parsing and blocking Gemini calls
+SCRAPER_WORKERS = int(os.getenv("SCRAPER_WORKERS", "4"))
+# Worker processes for page parsing; 0 parses in SCRAPER_WORKERS threads instead
+PARSE_PROCESSES = int(os.getenv("PARSE_PROCESSES", "0"))
+# Extract metrics with lxml directly, falling back to BeautifulSoup when headline fields are missing
+FAST_PARSE = os.getenv("FAST_PARSE", "true").lower() in ("1", "true", "yes")
+AI_WORKERS = int(os.getenv("AI_WORKERS", "8"))
+# Maximum simultaneous requests to Screener.in (shared by all chats)
+SCREENER_MAX_CONCURRENCY = int(os.getenv("SCREENER_MAX_CONCURRENCY", "8"))
+# Consecutive failed requests after which Screener.in is left alone for a while (seconds)
+SCREENER_BREAKER_THRESHOLD = int(os.getenv("SCREENER_BREAKER_THRESHOLD", "5"))
+SCREENER_BREAKER_RESET = float(os.getenv("SCREENER_BREAKER_RESET", "30"))
+
+# Batch Configuration
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "25"))
+# Minimum seconds between progress edits of a /batch status message
+BATCH_EDIT_INTERVAL = float(os.getenv("BATCH_EDIT_INTERVAL", "1.0"))
+# Stocks analysed per Gemini request in batched insight generation
+INSIGHTS_BATCH_SIZE = int(os.getenv("INSIGHTS_BATCH_SIZE", "5"))
+# Show an instant rule-based take while Gemini works, and instead of it when Gemini fails
+QUICK_INSIGHTS_ENABLED = os.getenv("QUICK_INSIGHTS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Overrides of the take's thresholds, e.g. "roe_high=20,pe_high=35" (names in quick_insights.py)
+QUICK_INSIGHT_THRESHOLDS = os.getenv("QUICK_INSIGHT_THRESHOLDS", "")
+# Most stocks listed in one /screen reply
+SCREEN_MAX_RESULTS = int(os.getenv("SCREEN_MAX_RESULTS", "25"))
+
+# Streaming Configuration
+# Show AI insights progressively as Gemini generates them
+STREAM_INSIGHTS = os.getenv("STREAM_INSIGHTS", "true").lower() in ("1", "true", "yes")
+# Minimum seconds between edits of a streaming message
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+
+# Page Cache Configuration (seconds / entries)
+PAGE_CACHE_TTL = float(os.getenv("PAGE_CACHE_TTL", "900"))
+PAGE_CACHE_TTL_MARKET_HOURS = float(os.getenv("PAGE_CACHE_TTL_MARKET_HOURS", "120"))
+PAGE_CACHE_MAX_ENTRIES = int(os.getenv("PAGE_CACHE_MAX_ENTRIES", "512"))
+# Bytes of raw pages kept so financial statements can be read without fetching again (0 disables)
+STATEMENT_CACHE_MAX_BYTES = int(os.getenv("STATEMENT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Prefetch Configuration
+# Keep popular stocks' metrics warm in the page cache from a background task
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "true").lower() in ("1", "true", "yes")
+# Global budget of background requests to Screener.in, and how many stocks to keep warm
+PREFETCH_REQUESTS_PER_MINUTE = float(os.getenv("PREFETCH_REQUESTS_PER_MINUTE", "20"))
+PREFETCH_MAX_STOCKS = int(os.getenv("PREFETCH_MAX_STOCKS", "60"))
+
+# Metric History Configuration
+# SQLite file every scraped page's metrics are appended to; empty disables /history
+HISTORY_DB_PATH = os.getenv("HISTORY_DB_PATH", "history.sqlite3")
+
+# Alert Configuration
+# SQLite file /alert rules are kept in; empty disables /alert
+ALERTS_DB_PATH = os.getenv("ALERTS_DB_PATH", "alerts.sqlite3")
+# Most alerts one chat may have at a time
+ALERTS_PER_CHAT = int(os.getenv("ALERTS_PER_CHAT", "20"))
+# Pace of everything the bot sends (messages per second), and seconds between alert notifications to one chat
+TELEGRAM_MESSAGES_PER_SECOND = float(os.getenv("TELEGRAM_MESSAGES_PER_SECOND", "25"))
+TELEGRAM_CHAT_INTERVAL = float(os.getenv("TELEGRAM_CHAT_INTERVAL", "1.0"))
+
+# Insight Cache Configuration
+# SQLite file for cached AI insights (empty to disable)
+INSIGHT_CACHE_PATH = os.getenv("INSIGHT_CACHE_PATH", "insight_cache.sqlite3")
+# Seconds an insight is fresh, and how long a stale one may still be served while it is refreshed
+INSIGHT_CACHE_TTL = float(os.getenv("INSIGHT_CACHE_TTL", "21600"))
+INSIGHT_CACHE_MAX_STALE = float(os.getenv("INSIGHT_CACHE_MAX_STALE", "259200"))
+INSIGHT_CACHE_MAX_ENTRIES = int(os.getenv("INSIGHT_CACHE_MAX_ENTRIES", "5000"))
+
+# Gemini Quota Configuration (free tier: 15 requests/minute, 1,500 requests/day)
+GEMINI_REQUESTS_PER_MINUTE = int(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "15"))
+GEMINI_REQUESTS_PER_DAY = int(os.getenv("GEMINI_REQUESTS_PER_DAY", "1500"))
+# Daily requests background refreshes may not use, kept for user queries
+GEMINI_BACKGROUND_RESERVE = int(os.getenv("GEMINI_BACKGROUND_RESERVE", "150"))
+
+# Metrics Configuration
+# Collect per-stage timings and counters (cheap enough to leave on)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Local Prometheus /metrics endpoint (port 0 disables it)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+
 # Validate required environment variables
 if not TELEGRAM_BOT_TOKEN:
     raise ValueError("TELEGRAM_BOT_TOKEN environment variable is required")
@@ -17,3 +114,6 @@ if not TELEGRAM_BOT_TOKEN:
 if not GEMINI_API_KEY:
     raise ValueError("GEMINI_API_KEY environment variable is required")
 
+if BOT_MODE == "webhook" and not WEBHOOK_URL:
+    raise ValueError("WEBHOOK_URL environment variable is required when BOT_MODE=webhook")
+
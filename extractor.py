@@ -0,0 +1,275 @@
+"""Single-pass metric extraction for Screener.in company pages."""
+import re
+import threading
+from itertools import islice
+from typing import Dict, List, Optional, Tuple
+from bs4 import BeautifulSoup
+from lxml import etree, html
+
+# Metric name -> labels to look for, in order of preference
+METRIC_SYNONYMS = {
+    "Market Cap": ["Market Cap", "Market capitalization"],
+    "P/E": ["P/E", "PE", "Price to Earnings"],
+    "ROCE": ["ROCE", "Return on Capital Employed"],
+    "ROE": ["ROE", "Return on Equity"],
+    "Debt": ["Debt", "Total Debt"],
+    "High / Low": ["High / Low", "52W High / Low"],
+    "Profit Growth": ["Profit Growth", "Net Profit Growth"],
+    "Sales Growth": ["Sales Growth", "Revenue Growth"],
+    "Cash Flows": ["Cash", "Cash Flow", "Operating Cash Flow"],
+}
+
+HIGH_SYNONYMS = ["High", "52W High"]
+LOW_SYNONYMS = ["Low", "52W Low"]
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_PRICE_CLASS_RE = re.compile("price", re.I)
+_PRICE_CLEAN_RE = re.compile(r"[^\d.,]")
+
+# Fields every real company page has; the fast path falls back to BeautifulSoup without them
+REQUIRED_FIELDS = ("Company Name", "Current Price", "Market Cap")
+
+_parsers = threading.local()
+
+
+def normalize_label(text: str) -> str:
+    """Lower-case a label and collapse whitespace (including &nbsp;)."""
+    return _WHITESPACE_RE.sub(" ", text.replace("\xa0", " ")).strip().lower()
+
+
+class PageIndex:
+    """
+    Label -> value index of a company page, built from one walk of the document.
+    
+    Ratio list items (``<li>`` with a ``span.name`` label, e.g. ``#top-ratios``)
+    and every table row's first two cells are indexed, so each metric synonym
+    is resolved with dictionary lookups instead of re-scanning the tree.
+    """
+    
+    def __init__(self, soup):
+        """
+        Build the index.
+        
+        Args:
+            soup: Parsed company page
+        """
+        self.company_name: Optional[str] = None
+        self.price_text: Optional[str] = None
+        # Exact label -> value, plus (label, value) in document order for substring matches
+        self.ratios: Dict[str, str] = {}
+        self.ratio_items: List[Tuple[str, str]] = []
+        self.rows: Dict[str, Optional[str]] = {}
+        self.row_items: List[Tuple[str, Optional[str]]] = []
+        self._index(soup)
+    
+    def _index(self, soup: BeautifulSoup):
+        top_ratios: List[Tuple[str, str]] = []
+        other_ratios: List[Tuple[str, str]] = []
+        
+        for elem in soup.find_all(["h1", "span", "li", "tr"]):
+            name = elem.name
+            if name == "tr":
+                cells = elem.find_all("td", limit=2)
+                if len(cells) == 2:
+                    label = normalize_label(cells[0].get_text(strip=True))
+                    value = cells[1].get_text(strip=True) or None
+                    self.row_items.append((label, value))
+                    self.rows.setdefault(label, value)
+            elif name == "li":
+                label_elem = elem.find("span", class_="name")
+                if label_elem is None:
+                    continue
+                numbers = [n.get_text(strip=True) for n in elem.find_all("span", class_="number")]
+                if not numbers:
+                    continue
+                item = (normalize_label(label_elem.get_text()), " / ".join(numbers))
+                parent = elem.parent
+                if parent is not None and parent.get("id") == "top-ratios":
+                    top_ratios.append(item)
+                else:
+                    other_ratios.append(item)
+            elif name == "span":
+                if self.price_text is None and (
+                    elem.get("id") == "top-price" or _PRICE_CLASS_RE.search(" ".join(elem.get("class", [])))
+                ):
+                    self.price_text = elem.get_text(strip=True)
+            elif self.company_name is None:
+                self.company_name = elem.get_text(strip=True)
+        
+        self._set_ratios(top_ratios, other_ratios)
+    
+    def _set_ratios(self, top_ratios: List[Tuple[str, str]], other_ratios: List[Tuple[str, str]]):
+        # The headline ratios list wins over ratio-like lists elsewhere on the page
+        self.ratio_items = top_ratios + other_ratios
+        for label, value in self.ratio_items:
+            self.ratios.setdefault(label, value)
+    
+    def lookup(self, term: str) -> Optional[str]:
+        """
+        Resolve a label to its value.
+        
+        Ratios are checked before table rows; within each, an exact label
+        match is preferred over the first label containing the term.
+        
+        Args:
+            term: Label to look for (case-insensitive)
+            
+        Returns:
+            Value text or None
+        """
+        key = normalize_label(term)
+        for exact, items in ((self.ratios, self.ratio_items), (self.rows, self.row_items)):
+            value = exact.get(key)
+            if value:
+                return value
+            for label, value in items:
+                if value and key in label:
+                    return value
+        return None
+    
+    def lookup_any(self, terms: List[str]) -> Optional[str]:
+        """Return the value of the first term that resolves."""
+        for term in terms:
+            value = self.lookup(term)
+            if value:
+                return value
+        return None
+
+
+def _text(elem) -> str:
+    """lxml equivalent of BeautifulSoup's get_text(strip=True)."""
+    return "".join(part.strip() for part in elem.itertext())
+
+
+def _has_class(elem, name: str) -> bool:
+    return name in (elem.get("class") or "").split()
+
+
+class LxmlPageIndex(PageIndex):
+    """
+    PageIndex built from an lxml tree instead of a BeautifulSoup one.
+    
+    Indexes the same elements with the same rules, but the tree is built and
+    walked by libxml2 without creating a Python object per node, which makes
+    it several times cheaper in CPU and memory.
+    """
+    
+    def _index(self, root):
+        top_ratios: List[Tuple[str, str]] = []
+        other_ratios: List[Tuple[str, str]] = []
+        
+        for elem in root.iter("h1", "span", "li", "tr"):
+            tag = elem.tag
+            if tag == "tr":
+                cells = list(islice(elem.iter("td"), 2))
+                if len(cells) == 2:
+                    label = normalize_label(_text(cells[0]))
+                    value = _text(cells[1]) or None
+                    self.row_items.append((label, value))
+                    self.rows.setdefault(label, value)
+            elif tag == "li":
+                label_elem = next((s for s in elem.iter("span") if _has_class(s, "name")), None)
+                if label_elem is None:
+                    continue
+                numbers = [_text(s) for s in elem.iter("span") if _has_class(s, "number")]
+                if not numbers:
+                    continue
+                item = (normalize_label("".join(label_elem.itertext())), " / ".join(numbers))
+                parent = elem.getparent()
+                if parent is not None and parent.get("id") == "top-ratios":
+                    top_ratios.append(item)
+                else:
+                    other_ratios.append(item)
+            elif tag == "span":
+                if self.price_text is None and (
+                    elem.get("id") == "top-price" or _PRICE_CLASS_RE.search(elem.get("class") or "")
+                ):
+                    self.price_text = _text(elem)
+            elif self.company_name is None:
+                self.company_name = _text(elem)
+        
+        self._set_ratios(top_ratios, other_ratios)
+
+
+def _lxml_parser() -> html.HTMLParser:
+    # lxml parsers must not be shared between threads
+    parser = getattr(_parsers, "html", None)
+    if parser is None:
+        parser = _parsers.html = html.HTMLParser(
+            encoding="utf-8", remove_comments=True, remove_pis=True, collect_ids=False, no_network=True
+        )
+    return parser
+
+
+def extract_metrics_fast(content: bytes) -> Optional[Dict[str, Optional[str]]]:
+    """
+    Extract headline metrics straight from page bytes with lxml.
+    
+    Args:
+        content: Raw HTML of the company page (UTF-8, as Screener.in serves it)
+        
+    Returns:
+        Dictionary containing scraped metrics, or None if the page could not be
+        parsed or lacks a REQUIRED_FIELDS entry (callers then use the
+        BeautifulSoup path)
+    """
+    try:
+        root = etree.fromstring(content, _lxml_parser())
+    except (etree.LxmlError, ValueError):
+        return None
+    if root is None:
+        return None
+    data = metrics_from_index(LxmlPageIndex(root))
+    if not all(data.get(field) for field in REQUIRED_FIELDS):
+        return None
+    return data
+
+
+def extract_metrics(soup: BeautifulSoup) -> Dict[str, Optional[str]]:
+    """
+    Extract headline metrics from a parsed company page.
+    
+    Args:
+        soup: Parsed company page
+        
+    Returns:
+        Dictionary containing scraped metrics
+    """
+    return metrics_from_index(PageIndex(soup))
+
+
+def metrics_from_index(index: PageIndex) -> Dict[str, Optional[str]]:
+    """
+    Resolve headline metrics from a page index.
+    
+    Args:
+        index: PageIndex (or LxmlPageIndex) of a company page
+        
+    Returns:
+        Dictionary containing scraped metrics
+    """
+    data = {}
+    
+    if index.company_name:
+        data["Company Name"] = index.company_name
+    
+    price_text = index.price_text or index.lookup("Current Price")
+    if price_text:
+        # Clean price text
+        price_text = _PRICE_CLEAN_RE.sub("", price_text)
+        if price_text:
+            data["Current Price"] = f"₹{price_text}"
+    
+    for metric_key, search_terms in METRIC_SYNONYMS.items():
+        value = index.lookup_any(search_terms)
+        if value:
+            data[metric_key] = value
+    
+    # Special handling for High/Low if not found together
+    if not data.get("High / Low"):
+        high = index.lookup_any(HIGH_SYNONYMS)
+        low = index.lookup_any(LOW_SYNONYMS)
+        if high and low:
+            data["High / Low"] = f"{high} / {low}"
+    
+    return data
@@ -0,0 +1,332 @@
+"""Local time series of scraped metrics, stored as typed numbers in SQLite."""
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from cache import IST
+
+# Unit of each stored metric: "inr" rupees, "crore" rupees in crores,
+# "fraction" percentages as fractions (12.5% -> 0.125), "ratio" plain numbers
+METRIC_UNITS = {
+    "Current Price": "inr",
+    "Market Cap": "crore",
+    "P/E": "ratio",
+    "ROCE": "fraction",
+    "ROE": "fraction",
+    "Debt": "crore",
+    "52W High": "inr",
+    "52W Low": "inr",
+    "Profit Growth": "fraction",
+    "Sales Growth": "fraction",
+    "Cash Flows": "crore",
+}
+
+_NUMBER_RE = re.compile(r"[-+]?\d[\d,]*(?:\.\d+)?|[-+]?\.\d+")
+_LAKH_CRORE_RE = re.compile(r"lakh\s*cr", re.I)
+
+
+def parse_number(text: Optional[str], unit: str = "ratio") -> Optional[float]:
+    """
+    Parse a scraped value into a number in the metric's unit.
+    
+    Handles rupee signs, Indian digit grouping and unicode minus signs, e.g.
+    "₹16,50,000 Cr" -> 1650000.0 (crores), "₹1.65 Lakh Cr" -> 165000.0 and
+    "12.5%" -> 0.125. Values of fraction metrics are percentages on the page,
+    with or without a % sign.
+    
+    Args:
+        text: Value as scraped
+        unit: Unit from METRIC_UNITS
+        
+    Returns:
+        Parsed number, or None if the text holds no number
+    """
+    if not text:
+        return None
+    text = text.replace("−", "-").replace("\xa0", " ")
+    match = _NUMBER_RE.search(text)
+    if match is None:
+        return None
+    value = float(match.group().replace(",", ""))
+    if unit == "fraction":
+        return value / 100
+    if unit == "crore" and _LAKH_CRORE_RE.search(text):
+        return value * 100000
+    return value
+
+
+def typed_metrics(data: Dict[str, Optional[str]]) -> Dict[str, float]:
+    """
+    Convert scraped metrics into typed numbers.
+    
+    "High / Low" is split into "52W High" and "52W Low"; metrics that are
+    missing or hold no number are left out.
+    
+    Args:
+        data: Metrics as returned by the scraper
+        
+    Returns:
+        Metric name -> value in the unit from METRIC_UNITS
+    """
+    values = {}
+    for metric, unit in METRIC_UNITS.items():
+        value = parse_number(data.get(metric), unit)
+        if value is not None:
+            values[metric] = value
+    high_low = data.get("High / Low")
+    if high_low and "/" in high_low:
+        high, low = high_low.split("/", 1)
+        for metric, text in (("52W High", high), ("52W Low", low)):
+            value = parse_number(text, "inr")
+            if value is not None:
+                values[metric] = value
+    return values
+
+
+def format_value(metric: str, value: float) -> str:
+    """Format a stored value for display in its unit."""
+    unit = METRIC_UNITS.get(metric, "ratio")
+    if unit == "fraction":
+        return f"{value * 100:.1f}%"
+    if unit == "crore":
+        return f"₹{value:,.0f} Cr"
+    if unit == "inr":
+        return f"₹{value:,.2f}"
+    return f"{value:,.2f}"
+
+
+def format_change(metric: str, change: float) -> str:
+    """Format a change between two values (percentage points for fractions)."""
+    unit = METRIC_UNITS.get(metric, "ratio")
+    if unit == "fraction":
+        return f"{change * 100:+.1f} pp"
+    if unit == "crore":
+        return f"{change:+,.0f} Cr"
+    return f"{change:+,.2f}"
+
+
+def market_day(timestamp: float) -> date:
+    """Return the IST calendar date of a Unix timestamp."""
+    return datetime.fromtimestamp(timestamp, IST).date()
+
+
+class Observation(NamedTuple):
+    day: date
+    value: float
+
+
+class Delta(NamedTuple):
+    metric: str
+    start: Observation
+    end: Observation
+    change: float
+    relative: Optional[float]
+
+
+class HistoryStore:
+    """
+    Append-only daily history of every stock's metrics.
+    
+    One row is kept per stock, metric and IST day (the latest scrape of the
+    day wins). Rows use integer ids for stocks and metrics in a WITHOUT ROWID
+    table clustered on (stock, metric, day), so a stock's history is a single
+    index range scan and a row costs about 20 bytes: a year of daily data for
+    the Nifty 50 takes roughly 3 MB.
+    """
+    
+    def __init__(self, path: str = "history.sqlite3", clock: Callable[[], float] = time.time):
+        """
+        Open (or create) the history database.
+        
+        Args:
+            path: SQLite database file, or ":memory:"
+            clock: Wall-clock time source
+        """
+        self.path = path
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._stock_ids: Dict[str, int] = {}
+        self._metric_ids: Dict[str, int] = {}
+        self.writes = 0
+        
+        directory = os.path.dirname(path)
+        if directory and path != ":memory:":
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS stocks (id INTEGER PRIMARY KEY, slug TEXT NOT NULL UNIQUE)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS metrics (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS observations ("
+            " stock INTEGER NOT NULL,"
+            " metric INTEGER NOT NULL,"
+            " day INTEGER NOT NULL,"
+            " value REAL NOT NULL,"
+            " PRIMARY KEY (stock, metric, day)) WITHOUT ROWID"
+        )
+        self._load_ids()
+    
+    def _load_ids(self):
+        self._stock_ids = dict(self._conn.execute("SELECT slug, id FROM stocks"))
+        self._metric_ids = dict(self._conn.execute("SELECT name, id FROM metrics"))
+    
+    def _stock_id(self, slug: str) -> int:
+        if slug not in self._stock_ids:
+            self._stock_ids[slug] = self._conn.execute("INSERT INTO stocks (slug) VALUES (?)", (slug,)).lastrowid
+        return self._stock_ids[slug]
+    
+    def _metric_id(self, name: str) -> int:
+        if name not in self._metric_ids:
+            self._metric_ids[name] = self._conn.execute("INSERT INTO metrics (name) VALUES (?)", (name,)).lastrowid
+        return self._metric_ids[name]
+    
+    def record(self, slug: str, data: Dict[str, Optional[str]], timestamp: Optional[float] = None) -> int:
+        """
+        Store a scrape result.
+        
+        Args:
+            slug: Company slug
+            data: Metrics as returned by the scraper
+            timestamp: When the metrics were scraped (defaults to now)
+            
+        Returns:
+            Number of metric values stored
+        """
+        return self.record_values(slug, typed_metrics(data), timestamp)
+    
+    def record_values(self, slug: str, values: Dict[str, float], timestamp: Optional[float] = None) -> int:
+        """
+        Store already typed metric values (e.g. StockSnapshot.metrics()).
+        
+        Args:
+            slug: Company slug
+            values: Metric name -> value in the unit from METRIC_UNITS
+            timestamp: When the metrics were scraped (defaults to now)
+            
+        Returns:
+            Number of metric values stored
+        """
+        if not values:
+            return 0
+        day = market_day(self._clock() if timestamp is None else timestamp).toordinal()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                stock = self._stock_id(slug)
+                rows = [(stock, self._metric_id(metric), day, value) for metric, value in values.items()]
+                self._conn.executemany("INSERT OR REPLACE INTO observations VALUES (?, ?, ?, ?)", rows)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                # Ids handed out inside the rolled-back transaction are gone
+                self._load_ids()
+                raise
+            self.writes += 1
+        return len(rows)
+    
+    def history(self, slug: str, metric: Optional[str] = None, days: Optional[int] = None) -> Dict[str, List[Observation]]:
+        """
+        Return a stock's stored values, oldest first.
+        
+        Args:
+            slug: Company slug
+            metric: Only this metric (default all)
+            days: Only the last this many days (default everything)
+            
+        Returns:
+            Metric name -> observations
+        """
+        since = 0
+        if days is not None:
+            since = (market_day(self._clock()) - timedelta(days=days)).toordinal()
+        with self._lock:
+            stock = self._stock_ids.get(slug)
+            if stock is None:
+                return {}
+            sql = ("SELECT m.name, o.day, o.value FROM observations o JOIN metrics m ON m.id = o.metric"
+                   " WHERE o.stock = ? AND o.day >= ?")
+            params = [stock, since]
+            if metric is not None:
+                metric_id = self._metric_ids.get(metric)
+                if metric_id is None:
+                    return {}
+                sql += " AND o.metric = ?"
+                params.append(metric_id)
+            rows = self._conn.execute(sql + " ORDER BY o.metric, o.day", params).fetchall()
+        result: Dict[str, List[Observation]] = {}
+        for name, day, value in rows:
+            result.setdefault(name, []).append(Observation(date.fromordinal(day), value))
+        return result
+    
+    def deltas(self, slug: str, days: int = 7, metric: Optional[str] = None) -> List[Delta]:
+        """
+        Compare each metric's latest value with its value days ago.
+        
+        The start is the last observation on or before the start of the
+        window, or the oldest one inside it if the history is shorter.
+        
+        Args:
+            slug: Company slug
+            days: Window length in days
+            metric: Only this metric (default all)
+            
+        Returns:
+            Deltas for metrics with at least two observations, in METRIC_UNITS order
+        """
+        start_day = market_day(self._clock()) - timedelta(days=days)
+        deltas = []
+        for name, observations in self.history(slug, metric).items():
+            recent = [o for o in observations if o.day >= start_day]
+            if not recent:
+                continue
+            earlier = [o for o in observations if o.day <= start_day]
+            start = earlier[-1] if earlier else recent[0]
+            end = recent[-1]
+            if start.day == end.day:
+                continue
+            change = end.value - start.value
+            relative = change / abs(start.value) if start.value else None
+            deltas.append(Delta(name, start, end, change, relative))
+        order = {name: i for i, name in enumerate(METRIC_UNITS)}
+        deltas.sort(key=lambda d: order.get(d.metric, len(order)))
+        return deltas
+    
+    def latest(self, slug: str) -> Dict[str, Observation]:
+        """Return the most recent stored value of each metric for a stock."""
+        return {name: observations[-1] for name, observations in self.history(slug).items()}
+    
+    def latest_all(self) -> Dict[str, Dict[str, Observation]]:
+        """Return the most recent stored value of each metric for every stock."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT s.slug, m.name, o.day, o.value FROM observations o"
+                " JOIN stocks s ON s.id = o.stock JOIN metrics m ON m.id = o.metric"
+                " WHERE o.day = (SELECT MAX(day) FROM observations"
+                " WHERE stock = o.stock AND metric = o.metric)"
+            ).fetchall()
+        result: Dict[str, Dict[str, Observation]] = {}
+        for slug, name, day, value in rows:
+            result.setdefault(slug, {})[name] = Observation(date.fromordinal(day), value)
+        return result
+    
+    def stats(self) -> Dict[str, int]:
+        """Return stock and row counts plus the database size in bytes."""
+        with self._lock:
+            rows = self._conn.execute("SELECT COUNT(*) FROM observations").fetchone()[0]
+            page_count = self._conn.execute("PRAGMA page_count").fetchone()[0]
+            page_size = self._conn.execute("PRAGMA page_size").fetchone()[0]
+        return {
+            "stocks": len(self._stock_ids),
+            "rows": rows,
+            "bytes": page_count * page_size,
+        }
+    
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,180 @@
+"""HTTP helpers for polite fetching: compression, conditional requests, retries and circuit breaking."""
+import importlib.util
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, NamedTuple, Optional
+
+# Statuses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+def accept_encoding() -> str:
+    """
+    Build an Accept-Encoding header listing only codings we can decode.
+    
+    gzip and deflate are always available; br and zstd are only advertised
+    when the optional decoder packages that requests/httpx use are installed,
+    otherwise the server could send a body we cannot read.
+    
+    Returns:
+        Header value, e.g. "gzip, deflate, br"
+    """
+    encodings = ["gzip", "deflate"]
+    if importlib.util.find_spec("brotli") or importlib.util.find_spec("brotlicffi"):
+        encodings.append("br")
+    if importlib.util.find_spec("zstandard"):
+        encodings.append("zstd")
+    return ", ".join(encodings)
+
+
+class Validators(NamedTuple):
+    """Cache validators returned with a page, replayed as a conditional request."""
+    etag: Optional[str]
+    last_modified: Optional[str]
+    
+    @classmethod
+    def from_headers(cls, headers) -> Optional["Validators"]:
+        """Return the response's validators, or None if it sent neither."""
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return None
+        return cls(etag, last_modified)
+    
+    def request_headers(self) -> Dict[str, str]:
+        """Return If-None-Match / If-Modified-Since headers for these validators."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header given as seconds or as an HTTP date.
+    
+    Args:
+        value: Header value or None
+        
+    Returns:
+        Seconds to wait, or None if missing or unparseable
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 8.0,
+                  rng: Optional[random.Random] = None) -> float:
+    """
+    Full-jitter exponential backoff: a random delay up to base * 2 ** attempt.
+    
+    Args:
+        attempt: Zero-based retry number
+        base: Upper bound of the first delay in seconds
+        cap: Largest upper bound in seconds
+        rng: Random source
+        
+    Returns:
+        Delay in seconds
+    """
+    return (rng or random).uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Stop calling a failing upstream for a while.
+    
+    After ``failure_threshold`` consecutive failures the breaker opens and
+    rejects requests for ``reset_timeout`` seconds. It then lets a single
+    trial request through (half-open): success closes it, failure opens it
+    again.
+    """
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Initialize a closed breaker.
+        
+        Args:
+            failure_threshold: Consecutive failures that open the breaker
+            reset_timeout: Seconds to stay open before a trial request
+            clock: Monotonic time source
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self.rejected = 0
+    
+    @property
+    def state(self) -> str:
+        """Current state, moving from open to half-open once the timeout has passed."""
+        with self._lock:
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+                self._trial_in_flight = False
+            return self._state
+    
+    def retry_in(self) -> float:
+        """Seconds until an open breaker lets a trial request through."""
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (self._clock() - self._opened_at))
+    
+    def allow(self) -> bool:
+        """Return True if a request may be sent now."""
+        state = self.state
+        with self._lock:
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+    
+    def record_success(self):
+        """Close the breaker after a request that reached a healthy upstream."""
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+    
+    def abandon_trial(self):
+        """Let another trial through after one that ended without an answer (e.g. was cancelled)."""
+        with self._lock:
+            self._trial_in_flight = False
+    
+    def record_failure(self):
+        """Count a failed request, opening the breaker at the threshold or after a failed trial."""
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+                self._trial_in_flight = False
@@ -0,0 +1,197 @@
+"""Persistent, content-addressed cache of generated AI insights."""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, NamedTuple, Optional
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_NUMBER_RE = re.compile(r"\d[\d,]*(?:\.\d+)?")
+
+# Fields that move with the share price, so they change on every tick during market hours
+VOLATILE_FIELDS = ("current price", "market cap", "p/e", "high / low")
+# Their numbers are rounded to this many significant digits in the key
+VOLATILE_DIGITS = 2
+
+
+def _round_number(match: re.Match) -> str:
+    return f"{float(match.group().replace(',', '')):.{VOLATILE_DIGITS}g}"
+
+
+def normalize_prompt_data(text: str) -> str:
+    """
+    Normalize formatted prompt data so equivalent metrics hash the same.
+    
+    Whitespace is collapsed, case is folded and lines are sorted, so the key
+    does not change with metric order or cosmetic spacing on the page.
+    Numbers in VOLATILE_FIELDS are rounded (₹2,456.30 and ₹2,461.05 both
+    become 2.5e+03), so scrapes a few ticks apart share insights.
+    
+    Args:
+        text: Output of AIInsightsGenerator.format_data_for_prompt
+        
+    Returns:
+        Canonical text
+    """
+    lines = []
+    for line in text.splitlines():
+        line = _WHITESPACE_RE.sub(" ", line).strip().lower()
+        label, separator, value = line.partition(":")
+        if separator and label in VOLATILE_FIELDS:
+            line = f"{label}:{_NUMBER_RE.sub(_round_number, value)}"
+        if line:
+            lines.append(line)
+    return "\n".join(sorted(lines))
+
+
+def insight_key(model_name: str, template_version: str, prompt_data: str) -> str:
+    """Return the cache key for a model, prompt template version and formatted prompt data."""
+    digest = hashlib.sha256()
+    for part in (model_name, template_version, normalize_prompt_data(prompt_data)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class CachedInsight(NamedTuple):
+    text: str
+    age: float
+    fresh: bool
+
+
+class InsightCache:
+    """
+    SQLite-backed insight cache with TTL and size eviction.
+    
+    Entries younger than ``ttl`` are fresh. Older entries are still returned
+    (marked stale) until ``max_stale`` so callers can answer immediately and
+    refresh in the background; beyond that they are treated as missing and
+    purged. When more than ``max_entries`` are stored, the least recently
+    used are evicted.
+    """
+    
+    # Expired entries are purged every this many writes
+    PURGE_INTERVAL = 100
+    
+    def __init__(self, path: str = "insight_cache.sqlite3", ttl: float = 6 * 3600,
+                 max_stale: float = 3 * 86400, max_entries: int = 5000,
+                 clock: Callable[[], float] = time.time):
+        """
+        Open (or create) the cache database.
+        
+        Args:
+            path: SQLite database file, or ":memory:"
+            ttl: Seconds an entry is considered fresh
+            max_stale: Seconds after which an entry is no longer served at all
+            max_entries: Maximum number of stored insights
+            clock: Wall-clock time source (a persistent cache outlives the process)
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_stale = max(max_stale, ttl)
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        
+        directory = os.path.dirname(path)
+        if directory and path != ":memory:":
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS insights ("
+            " key TEXT PRIMARY KEY,"
+            " text TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS insights_accessed ON insights (accessed)")
+        self.purge()
+    
+    def get(self, key: str) -> Optional[CachedInsight]:
+        """
+        Look up an insight.
+        
+        Args:
+            key: Cache key from insight_key
+            
+        Returns:
+            CachedInsight (possibly stale) or None if missing or too old
+        """
+        now = self._clock()
+        with self._lock:
+            row = self._conn.execute("SELECT text, created FROM insights WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.max_stale:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE insights SET accessed = ? WHERE key = ?", (now, key))
+            age = now - row[1]
+            fresh = age <= self.ttl
+            if fresh:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+            return CachedInsight(row[0], age, fresh)
+    
+    def set(self, key: str, text: str):
+        """Store an insight, evicting the least recently used entries beyond max_entries."""
+        now = self._clock()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO insights (key, text, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, text, now, now),
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_INTERVAL == 0:
+                self._purge_expired(now)
+            self._evict_overflow()
+    
+    def invalidate(self, key: str):
+        """Drop a single entry."""
+        with self._lock:
+            self._conn.execute("DELETE FROM insights WHERE key = ?", (key,))
+    
+    def purge(self):
+        """Remove entries older than max_stale and enforce the size limit."""
+        with self._lock:
+            self._purge_expired(self._clock())
+            self._evict_overflow()
+    
+    def _purge_expired(self, now: float):
+        self._conn.execute("DELETE FROM insights WHERE created < ?", (now - self.max_stale,))
+    
+    def _evict_overflow(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM insights").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM insights WHERE key IN "
+                "(SELECT key FROM insights ORDER BY accessed LIMIT ?)",
+                (count - self.max_entries,),
+            )
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM insights").fetchone()[0]
+    
+    def stats(self) -> Dict[str, float]:
+        """Return entry count and hit/stale-hit/miss counters."""
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+        }
+    
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,271 @@
+"""
+Lightweight timing spans, counters and a Prometheus-style /metrics endpoint.
+
+Instrumented code calls the module-level helpers::
+
+    with metrics.span("fetch"):
+        response = client.get(url)
+    metrics.inc("page_cache_hits")
+    
+While collection is disabled (the default until enable() is called) both are
+a single flag check, so instrumentation can stay in the hot paths.
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Deque, Dict, List, Optional, Tuple
+
+NAMESPACE = "finsight"
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Recent samples kept per stage for p50/p95/p99
+RESERVOIR_SIZE = 2048
+QUANTILES = (0.5, 0.95, 0.99)
+
+_enabled = False
+_lock = threading.Lock()
+
+
+class _Histogram:
+    """Cumulative buckets plus a window of recent samples for quantiles."""
+    
+    __slots__ = ("bucket_counts", "total", "count", "samples")
+    
+    def __init__(self):
+        self.bucket_counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.samples: Deque[float] = deque(maxlen=RESERVOIR_SIZE)
+    
+    def observe(self, value: float):
+        self.bucket_counts[bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+        self.samples.append(value)
+    
+    def quantiles(self) -> Dict[float, float]:
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {}
+        return {q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in QUANTILES}
+
+
+_histograms: Dict[str, _Histogram] = {}
+_counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+
+
+class _NoopSpan:
+    __slots__ = ()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+
+
+class _Span:
+    __slots__ = ("stage", "start")
+    
+    def __init__(self, stage: str):
+        self.stage = stage
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def enable(enabled: bool = True):
+    """Turn metric collection on or off."""
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled() -> bool:
+    """Return whether metrics are being collected."""
+    return _enabled
+
+
+def span(stage: str):
+    """
+    Context manager timing a stage (works in sync and async code).
+    
+    Args:
+        stage: Stage name, e.g. "fetch" or "gemini"
+        
+    Returns:
+        Context manager recording the elapsed time into the stage histogram
+    """
+    if not _enabled:
+        return _NOOP_SPAN
+    return _Span(stage)
+
+
+def observe(stage: str, seconds: float):
+    """Record a duration for a stage."""
+    if not _enabled:
+        return
+    with _lock:
+        histogram = _histograms.get(stage)
+        if histogram is None:
+            histogram = _histograms[stage] = _Histogram()
+        histogram.observe(seconds)
+
+
+def inc(name: str, amount: float = 1, **labels: str):
+    """
+    Increment a counter.
+    
+    Args:
+        name: Counter name without namespace or _total suffix, e.g. "page_cache_hits"
+        amount: Increment
+        **labels: Optional label values, e.g. metric="ROE"
+    """
+    if not _enabled:
+        return
+    key = (name, tuple(sorted(labels.items())) if labels else ())
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def reset():
+    """Drop everything collected so far."""
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def snapshot() -> Dict[str, Dict]:
+    """
+    Return collected values as plain data.
+    
+    Returns:
+        {"counters": {"name{label=value}": count}, "stages": {stage: {count, sum, p50, p95, p99}}}
+    """
+    with _lock:
+        counters = {_series_name(name, labels): value for (name, labels), value in _counters.items()}
+        stages = {}
+        for stage, histogram in _histograms.items():
+            stats = {"count": histogram.count, "sum": histogram.total}
+            stats.update({f"p{int(q * 100)}": value for q, value in histogram.quantiles().items()})
+            stages[stage] = stats
+    return {"counters": counters, "stages": stages}
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _series_name(name: str, labels: Tuple[Tuple[str, str], ...]) -> str:
+    return name + _format_labels(labels)
+
+
+def render() -> str:
+    """Render all metrics in the Prometheus text exposition format."""
+    lines: List[str] = []
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted(_histograms.items())
+        
+        seen = set()
+        for (name, labels), value in counters:
+            metric = f"{NAMESPACE}_{name}_total"
+            if metric not in seen:
+                seen.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{_format_labels(labels)} {value:g}")
+        
+        if histograms:
+            metric = f"{NAMESPACE}_stage_duration_seconds"
+            lines.append(f"# HELP {metric} Time spent per processing stage.")
+            lines.append(f"# TYPE {metric} histogram")
+            for stage, histogram in histograms:
+                cumulative = 0
+                for bound, count in zip(BUCKETS + (float("inf"),), histogram.bucket_counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(f'{metric}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{stage="{stage}"}} {histogram.total:.6f}')
+                lines.append(f'{metric}_count{{stage="{stage}"}} {histogram.count}')
+            
+            metric = f"{NAMESPACE}_stage_latency_seconds"
+            lines.append(f"# HELP {metric} Recent per-stage latency quantiles.")
+            lines.append(f"# TYPE {metric} summary")
+            for stage, histogram in histograms:
+                for q, value in histogram.quantiles().items():
+                    lines.append(f'{metric}{{stage="{stage}",quantile="{q:g}"}} {value:.6f}')
+                lines.append(f'{metric}_sum{{stage="{stage}"}} {histogram.total:.6f}')
+                lines.append(f'{metric}_count{{stage="{stage}"}} {histogram.count}')
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serve render() at /metrics from a background thread."""
+    
+    def __init__(self, host: str = "127.0.0.1", port: int = 9464):
+        """
+        Initialize the server.
+        
+        Args:
+            host: Interface to bind (local only by default)
+            port: TCP port, 0 for any free port
+        """
+        self.host = host
+        self.port = port
+        self._httpd: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+    
+    def _make_handler(self):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body = render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        return Handler
+    
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+    
+    def start(self) -> str:
+        """Start serving and return the /metrics URL."""
+        self._httpd = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="metrics", daemon=True)
+        self._thread.start()
+        return self.url
+    
+    def stop(self):
+        """Stop the server."""
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
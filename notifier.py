@@ -0,0 +1,429 @@
+"""Paced delivery of the bot's Telegram messages: a priority send queue plus live-edited replies."""
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Set, Tuple
+
+from telegram import Message
+from telegram.error import BadRequest, RetryAfter
+
+import metrics
+from rate_limiter import Priority, TokenBucket
+
+# Telegram rejects messages longer than 4096 characters
+MAX_MESSAGE_LENGTH = 4000
+
+
+def _retry_seconds(error: RetryAfter) -> float:
+    retry_after = error.retry_after
+    return retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+
+
+class BatchedSender:
+    """
+    Send every bot message through one queue paced to Telegram's limits.
+    
+    Sends are limited globally (about 30 messages per second for a bot).
+    API calls made for a user (``call``) are served first, in order of
+    priority; notifications (``submit``) go out when no call is waiting,
+    at most one per chat every chat_interval seconds, and the ones queued
+    for a chat meanwhile are joined into one message. A RetryAfter pauses
+    every send for the time Telegram asks for and the call is retried;
+    other errors are passed back to the caller (or drop the notification).
+    """
+    
+    def __init__(self, send: Callable[[Hashable, str], Awaitable[None]],
+                 messages_per_second: float = 25, chat_interval: float = 1.0,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], Awaitable[None]] = asyncio.sleep):
+        """
+        Initialize the sender (call start() on the event loop to begin sending).
+        
+        Until it is started, call() runs requests straight away.
+        
+        Args:
+            send: Coroutine function sending one notification to a chat
+            messages_per_second: Global send rate
+            chat_interval: Minimum seconds between notifications to the same chat
+            clock: Monotonic time source
+            sleep: Coroutine used to wait
+        """
+        self._send = send
+        self.chat_interval = chat_interval
+        self._bucket = TokenBucket(messages_per_second, 1.0, clock)
+        self._clock = clock
+        self._sleep = sleep
+        # Waiting API calls: (priority, sequence, chat, request, future)
+        self._calls: List[Tuple[int, int, Hashable, Callable[[], Awaitable[Any]], asyncio.Future]] = []
+        self._sequence = itertools.count()
+        # Thread-safe inbox, so notifications can be submitted from worker threads
+        self._inbox: Deque[Tuple[Hashable, str]] = deque()
+        # chat -> notification texts waiting, in order of each chat's first queued text
+        self._pending: "OrderedDict[Hashable, List[str]]" = OrderedDict()
+        self._next_send: Dict[Hashable, float] = {}
+        self._sending: Set[asyncio.Task] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop_thread: Optional[int] = None
+        self.calls = 0
+        self.sent = 0
+        self.joined = 0
+        self.retries = 0
+        self.failed = 0
+    
+    async def call(self, chat_id: Hashable, request: Callable[[], Awaitable[Any]],
+                   priority: Priority = Priority.INTERACTIVE) -> Any:
+        """
+        Queue a Telegram API call and return its result once it has been made.
+        
+        Args:
+            chat_id: Chat the call is made in
+            request: Coroutine function making the call (it is retried after a RetryAfter)
+            priority: Calls of lower priority values are made first
+            
+        Returns:
+            The request's result
+        """
+        if self._task is None:
+            self.calls += 1
+            metrics.inc("telegram_calls", priority=priority.name.lower())
+            with metrics.span("telegram"):
+                return await request()
+        future = self._loop.create_future()
+        heapq.heappush(self._calls, (priority, next(self._sequence), chat_id, request, future))
+        self._wakeup.set()
+        return await future
+    
+    def submit(self, chat_id: Hashable, text: str):
+        """Queue a notification; safe to call from any thread."""
+        self._inbox.append((chat_id, text))
+        if self._loop is None:
+            return
+        if threading.get_ident() == self._loop_thread:
+            self._wakeup.set()
+        else:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+    
+    def pending(self) -> int:
+        """Return the number of queued calls and notifications."""
+        return len(self._calls) + len(self._inbox) + sum(len(texts) for texts in self._pending.values())
+    
+    def _drain_inbox(self):
+        while self._inbox:
+            chat_id, text = self._inbox.popleft()
+            self._pending.setdefault(chat_id, []).append(text)
+    
+    def _next_batch(self, now: float) -> Tuple[Optional[Hashable], float]:
+        """Return the first chat allowed to receive a notification now, or how long until one is."""
+        wait = float("inf")
+        for chat_id in self._pending:
+            ready_at = self._next_send.get(chat_id, 0.0)
+            if ready_at <= now:
+                return chat_id, 0.0
+            wait = min(wait, ready_at - now)
+        return None, wait
+    
+    def _take_text(self, chat_id: Hashable) -> str:
+        """Join as many of a chat's queued texts as fit in one message."""
+        texts = self._pending[chat_id]
+        parts = [texts.pop(0)]
+        length = len(parts[0])
+        while texts and length + 2 + len(texts[0]) <= MAX_MESSAGE_LENGTH:
+            length += 2 + len(texts[0])
+            parts.append(texts.pop(0))
+        if not texts:
+            del self._pending[chat_id]
+        self.joined += len(parts) - 1
+        return "\n\n".join(parts)
+    
+    def _hold(self, error: RetryAfter):
+        # Flood control applies to the whole bot, so every send is paused
+        self.retries += 1
+        metrics.inc("telegram_retry_after")
+        self._bucket.drain(hold=_retry_seconds(error))
+    
+    async def _make_call(self, entry):
+        priority, _, _, request, future = entry
+        if future.done():
+            return
+        try:
+            with metrics.span("telegram"):
+                result = await request()
+        except RetryAfter as e:
+            self._hold(e)
+            heapq.heappush(self._calls, entry)
+            # run() may be idle waiting for work; the bucket hold paces the retry
+            self._wakeup.set()
+            return
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(result)
+    
+    async def _send_notification(self, chat_id: Hashable, text: str):
+        try:
+            with metrics.span("telegram"):
+                await self._send(chat_id, text)
+            self.sent += 1
+            metrics.inc("notifications_sent")
+        except RetryAfter as e:
+            self._hold(e)
+            self._pending.setdefault(chat_id, []).insert(0, text)
+            self._pending.move_to_end(chat_id, last=False)
+            self._wakeup.set()
+        except Exception as e:
+            self.failed += 1
+            metrics.inc("notifications_failed")
+            print(f"Could not send notification to {chat_id}: {e}")
+    
+    def _launch(self, coroutine):
+        task = asyncio.ensure_future(coroutine)
+        self._sending.add(task)
+        task.add_done_callback(self._sending.discard)
+    
+    async def _wait_for_work(self, timeout: Optional[float] = None):
+        self._wakeup.clear()
+        if self._calls or self._inbox:
+            return
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+    
+    async def run(self):
+        """Make queued calls and send notifications until cancelled."""
+        while True:
+            self._drain_inbox()
+            if not self._calls and not self._pending:
+                await self._wait_for_work()
+                continue
+            
+            wait = self._bucket.time_until()
+            if wait > 0:
+                await self._sleep(wait)
+                continue
+            now = self._clock()
+            if self._calls:
+                entry = heapq.heappop(self._calls)
+                if entry[4].done():
+                    # The caller gave up (e.g. its query was cancelled)
+                    continue
+                self._bucket.take()
+                self.calls += 1
+                metrics.inc("telegram_calls", priority=Priority(entry[0]).name.lower())
+                self._next_send[entry[2]] = now + self.chat_interval
+                self._launch(self._make_call(entry))
+                continue
+            
+            chat_id, wait = self._next_batch(now)
+            if chat_id is None:
+                # Wake early if a call or a notification for another chat arrives
+                await self._wait_for_work(wait)
+                continue
+            self._bucket.take()
+            self.calls += 1
+            metrics.inc("telegram_calls", priority=Priority.BACKGROUND.name.lower())
+            self._next_send[chat_id] = now + self.chat_interval
+            self._launch(self._send_notification(chat_id, self._take_text(chat_id)))
+            # Forget chats that have not been sent to for a while
+            if len(self._next_send) > 1024:
+                self._next_send = {c: t for c, t in self._next_send.items() if t > now}
+    
+    def start(self):
+        """Start sending on the running event loop."""
+        if self._task is None or self._task.done():
+            self._loop = asyncio.get_running_loop()
+            self._loop_thread = threading.get_ident()
+            self._wakeup = asyncio.Event()
+            self._task = self._loop.create_task(self.run())
+            if self._inbox:
+                self._wakeup.set()
+    
+    async def stop(self):
+        """Stop sending; queued notifications are dropped and waiting calls cancelled."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for task in list(self._sending):
+            task.cancel()
+        for entry in self._calls:
+            entry[4].cancel()
+        self._calls.clear()
+        self._loop = None
+    
+    def stats(self) -> Dict[str, int]:
+        """Return queued, made, sent, joined, retried and failed counts."""
+        return {
+            "pending": self.pending(),
+            "calls": self.calls,
+            "sent": self.sent,
+            "joined": self.joined,
+            "retries": self.retries,
+            "failed": self.failed,
+        }
+
+
+class LiveMessage:
+    """
+    A reply that is sent once and then edited in place, always to its latest text.
+    
+    Text set while an earlier text is still queued or being sent replaces it,
+    so progress notes that have already been superseded never reach Telegram
+    and each message has at most one API call outstanding.
+    """
+    
+    def __init__(self, sender: BatchedSender, source: Message, chat_id: Hashable = None,
+                 priority: Priority = Priority.INTERACTIVE):
+        """
+        Create a reply to a message (nothing is sent until text is set).
+        
+        Args:
+            sender: Queue the calls go through
+            source: User message to reply to
+            chat_id: Chat of the message
+            priority: Priority of this message's calls
+        """
+        self.sender = sender
+        self.source = source
+        self.chat_id = chat_id
+        self.priority = priority
+        self.message: Optional[Message] = None
+        # API calls made and texts that were replaced before being sent
+        self.calls = 0
+        self.coalesced = 0
+        self._text: Optional[Tuple[str, Optional[str]]] = None
+        self._sent: Optional[Tuple[str, Optional[str]]] = None
+        self._sending: Optional[Tuple[str, Optional[str]]] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    @property
+    def text(self) -> Optional[str]:
+        """The latest text set."""
+        return self._text[0] if self._text else None
+    
+    def set(self, text: str, markdown: bool = False):
+        """Show text as soon as the queue allows, without waiting for it."""
+        if self._text is not None and self._text not in (self._sent, self._sending):
+            self.coalesced += 1
+        self._text = (text, 'Markdown' if markdown else None)
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._deliver())
+            self._task.add_done_callback(self._log_failure)
+    
+    async def show(self, text: str, markdown: bool = False):
+        """Show text and wait until it (or a later text) has been sent."""
+        self.set(text, markdown)
+        await self.flush()
+    
+    async def flush(self):
+        """Wait until the latest text has been sent."""
+        if self._task is not None:
+            # Shielded so a cancelled query still leaves its message consistent
+            await asyncio.shield(self._task)
+    
+    async def _deliver(self):
+        while self._text != self._sent:
+            await self.sender.call(self.chat_id, self._send_latest, self.priority)
+    
+    async def _send_latest(self):
+        # The text is read when the call is made, not when it was queued
+        self._sending = self._text
+        text, parse_mode = self._text
+        self.calls += 1
+        try:
+            if self.message is None:
+                self.message = await self.source.reply_text(text, parse_mode=parse_mode)
+            else:
+                await self.message.edit_text(text, parse_mode=parse_mode)
+        except BadRequest as e:
+            if "not modified" in str(e).lower():
+                pass
+            elif parse_mode is not None:
+                # Partial Markdown Telegram cannot parse is sent as plain text
+                self.calls += 1
+                if self.message is None:
+                    self.message = await self.source.reply_text(text)
+                else:
+                    await self.message.edit_text(text)
+            else:
+                raise
+        self._sent = (text, parse_mode)
+    
+    @staticmethod
+    def _log_failure(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Could not update message: {task.exception()}")
+
+
+class StackedReply:
+    """
+    A reply built up in phases (progress, metrics, insights) in as few messages as fit.
+    
+    The current phase is shown below the finished ones in the same message,
+    replacing whatever progress note it had. Once the text would no longer
+    fit in one message, the finished phases stay where they are and the
+    rest continues in a new reply.
+    """
+    
+    def __init__(self, sender: BatchedSender, source: Message, chat_id: Hashable = None,
+                 priority: Priority = Priority.INTERACTIVE):
+        """
+        Create a reply to a message (nothing is sent until text is set).
+        
+        Args:
+            sender: Queue the calls go through
+            source: User message to reply to
+            chat_id: Chat of the message
+            priority: Priority of the calls
+        """
+        self.sender = sender
+        self.source = source
+        self.chat_id = chat_id
+        self.priority = priority
+        self.messages = [LiveMessage(sender, source, chat_id, priority)]
+        self._done = ""
+        self._phase = ""
+    
+    @property
+    def calls(self) -> int:
+        """API calls made so far."""
+        return sum(message.calls for message in self.messages)
+    
+    @property
+    def coalesced(self) -> int:
+        """Texts replaced before they were sent."""
+        return sum(message.coalesced for message in self.messages)
+    
+    def set(self, text: str):
+        """Show text (Markdown) as the current phase, without waiting for it."""
+        if self._done and len(self._done) + len(text) > MAX_MESSAGE_LENGTH:
+            self.messages[-1].set(self._done.rstrip(), markdown=True)
+            self.messages.append(LiveMessage(self.sender, self.source, self.chat_id, self.priority))
+            self._done = ""
+        self._phase = text
+        self.messages[-1].set(self._done + text, markdown=True)
+    
+    def commit(self):
+        """Keep the current phase and show the next one below it."""
+        self._done += self._phase + "\n\n"
+        self._phase = ""
+    
+    async def show(self, text: str):
+        """Show text as the current phase and wait until it has been sent."""
+        self.set(text)
+        await self.flush()
+    
+    async def flush(self):
+        """Wait until every message shows its latest text."""
+        for message in self.messages:
+            await message.flush()
@@ -0,0 +1,130 @@
+"""Optional process pool for parsing company pages outside the bot's interpreter."""
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional
+
+from bs4 import BeautifulSoup
+
+from extractor import extract_metrics, extract_metrics_fast
+import metrics
+
+
+def parse_page(content: bytes, fast: bool = True) -> Dict[str, Optional[str]]:
+    """
+    Parse a company page into metrics (runs inside a worker process).
+    
+    Args:
+        content: Raw HTML of the company page
+        fast: Try the lxml fast path before BeautifulSoup
+        
+    Returns:
+        Dictionary of scraped metrics, which is small to send back
+    """
+    if fast:
+        data = extract_metrics_fast(content)
+        if data is not None:
+            return data
+    return extract_metrics(BeautifulSoup(content, "lxml"))
+
+
+def _warm_up():
+    # Build lxml's parser once per worker instead of on its first page
+    BeautifulSoup(b"<html></html>", "lxml")
+
+
+class ParsePool:
+    """
+    Parse pages in worker processes so parsing is not limited by the GIL.
+    
+    At most ``max_pending`` pages are queued or being parsed; callers of
+    ``parse`` wait for a slot, which pushes back on fetching when parsing
+    falls behind. Workers are replaced after ``max_tasks_per_child`` pages,
+    and a crashed pool is restarted with the page retried once.
+    """
+    
+    def __init__(self, processes: int, max_pending: Optional[int] = None,
+                 max_tasks_per_child: int = 500, fast_parse: bool = True):
+        """
+        Initialize the pool (workers start on first use).
+        
+        Args:
+            processes: Number of worker processes
+            max_pending: Pages queued or in progress before callers wait (default 4 per worker)
+            max_tasks_per_child: Pages a worker parses before it is replaced
+            fast_parse: Use the lxml fast path, falling back to BeautifulSoup
+        """
+        self.processes = processes
+        self.max_pending = max_pending or processes * 4
+        self.max_tasks_per_child = max_tasks_per_child
+        self.fast_parse = fast_parse
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.parsed = 0
+        self.restarts = 0
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Forking a process that already runs threads is unsafe; start workers from a clean server
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processes,
+                mp_context=multiprocessing.get_context(method),
+                initializer=_warm_up,
+                max_tasks_per_child=self.max_tasks_per_child,
+            )
+        return self._executor
+    
+    def restart(self, broken: Optional[ProcessPoolExecutor] = None):
+        """
+        Replace the workers; pages already submitted to the old ones still finish.
+        
+        Args:
+            broken: Executor that failed; nothing is done if it was already replaced
+        """
+        if broken is not None and broken is not self._executor:
+            return
+        old, self._executor = self._executor, None
+        if old is not None:
+            old.shutdown(wait=False)
+        self.restarts += 1
+        metrics.inc("parse_pool_restarts")
+    
+    async def parse(self, content: bytes) -> Dict[str, Optional[str]]:
+        """
+        Parse a page in a worker process.
+        
+        Args:
+            content: Raw HTML of the company page
+            
+        Returns:
+            Dictionary of scraped metrics
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        loop = asyncio.get_running_loop()
+        async with self._slots:
+            with metrics.span("parse"):
+                for attempt in range(2):
+                    executor = self._get_executor()
+                    try:
+                        data = await loop.run_in_executor(executor, parse_page, content, self.fast_parse)
+                        break
+                    except BrokenProcessPool:
+                        print("Parse worker died; restarting the pool")
+                        self.restart(executor)
+                        if attempt:
+                            raise
+        self.parsed += 1
+        return data
+    
+    def stats(self) -> Dict[str, int]:
+        """Return worker count, pages parsed and restarts."""
+        return {"processes": self.processes, "parsed": self.parsed, "restarts": self.restarts}
+    
+    def close(self):
+        """Stop the workers."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,191 @@
+"""Background refresh of the hot stock universe so user queries hit the page cache."""
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Iterable, List, Optional, Tuple
+
+import metrics
+from rate_limiter import SharedTokenBucket, TokenBucket, run_in_backend
+
+
+class PrefetchScheduler:
+    """
+    Keep the scraped metrics of popular stocks warm in the scraper's page cache.
+    
+    Each round ranks the universe by popularity (resolved user queries) and
+    staleness (share of the cache lifetime already used), then refreshes the
+    most urgent stock that is close to expiry. Requests are spaced with
+    jitter and capped by a global per-minute budget, and the scheduler backs
+    off when too many recent refreshes fail.
+    """
+    
+    # A cached page is refreshed once this share of its lifetime has passed
+    REFRESH_AT = 0.8
+    # Error storm detection over the most recent refreshes
+    ERROR_WINDOW = 10
+    ERROR_THRESHOLD = 0.5
+    MIN_PAUSE = 60.0
+    MAX_PAUSE = 900.0
+    # Sleep when nothing needs refreshing
+    IDLE_INTERVAL = 15.0
+    
+    def __init__(self, scraper, requests_per_minute: float = 20, max_stocks: int = 60,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+                 rng: Optional[random.Random] = None, backend=None,
+                 watched: Optional[Callable[[], Iterable[str]]] = None):
+        """
+        Initialize the scheduler.
+        
+        Args:
+            scraper: ScreenerScraper whose page cache is kept warm
+            requests_per_minute: Global budget of background requests to Screener.in
+            max_stocks: Most stocks kept warm (most popular first, then spreadsheet order)
+            clock: Monotonic time source
+            sleep: Coroutine used to wait
+            rng: Random source for jitter
+            backend: Optional StateBackend to share the request budget between replicas
+                (used only if it is shared between processes)
+            watched: Optional callable returning slugs that must stay fresh
+                (e.g. stocks with alerts), kept warm ahead of popular ones
+        """
+        self.scraper = scraper
+        self.requests_per_minute = requests_per_minute
+        self.max_stocks = max_stocks
+        self.watched = watched
+        self._shared = backend is not None and backend.shared
+        if self._shared:
+            self.budget = SharedTokenBucket(backend, "prefetch", max(1.0, requests_per_minute / 4), 60.0 / 4)
+        else:
+            self.budget = TokenBucket(max(1.0, requests_per_minute / 4), 60.0 / 4, clock)
+        self._clock = clock
+        self._sleep = sleep
+        self._rng = rng or random.Random()
+        self._recent: Deque[bool] = deque(maxlen=self.ERROR_WINDOW)
+        self._pause = self.MIN_PAUSE
+        self._task: Optional[asyncio.Task] = None
+        self.paused_until = 0.0
+        self.refreshed = 0
+        self.failed = 0
+    
+    def candidates(self) -> List[str]:
+        """Return the slugs to keep warm: watched, then most popular, then the rest of the universe."""
+        slugs = sorted(self.watched()) if self.watched is not None else []
+        seen = set(slugs)
+        for slug, _ in self.scraper.popularity.most_common(self.max_stocks):
+            if slug not in seen:
+                seen.add(slug)
+                slugs.append(slug)
+        for slug in self.scraper.universe_slugs():
+            if len(slugs) >= self.max_stocks:
+                break
+            if slug not in seen:
+                seen.add(slug)
+                slugs.append(slug)
+        return slugs
+    
+    def staleness(self, slug: str) -> float:
+        """Share of the cache lifetime used (0 just fetched, 1 expired or missing)."""
+        cache = self.scraper.page_cache
+        age = cache.age(slug)
+        remaining = cache.expires_in(slug)
+        if age is None or remaining is None:
+            return 1.0
+        return age / (age + remaining) if age + remaining > 0 else 1.0
+    
+    def next_due(self) -> Optional[str]:
+        """
+        Pick the stock most in need of a refresh.
+        
+        Returns:
+            Slug whose staleness has reached REFRESH_AT with the highest
+            (popularity + 1) * staleness, or None if everything is fresh
+        """
+        best: Optional[Tuple[float, str]] = None
+        popularity = self.scraper.popularity
+        for slug in self.candidates():
+            staleness = self.staleness(slug)
+            if staleness < self.REFRESH_AT:
+                continue
+            score = (popularity[slug] + 1) * staleness
+            if best is None or score > best[0]:
+                best = (score, slug)
+        return best[1] if best else None
+    
+    def _jittered_interval(self) -> float:
+        base = 60.0 / self.requests_per_minute
+        return base * self._rng.uniform(0.5, 1.5)
+    
+    def _record(self, ok: bool):
+        self._recent.append(ok)
+        if ok:
+            self._pause = self.MIN_PAUSE
+            return
+        failures = self._recent.count(False)
+        if len(self._recent) >= self.ERROR_WINDOW // 2 and failures / len(self._recent) >= self.ERROR_THRESHOLD:
+            # Back off harder each time the storm persists after a pause
+            self.paused_until = self._clock() + self._pause * self._rng.uniform(0.8, 1.2)
+            print(f"Prefetch paused for {self._pause:.0f}s after {failures} failed refreshes")
+            metrics.inc("prefetch_pauses")
+            self._pause = min(self._pause * 2, self.MAX_PAUSE)
+            self._recent.clear()
+    
+    async def run_once(self) -> Optional[str]:
+        """
+        Refresh the most urgent stock if the budget and error state allow.
+        
+        Returns:
+            The refreshed slug, or None if nothing was done
+        """
+        if self._clock() < self.paused_until:
+            return None
+        if await run_in_backend(self._shared, self.budget.time_until) > 0:
+            return None
+        slug = self.next_due()
+        if slug is None:
+            return None
+        
+        await run_in_backend(self._shared, self.budget.take)
+        try:
+            ok = await self.scraper.refresh_company_data_async(slug)
+        except Exception as e:
+            print(f"Error prefetching {slug}: {e}")
+            ok = False
+        if ok:
+            self.refreshed += 1
+            metrics.inc("prefetch_refreshes")
+        else:
+            self.failed += 1
+            metrics.inc("prefetch_errors")
+        self._record(ok)
+        return slug
+    
+    async def run(self):
+        """Refresh stocks until cancelled."""
+        while True:
+            now = self._clock()
+            if now < self.paused_until:
+                await self._sleep(self.paused_until - now)
+                continue
+            wait = await run_in_backend(self._shared, self.budget.time_until)
+            if wait > 0:
+                await self._sleep(wait)
+                continue
+            slug = await self.run_once()
+            await self._sleep(self._jittered_interval() if slug else self.IDLE_INTERVAL)
+    
+    def start(self):
+        """Start the background task on the running event loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+    
+    async def stop(self):
+        """Cancel the background task and wait for it to finish."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,192 @@
+"""Instant rule-based insights from a stock's metrics, shown before (or instead of) Gemini's."""
+from typing import Dict, List, NamedTuple, Optional
+
+from history_store import format_value
+from snapshot import StockSnapshot
+
+# Rule thresholds; percentages are written as on Screener.in (ROE 15 means 15%)
+DEFAULT_THRESHOLDS: Dict[str, float] = {
+    "roe_high": 15.0,
+    "roe_low": 8.0,
+    "roce_high": 15.0,
+    "roce_low": 8.0,
+    "pe_low": 15.0,
+    "pe_high": 40.0,
+    # Debt as a percentage of market cap
+    "debt_high": 25.0,
+    "profit_growth_high": 15.0,
+    "profit_growth_low": 0.0,
+    "sales_growth_high": 12.0,
+    "sales_growth_low": 0.0,
+    # Percent below the 52-week high, and above the 52-week low
+    "near_52w_high": 5.0,
+    "far_below_52w_high": 30.0,
+    "near_52w_low": 10.0,
+    # Bullish minus bearish points needed for a Positive (or Negative) sentiment
+    "sentiment_margin": 2.0,
+}
+
+
+def parse_thresholds(text: str) -> Dict[str, float]:
+    """
+    Parse threshold overrides such as "roe_high=20, pe_high=35".
+    
+    Args:
+        text: Comma-separated name=value pairs (names from DEFAULT_THRESHOLDS)
+        
+    Returns:
+        Dict of the overridden thresholds
+        
+    Raises:
+        ValueError: If a name is unknown or a value is not a number
+    """
+    thresholds = {}
+    for pair in text.split(","):
+        if not pair.strip():
+            continue
+        name, _, value = pair.partition("=")
+        name = name.strip().lower()
+        if name not in DEFAULT_THRESHOLDS:
+            raise ValueError(f"Unknown insight threshold '{name}'")
+        thresholds[name] = float(value)
+    return thresholds
+
+
+class QuickTake(NamedTuple):
+    bullish: List[str]
+    bearish: List[str]
+    sentiment: str
+
+
+class QuickInsights:
+    """
+    Turn a stock's metrics into bullish and bearish points and a sentiment label.
+    
+    Every rule compares one metric (or the price against its 52-week range)
+    with a threshold, so a take costs a few microseconds and needs no
+    network. It is shown while Gemini is working and stands in for it when
+    Gemini fails or its quota is gone.
+    """
+    
+    def __init__(self, thresholds: Optional[Dict[str, float]] = None):
+        """
+        Initialize the rules.
+        
+        Args:
+            thresholds: Overrides of DEFAULT_THRESHOLDS
+        """
+        self.thresholds = dict(DEFAULT_THRESHOLDS)
+        if thresholds:
+            unknown = set(thresholds) - set(DEFAULT_THRESHOLDS)
+            if unknown:
+                raise ValueError(f"Unknown insight thresholds: {', '.join(sorted(unknown))}")
+            self.thresholds.update(thresholds)
+    
+    def _returns(self, snapshot: StockSnapshot, metric: str, what: str,
+                 bullish: List[str], bearish: List[str]):
+        value = snapshot.get(metric)
+        if value is None:
+            return
+        key = metric.lower()
+        if value * 100 >= self.thresholds[f"{key}_high"]:
+            bullish.append(f"Strong {metric} of {format_value(metric, value)}: efficient use of {what}")
+        elif value * 100 < self.thresholds[f"{key}_low"]:
+            bearish.append(f"Weak {metric} of {format_value(metric, value)}: poor returns on {what}")
+    
+    def _growth(self, snapshot: StockSnapshot, metric: str, what: str,
+                bullish: List[str], bearish: List[str]):
+        value = snapshot.get(metric)
+        if value is None:
+            return
+        key = metric.lower().replace(" ", "_")
+        if value * 100 >= self.thresholds[f"{key}_high"]:
+            bullish.append(f"{what.capitalize()} growing fast ({format_value(metric, value)})")
+        elif value * 100 < self.thresholds[f"{key}_low"]:
+            bearish.append(f"{what.capitalize()} shrinking ({format_value(metric, value)})")
+    
+    def analyse(self, snapshot: StockSnapshot) -> QuickTake:
+        """
+        Apply the rules to a stock.
+        
+        Args:
+            snapshot: The stock's metrics
+            
+        Returns:
+            QuickTake with the points that apply and a Positive, Neutral or Negative sentiment
+        """
+        t = self.thresholds
+        bullish: List[str] = []
+        bearish: List[str] = []
+        
+        self._returns(snapshot, "ROE", "shareholders' funds", bullish, bearish)
+        self._returns(snapshot, "ROCE", "capital", bullish, bearish)
+        
+        pe = snapshot.get("P/E")
+        if pe is not None:
+            if pe <= 0:
+                bearish.append("Loss-making: the P/E is not meaningful")
+            elif pe < t["pe_low"]:
+                bullish.append(f"Inexpensive at a P/E of {pe:.1f}")
+            elif pe > t["pe_high"]:
+                bearish.append(f"Rich valuation at a P/E of {pe:.1f}")
+        
+        debt, market_cap = snapshot.get("Debt"), snapshot.get("Market Cap")
+        if debt is not None:
+            if debt == 0:
+                bullish.append("Debt-free balance sheet")
+            elif market_cap and debt / market_cap * 100 >= t["debt_high"]:
+                bearish.append(
+                    f"High debt of {format_value('Debt', debt)} ({debt / market_cap:.0%} of market cap)"
+                )
+        
+        self._growth(snapshot, "Profit Growth", "profits", bullish, bearish)
+        self._growth(snapshot, "Sales Growth", "sales", bullish, bearish)
+        
+        price, high, low = snapshot.get("Current Price"), snapshot.get("52W High"), snapshot.get("52W Low")
+        if price is not None and high:
+            below_high = (high - price) / high * 100
+            if below_high <= t["near_52w_high"]:
+                bullish.append("Trading near its 52-week high: strong momentum")
+            elif below_high >= t["far_below_52w_high"]:
+                bearish.append(f"{below_high:.0f}% below its 52-week high")
+        if price is not None and low and (price - low) / low * 100 <= t["near_52w_low"]:
+            bearish.append("Trading near its 52-week low")
+        
+        score = len(bullish) - len(bearish)
+        if score >= t["sentiment_margin"]:
+            sentiment = "Positive"
+        elif score <= -t["sentiment_margin"]:
+            sentiment = "Negative"
+        else:
+            sentiment = "Neutral"
+        return QuickTake(bullish, bearish, sentiment)
+    
+    def format(self, take: QuickTake) -> str:
+        """Format a take as Markdown for a Telegram message."""
+        lines = ["⚡ **Quick Take** (rule-based)"]
+        if take.bullish:
+            lines.append("\n📈 **Bullish**")
+            lines.extend(f"• {point}" for point in take.bullish)
+        if take.bearish:
+            lines.append("\n📉 **Bearish**")
+            lines.extend(f"• {point}" for point in take.bearish)
+        lines.append(
+            f"\n**Sentiment:** {take.sentiment} "
+            f"({len(take.bullish)} bullish, {len(take.bearish)} bearish signals)"
+        )
+        return "\n".join(lines)
+    
+    def insights(self, snapshot: StockSnapshot) -> Optional[str]:
+        """
+        Return a formatted take on a stock.
+        
+        Args:
+            snapshot: The stock's metrics
+            
+        Returns:
+            Markdown text, or None if no rule applies (e.g. the metrics are missing)
+        """
+        take = self.analyse(snapshot)
+        if not take.bullish and not take.bearish:
+            return None
+        return self.format(take)
@@ -0,0 +1,410 @@
+"""Client-side token-bucket rate limiting and fair request scheduling for Gemini."""
+import asyncio
+import struct
+import time
+from collections import OrderedDict, deque
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional, Tuple
+
+
+class Priority(IntEnum):
+    """Request priority; lower values are served first."""
+    INTERACTIVE = 0
+    BATCH = 1
+    BACKGROUND = 2
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at capacity / period tokens per second.
+    
+    Starts full. ``hold`` blocks the bucket until a point in time regardless of
+    tokens, which is how server-side 429 responses are fed back in.
+    """
+    
+    def __init__(self, capacity: float, period: float, clock: Callable[[], float] = time.monotonic):
+        """
+        Create a full bucket.
+        
+        Args:
+            capacity: Maximum tokens (burst size)
+            period: Seconds to refill an empty bucket completely
+            clock: Monotonic time source
+        """
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+        self.tokens = self.capacity
+        self._clock = clock
+        self._updated = clock()
+        self._held_until = 0.0
+    
+    def _refill(self) -> float:
+        now = self._clock()
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self._updated = now
+        return now
+    
+    def available(self) -> float:
+        """Return the tokens currently available."""
+        self._refill()
+        return self.tokens
+    
+    def time_until(self, tokens: float = 1.0) -> float:
+        """
+        Seconds until the bucket can supply the given number of tokens.
+        
+        Args:
+            tokens: Tokens needed (may exceed what is currently queued for)
+            
+        Returns:
+            Wait in seconds, 0 if available now
+        """
+        now = self._refill()
+        wait = max(0.0, self._held_until - now)
+        deficit = tokens - self.tokens
+        if deficit > 0:
+            wait = max(wait, deficit / self.rate)
+        return wait
+    
+    def take(self, tokens: float = 1.0):
+        """Consume tokens (the caller checks time_until first)."""
+        self._refill()
+        self.tokens -= tokens
+    
+    def drain(self, hold: float = 0.0):
+        """Empty the bucket and optionally block it for hold seconds."""
+        now = self._refill()
+        self.tokens = 0.0
+        self._held_until = max(self._held_until, now + hold)
+
+
+class SharedTokenBucket:
+    """
+    TokenBucket whose state lives in a StateBackend, so replicas share one quota.
+    
+    Each operation is a single atomic backend update. Between a caller's
+    ``time_until`` check and its ``take`` another replica may take the same
+    token; the bucket then goes briefly negative and later waits repay it,
+    so the long-run rate still holds. Operations may block on the backend,
+    so async callers run them with ``run_in_backend``.
+    """
+    
+    _STATE = struct.Struct("<ddd")
+    
+    def __init__(self, backend, name: str, capacity: float, period: float,
+                 clock: Callable[[], float] = time.time):
+        """
+        Attach to (or create) a shared bucket.
+        
+        Args:
+            backend: StateBackend holding the bucket
+            name: Key of the bucket in the backend
+            capacity: Maximum tokens (burst size)
+            period: Seconds to refill an empty bucket completely
+            clock: Wall-clock time source (shared between processes)
+        """
+        self.backend = backend
+        self.key = f"bucket:{name}"
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+        self._clock = clock
+    
+    def _apply(self, change: Callable[[float, float, float], tuple]):
+        """Refill, then let change(tokens, held_until, now) return (tokens, held_until, result)."""
+        def update(value):
+            now = self._clock()
+            if value is None:
+                tokens, updated, held_until = self.capacity, now, 0.0
+            else:
+                tokens, updated, held_until = self._STATE.unpack(value)
+            if now > updated:
+                tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+            tokens, held_until, result = change(tokens, held_until, now)
+            return self._STATE.pack(tokens, now, held_until), result
+        return self.backend.update(self.key, update)
+    
+    def available(self) -> float:
+        """Return the tokens currently available."""
+        return self._apply(lambda tokens, held, now: (tokens, held, tokens))
+    
+    def time_until(self, tokens: float = 1.0) -> float:
+        """Seconds until the bucket can supply the given number of tokens."""
+        def change(current, held, now):
+            wait = max(0.0, held - now)
+            if tokens > current:
+                wait = max(wait, (tokens - current) / self.rate)
+            return current, held, wait
+        return self._apply(change)
+    
+    def take(self, tokens: float = 1.0):
+        """Consume tokens (the caller checks time_until first)."""
+        self._apply(lambda current, held, now: (current - tokens, held, None))
+    
+    def drain(self, hold: float = 0.0):
+        """Empty the bucket and optionally block it for hold seconds."""
+        self._apply(lambda current, held, now: (0.0, max(held, now + hold), None))
+
+
+async def run_in_backend(shared: bool, func: Callable[[], Any]) -> Any:
+    """
+    Call func(), in a worker thread if it touches a shared backend.
+    
+    A shared backend can block on other processes (SQLite waits up to its
+    timeout for the write lock), which must not stall the event loop.
+    
+    Args:
+        shared: Whether func uses a SharedTokenBucket
+        func: Zero-argument callable, typically a few bucket operations
+        
+    Returns:
+        func's result
+    """
+    if not shared:
+        return func()
+    return await asyncio.get_running_loop().run_in_executor(None, func)
+
+
+class RequestScheduler:
+    """
+    Proactive scheduler for a per-minute and per-day request quota.
+    
+    Callers ``await acquire(chat_id, priority)`` before each request. Waiting
+    requests are granted highest priority first and round-robin across chats
+    within a priority, so one chat's /batch cannot starve everyone else.
+    Background work is shed when the daily quota runs low or the queue is
+    too long, keeping the remaining quota for interactive queries. A queued
+    request that cannot be granted within its maximum wait (e.g. once the
+    daily quota is exhausted) is failed instead of being held until then.
+    """
+    
+    def __init__(self, requests_per_minute: int = 15, requests_per_day: int = 1500,
+                 background_reserve: int = 150, max_background_wait: float = 120.0,
+                 max_wait: float = 30.0, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+                 backend=None):
+        """
+        Initialize the quota buckets.
+        
+        Args:
+            requests_per_minute: Per-minute quota
+            requests_per_day: Per-day quota
+            background_reserve: Daily requests kept back from background work
+            max_background_wait: Background requests expecting a longer wait are shed
+            max_wait: Interactive and batch requests that cannot be granted within
+                this long of being queued are failed
+            clock: Monotonic time source (a fake clock in tests)
+            sleep: Coroutine used to wait (paired with the fake clock in tests)
+            backend: Optional StateBackend; if it is shared between processes the
+                quota buckets live there, shared with every replica using it
+        """
+        self._shared = backend is not None and backend.shared
+        if self._shared:
+            self.minute = SharedTokenBucket(backend, "gemini:minute", requests_per_minute, 60.0)
+            self.day = SharedTokenBucket(backend, "gemini:day", requests_per_day, 86400.0)
+        else:
+            self.minute = TokenBucket(requests_per_minute, 60.0, clock)
+            self.day = TokenBucket(requests_per_day, 86400.0, clock)
+        self.background_reserve = background_reserve
+        self.max_background_wait = max_background_wait
+        self.max_wait = max_wait
+        self._clock = clock
+        self._sleep = sleep
+        # Each chat's queue holds (waiter, deadline) pairs
+        self._queues: Dict[Priority, "OrderedDict[Hashable, Deque[Tuple[asyncio.Future, float]]]"] = {
+            priority: OrderedDict() for priority in Priority
+        }
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self.granted = 0
+        self.shed = 0
+    
+    def pending(self, priority: Optional[Priority] = None) -> int:
+        """Return the number of queued requests, optionally for one priority."""
+        priorities = Priority if priority is None else [priority]
+        return sum(len(q) for p in priorities for q in self._queues[p].values())
+    
+    def _ahead_of(self, chat_id: Hashable, priority: Priority) -> int:
+        """Requests that would be granted before a new one from chat_id."""
+        ahead = sum(self.pending(p) for p in Priority if p < priority)
+        queues = self._queues[priority]
+        own = len(queues.get(chat_id, ()))
+        # Round robin: every other chat gets at most one turn per turn of ours
+        ahead += own + sum(min(len(q), own + 1) for chat, q in queues.items() if chat != chat_id)
+        return ahead
+    
+    def _wait_for(self, tokens: float) -> float:
+        return max(self.minute.time_until(tokens), self.day.time_until(tokens))
+    
+    async def estimate_wait(self, chat_id: Hashable = None, priority: Priority = Priority.INTERACTIVE) -> float:
+        """
+        Estimate how long a new request would wait for its turn.
+        
+        Args:
+            chat_id: Chat the request is for
+            priority: Request priority
+            
+        Returns:
+            Estimated wait in seconds
+        """
+        ahead = self._ahead_of(chat_id, priority)
+        return await run_in_backend(self._shared, lambda: self._wait_for(ahead + 1))
+    
+    async def _should_shed(self, chat_id: Hashable, priority: Priority) -> bool:
+        if priority < Priority.BACKGROUND:
+            return False
+        reserved = self.background_reserve + self.pending(Priority.INTERACTIVE) + self.pending(Priority.BATCH)
+        ahead = self._ahead_of(chat_id, priority)
+        day_tokens, wait = await run_in_backend(
+            self._shared, lambda: (self.day.available(), self._wait_for(ahead + 1))
+        )
+        return day_tokens - reserved < 1 or wait > self.max_background_wait
+    
+    def _ensure_dispatcher(self):
+        loop = asyncio.get_running_loop()
+        if self._dispatcher is None or self._dispatcher.done() or self._dispatcher.get_loop() is not loop:
+            self._wakeup = asyncio.Event()
+            self._dispatcher = loop.create_task(self._dispatch())
+    
+    async def acquire(self, chat_id: Hashable = None, priority: Priority = Priority.INTERACTIVE) -> bool:
+        """
+        Wait for permission to send one request.
+        
+        Args:
+            chat_id: Chat the request is for (used for fair queuing)
+            priority: Request priority
+            
+        Returns:
+            True when the request may be sent, False if it was shed
+        """
+        if await self._should_shed(chat_id, priority):
+            self.shed += 1
+            return False
+        
+        self._ensure_dispatcher()
+        waiter = asyncio.get_running_loop().create_future()
+        max_wait = self.max_background_wait if priority >= Priority.BACKGROUND else self.max_wait
+        entry = (waiter, self._clock() + max_wait)
+        self._queues[priority].setdefault(chat_id, deque()).append(entry)
+        self._wakeup.set()
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            queue = self._queues[priority].get(chat_id)
+            if queue is not None and entry in queue:
+                queue.remove(entry)
+                if not queue:
+                    del self._queues[priority][chat_id]
+            raise
+    
+    def _pop_next(self):
+        """Pop the next waiter: highest priority, then the chat whose turn it is."""
+        for priority in Priority:
+            queues = self._queues[priority]
+            if not queues:
+                continue
+            chat_id, queue = next(iter(queues.items()))
+            waiter, _ = queue.popleft()
+            # Rotate the chat to the back of its priority's queue
+            del queues[chat_id]
+            if queue:
+                queues[chat_id] = queue
+            return chat_id, priority, waiter
+        return None
+    
+    def _expire(self, wait: float):
+        """Fail queued requests that would still be waiting after their deadline."""
+        granted_at = self._clock() + wait
+        for queues in self._queues.values():
+            for chat_id in list(queues):
+                kept = deque()
+                for waiter, deadline in queues[chat_id]:
+                    if waiter.done():
+                        continue
+                    if granted_at > deadline:
+                        self.shed += 1
+                        waiter.set_result(False)
+                    else:
+                        kept.append((waiter, deadline))
+                if kept:
+                    queues[chat_id] = kept
+                else:
+                    del queues[chat_id]
+    
+    async def _sleep_until_woken(self, wait: float):
+        """Sleep for wait seconds, or until a request is queued or a quota report arrives."""
+        self._wakeup.clear()
+        sleep = asyncio.ensure_future(self._sleep(wait))
+        woken = asyncio.ensure_future(self._wakeup.wait())
+        try:
+            await asyncio.wait((sleep, woken), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            sleep.cancel()
+            woken.cancel()
+    
+    async def _dispatch(self):
+        while True:
+            if not self.pending():
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            
+            wait = await run_in_backend(self._shared, lambda: self._wait_for(1))
+            if wait > 0:
+                # Every request left can wait until the next token is due
+                self._expire(wait)
+                if self.pending():
+                    # Re-pick after sleeping: a higher priority request may have arrived
+                    await self._sleep_until_woken(wait)
+                continue
+            
+            chat_id, priority, waiter = self._pop_next()
+            if waiter.done():
+                continue
+            if await self._should_shed(chat_id, priority):
+                if not waiter.done():
+                    self.shed += 1
+                    waiter.set_result(False)
+                continue
+            # The waiter may be cancelled while a shared backend is consulted
+            if waiter.done():
+                continue
+            await run_in_backend(self._shared, self._take)
+            self.granted += 1
+            if not waiter.done():
+                waiter.set_result(True)
+    
+    def _take(self):
+        self.minute.take()
+        self.day.take()
+    
+    async def report_rate_limited(self, retry_after: float):
+        """Block new grants for retry_after seconds after the server returned a 429."""
+        await run_in_backend(self._shared, lambda: self.minute.drain(hold=retry_after))
+        self._wake()
+    
+    async def report_quota_exhausted(self):
+        """Record that the server says the daily quota is gone."""
+        await run_in_backend(self._shared, self.day.drain)
+        self._wake()
+    
+    def _wake(self):
+        """Let the dispatcher re-check its queue against the changed quota."""
+        if self._dispatcher is not None and not self._dispatcher.done():
+            self._wakeup.set()
+    
+    def stats(self) -> Dict[str, float]:
+        """Return queue length, remaining quota and granted/shed counters."""
+        return {
+            "pending": self.pending(),
+            "minute_tokens": round(self.minute.available(), 2),
+            "day_tokens": round(self.day.available(), 2),
+            "granted": self.granted,
+            "shed": self.shed,
+        }
+    
+    def close(self):
+        """Stop the dispatcher task."""
+        if self._dispatcher is not None and not self._dispatcher.done():
+            self._dispatcher.cancel()
@@ -1,94 +1,183 @@
 """Screener.in scraping module for stock data extraction."""
+import asyncio
+import json
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time as dt_time
+import random
+import time
 import requests
+from requests.adapters import HTTPAdapter
+import httpx
 from bs4 import BeautifulSoup
-from typing import Dict, Optional, List
-import re
-import pandas as pd
-import os
+from typing import AsyncIterator, Callable, Dict, Iterable, NamedTuple, Optional, List, Tuple
+import zlib
+from cache import IST, SingleFlight, TTLCache, market_aware_ttl
+from extractor import METRIC_SYNONYMS, extract_metrics, extract_metrics_fast
+from parse_pool import ParsePool
+from screening import ScreenResult, ScreenTable
+from snapshot import StockSnapshot
+from statements import FinancialTable, StatementPage
+from http_fetch import (RETRY_STATUSES, CircuitBreaker, CircuitOpenError, Validators,
+                        accept_encoding, backoff_delay, retry_after_seconds)
+import metrics
+import stock_universe
+from symbol_index import SymbolResolver
+
+
+class FetchResult(NamedTuple):
+    """Outcome of a page download; content is empty when the server answered 304."""
+    content: bytes
+    validators: Optional[Validators]
+    not_modified: bool
 
 
 class ScreenerScraper:
     """Scraper for extracting stock data from Screener.in."""
     
     BASE_URL = "https://www.screener.in"
+    # Connecting should be quick; reading a full company page can take longer
+    CONNECT_TIMEOUT = 5
+    REQUEST_TIMEOUT = 15
+    # Retries for 429/5xx responses and connection errors, with jittered backoff
+    MAX_RETRIES = 2
+    RETRY_BACKOFF = 0.5
+    # Longest Retry-After honoured; a longer wait fails the request instead
+    MAX_RETRY_WAIT = 10.0
     
-    def __init__(self):
-        """Initialize the scraper with proper headers and load stock mapping."""
+    def __init__(self, max_workers: int = 4, cache_ttl: float = 900,
+                 cache_ttl_market_hours: float = 120, cache_max_entries: int = 512,
+                 cache_html: bool = False, html_cache_max_bytes: int = 32 * 1024 * 1024,
+                 max_concurrency: int = 8, validator_ttl: float = 86400,
+                 breaker_threshold: int = 5, breaker_reset: float = 30.0, history=None,
+                 parse_processes: int = 0, fast_parse: bool = True, state=None,
+                 statement_cache_max_bytes: int = 64 * 1024 * 1024):
+        """
+        Initialize the scraper with proper headers and load stock mapping.
+        
+        Args:
+            max_workers: Size of the thread pool used to parse pages off the event loop
+            cache_ttl: Seconds a scraped page stays cached outside market hours
+            cache_ttl_market_hours: Seconds a scraped page stays cached while the market is open
+            cache_max_entries: Maximum number of companies kept in the page cache
+            cache_html: Also keep the zlib-compressed raw HTML of each page
+            html_cache_max_bytes: Size limit for the compressed HTML cache
+            max_concurrency: Maximum simultaneous requests to Screener.in
+            validator_ttl: Seconds to keep a page's ETag/Last-Modified (and its parsed
+                metrics) for conditional re-fetches after the page cache expires
+            breaker_threshold: Consecutive failed requests that pause fetching
+            breaker_reset: Seconds fetching stays paused before a trial request
+            history: Optional HistoryStore that every freshly scraped page is recorded in
+            parse_processes: Parse pages in this many worker processes (0 parses in max_workers threads)
+            fast_parse: Extract with lxml directly, using BeautifulSoup only when that misses
+                headline fields
+            state: Optional StateBackend through which replicas share scraped pages
+                (ignored unless it is shared between processes)
+            statement_cache_max_bytes: Size limit for the raw pages kept for financial
+                statement lookups (0 disables them)
+        """
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
             "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
             "Accept-Language": "en-US,en;q=0.5",
-            "Accept-Encoding": "gzip, deflate, br",
+            "Accept-Encoding": accept_encoding(),
             "Connection": "keep-alive",
             "Upgrade-Insecure-Requests": "1",
         }
+        self.timeout = (self.CONNECT_TIMEOUT, self.REQUEST_TIMEOUT)
         self.session = requests.Session()
         self.session.headers.update(self.headers)
+        # One pool per scheme, each keeping a connection per concurrent request
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=max(max_concurrency, max_workers))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
         
-        # Load stock mapping from Excel file
+        # Async client is created lazily so it binds to the running event loop.
+        # All async fetches share its connection pool and a per-host cap.
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self.max_concurrency = max_concurrency
+        self._host_semaphore = asyncio.Semaphore(max_concurrency)
+        # Bounded pool for CPU-bound parsing so the event loop stays responsive
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="screener-parse")
+        # Optional worker processes, for bulk refreshes that outgrow one core
+        self.fast_parse = fast_parse
+        self.parse_pool = ParsePool(parse_processes, fast_parse=fast_parse) if parse_processes > 0 else None
+        
+        # Parsed metrics per slug, with a shorter TTL while prices are moving
+        self.page_cache = TTLCache(
+            max_entries=cache_max_entries,
+            ttl_func=market_aware_ttl(cache_ttl_market_hours, cache_ttl),
+        )
+        self.html_cache = None
+        if cache_html:
+            self.html_cache = TTLCache(
+                max_entries=cache_max_entries,
+                ttl_func=market_aware_ttl(cache_ttl_market_hours, cache_ttl),
+                max_bytes=html_cache_max_bytes,
+                sizeof=len,
+            )
+        # Validators and parsed metrics of the last full download per slug, so an
+        # expired page can be revalidated with a conditional request
+        self.validator_cache = TTLCache(max_entries=cache_max_entries, ttl=validator_ttl)
+        # Raw pages whose statement tables are parsed on demand, kept per page version
+        self.statement_pages = None
+        if statement_cache_max_bytes:
+            self.statement_pages = TTLCache(
+                max_entries=cache_max_entries,
+                ttl=validator_ttl,
+                max_bytes=statement_cache_max_bytes,
+                sizeof=lambda page: page.size,
+            )
+        # Stops hammering Screener.in while it is failing
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset)
+        self._rng = random.Random()
+        # Concurrent requests for the same slug share a single fetch
+        self._inflight = SingleFlight()
+        # Resolved queries per slug, used to decide what to keep warm
+        self.popularity: Counter = Counter()
+        # Latest typed snapshot per slug, parsed once per scrape
+        self.snapshots: Dict[str, StockSnapshot] = {}
+        # The same metrics for every scraped stock as columns, for /screen
+        self.screen_table = ScreenTable()
+        # Called with each new snapshot (e.g. to evaluate alerts)
+        self.snapshot_listeners: List[Callable[[StockSnapshot], None]] = []
+        self.history = history
+        # An in-process backend would only duplicate the page cache
+        self.state = state if state is not None and state.shared else None
+        
+        # Load stock mapping (and sector groups) from the compiled index or Excel file
+        self.sectors: Dict[str, List[Dict[str, str]]] = {}
         self.stock_mapping = self._load_stock_mapping()
+        if history is not None:
+            self._load_screen_table()
+    
+    @property
+    def stock_mapping(self) -> Dict[str, Dict[str, str]]:
+        """Query term -> stock info mapping used for search."""
+        return self._stock_mapping
+    
+    @stock_mapping.setter
+    def stock_mapping(self, mapping: Dict[str, Dict[str, str]]):
+        # Keep the search indexes in sync with the mapping
+        self._stock_mapping = mapping
+        self.resolver = SymbolResolver(mapping)
     
     def _load_stock_mapping(self) -> Dict[str, Dict[str, str]]:
         """
-        Load stock mapping from Excel file.
+        Load stock mapping from the compiled index, or the Excel file if it changed.
         
         Returns:
             Dictionary mapping query terms to stock info (slug, name, symbol)
         """
-        mapping = {}
         try:
-            excel_path = "screener links.xlsx"
-            if not os.path.exists(excel_path):
+            excel_path = stock_universe.EXCEL_PATH
+            mapping, sectors, source = stock_universe.load_universe(excel_path, stock_universe.INDEX_PATH)
+            self.sectors = sectors
+            if not mapping:
                 print(f"Warning: {excel_path} not found. Using empty mapping.")
                 return mapping
             
-            df = pd.read_excel(excel_path)
-            
-            # Filter out rows with NaN NSE Symbol (category headers)
-            df = df[df['NSE Symbol'].notna()]
-            df = df[df['Company Name'].notna()]
-            
-            for _, row in df.iterrows():
-                company_name = str(row['Company Name']).strip()
-                nse_symbol = str(row['NSE Symbol']).strip()
-                screener_link = str(row.get('Screener.in Link (Template)', '')).strip()
-                
-                # Extract slug from link (format: https://www.screener.in/company/SLUG/)
-                slug = None
-                if screener_link and 'company/' in screener_link:
-                    slug = screener_link.split('company/')[-1].rstrip('/')
-                elif nse_symbol:
-                    slug = nse_symbol
-                
-                if not slug:
-                    continue
-                
-                # Create searchable terms
-                search_terms = [
-                    company_name.lower(),
-                    nse_symbol.lower(),
-                    # Add partial matches for common names
-                    company_name.split()[0].lower() if company_name else None,
-                ]
-                
-                # Store mapping
-                stock_info = {
-                    'slug': slug,
-                    'name': company_name,
-                    'symbol': nse_symbol
-                }
-                
-                for term in search_terms:
-                    if term:
-                        # Store with original query format
-                        mapping[term] = stock_info
-                        # Also store without common suffixes
-                        if term.endswith(' ltd.') or term.endswith(' ltd'):
-                            mapping[term.replace(' ltd.', '').replace(' ltd', '')] = stock_info
-                        if term.endswith(' limited'):
-                            mapping[term.replace(' limited', '')] = stock_info
-            
-            print(f"Loaded {len(set(info['slug'] for info in mapping.values()))} stocks from Excel file")
+            print(f"Loaded {len(set(info['slug'] for info in mapping.values()))} stocks from {source}")
             return mapping
             
         except Exception as e:
@@ -99,239 +188,651 @@ class ScreenerScraper:
         """
         Search for a stock in the Nifty 50 mapping.
         
+        Exact names and symbols resolve directly; partial or misspelt queries
+        resolve only when one stock is a clear best match (see symbol_index.py).
+        
         Args:
             query: Stock name or symbol (e.g., "reliance", "tcs", "hdfcbank")
             
         Returns:
             Stock info dict with slug, name, symbol if found, None otherwise
         """
-        query_lower = query.lower().strip()
+        with metrics.span("search"):
+            return self.resolver.resolve(query)
+    
+    def suggest_stocks(self, query: str, limit: int = 5) -> List[Dict[str, str]]:
+        """
+        Suggest the closest stocks for a query the bot could not resolve.
+        
+        Args:
+            query: Stock name or symbol, possibly misspelt
+            limit: Maximum number of suggestions
+            
+        Returns:
+            Stock info dicts, best match first
+        """
+        return [stock_info for stock_info, _ in self.resolver.suggest(query, limit)]
+    
+    def _company_url(self, slug: str) -> str:
+        """Build the Screener.in company page URL for a slug."""
+        return f"{self.BASE_URL}/company/{slug}/"
+    
+    def _get_async_client(self) -> httpx.AsyncClient:
+        """Return the shared async HTTP client, creating it on first use."""
+        if self._async_client is None or self._async_client.is_closed:
+            self._async_client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=httpx.Timeout(self.REQUEST_TIMEOUT, connect=self.CONNECT_TIMEOUT),
+                follow_redirects=True,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency,
+                ),
+            )
+        return self._async_client
+    
+    def parse_company_page(self, content: bytes) -> Dict[str, Optional[str]]:
+        """
+        Parse a downloaded company page into metrics.
         
-        # Direct match
-        if query_lower in self.stock_mapping:
-            return self.stock_mapping[query_lower]
+        The page is indexed in a single pass and every metric is then
+        resolved by lookup (see extractor.py). In fast mode the index is
+        built from an lxml tree; pages where that misses headline fields
+        are parsed again with BeautifulSoup. This is CPU-bound and safe to
+        run in a worker thread.
         
-        # Partial match in company name or symbol
-        for term, stock_info in self.stock_mapping.items():
-            if (query_lower in term or term in query_lower or
-                query_lower in stock_info['name'].lower() or
-                query_lower in stock_info['symbol'].lower() or
-                stock_info['symbol'].lower() in query_lower):
-                return stock_info
+        Args:
+            content: Raw HTML of the company page
+            
+        Returns:
+            Dictionary containing scraped metrics
+        """
+        if self.fast_parse:
+            with metrics.span("parse_fast"):
+                data = extract_metrics_fast(content)
+            if data is not None:
+                self._count_misses(data)
+                return data
+            metrics.inc("fast_parse_fallbacks")
         
-        return None
+        with metrics.span("parse"):
+            soup = BeautifulSoup(content, "lxml")
+        with metrics.span("extract"):
+            data = extract_metrics(soup)
+        self._count_misses(data)
+        return data
+    
+    def _count_misses(self, data: Dict[str, Optional[str]]):
+        if metrics.is_enabled():
+            for metric_key in METRIC_SYNONYMS:
+                if metric_key not in data:
+                    metrics.inc("extraction_misses", metric=metric_key)
+    
+    async def _parse_async(self, content: bytes) -> Dict[str, Optional[str]]:
+        """Parse a page in the process pool if configured, otherwise in the thread pool."""
+        if self.parse_pool is not None:
+            data = await self.parse_pool.parse(content)
+            self._count_misses(data)
+            return data
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.parse_company_page, content)
+    
+    def _store_page(self, slug: str, content: bytes, data: Dict[str, Optional[str]],
+                    validators: Optional[Validators] = None):
+        """Cache a successfully parsed page."""
+        if not data:
+            return
+        self.page_cache.set(slug, data)
+        if self.html_cache is not None:
+            self.html_cache.set(slug, zlib.compress(content))
+        self._keep_statement_page(slug, content, validators)
+        if validators is not None:
+            self.validator_cache.set(slug, (validators, data))
+        else:
+            self.validator_cache.invalidate(slug)
+        self._share_page(slug, data)
+        self._record_snapshot(slug, data)
     
-    def extract_value(self, soup: BeautifulSoup, label: str) -> Optional[str]:
+    def _keep_statement_page(self, slug: str, content: bytes, validators: Optional[Validators]):
+        """Keep a page for statement lookups, reusing already parsed sections if it is unchanged."""
+        if self.statement_pages is None:
+            return
+        if validators is not None:
+            version = validators.etag or validators.last_modified
+        else:
+            version = f"crc32:{zlib.crc32(content)}"
+        page = self.statement_pages.get(slug, count=False)
+        if page is None or page.version != version:
+            page = StatementPage(content, version)
+        self.statement_pages.set(slug, page)
+    
+    def get_statement(self, slug: str, section: str) -> Optional[FinancialTable]:
         """
-        Extract a value from the company page by label.
+        Return a financial statement table from the last downloaded page of a slug.
+        
+        Nothing is fetched; the section is parsed the first time it is asked
+        for and memoized until a changed page replaces it.
         
         Args:
-            soup: BeautifulSoup object of the page
-            label: Label text to search for
+            slug: Company slug
+            section: Section id from statements.SECTIONS (e.g. "quarters")
             
         Returns:
-            Value as string or None
+            FinancialTable, or None if the page is not cached or has no such table
         """
-        try:
-            # Find the label element
-            label_elem = soup.find("span", string=re.compile(label, re.I))
-            if label_elem:
-                # Find the next sibling or parent's next sibling that contains the value
-                parent = label_elem.find_parent()
-                if parent:
-                    value_elem = parent.find("span", class_="number")
-                    if value_elem:
-                        return value_elem.get_text(strip=True)
-                    # Alternative: look for next sibling
-                    next_sibling = parent.find_next_sibling()
-                    if next_sibling:
-                        value_elem = next_sibling.find("span", class_="number")
-                        if value_elem:
-                            return value_elem.get_text(strip=True)
-        except Exception as e:
-            print(f"Error extracting {label}: {e}")
-        return None
+        page = self.statement_pages.get(slug) if self.statement_pages is not None else None
+        if page is None:
+            return None
+        with metrics.span("parse_statement"):
+            return page.section(section)
     
-    def extract_from_table(self, soup: BeautifulSoup, row_label: str) -> Optional[str]:
+    async def get_statement_async(self, slug: str, section: str) -> Optional[FinancialTable]:
         """
-        Extract value from a table row by label.
+        Return a financial statement table, downloading the page only if it is not cached.
         
         Args:
-            soup: BeautifulSoup object
-            row_label: Label in the table row
+            slug: Company slug
+            section: Section id from statements.SECTIONS (e.g. "quarters")
             
         Returns:
-            Value as string or None
+            FinancialTable, or None if the page could not be fetched or has no such table
         """
+        if self.statement_pages is None:
+            return None
+        page = self.statement_pages.get(slug)
+        if page is None:
+            metrics.inc("statement_page_misses")
+            # Unconditional: a 304 would confirm the metrics but bring no page to read
+            await self._inflight.run(
+                ("statements", slug), lambda: self._scrape_uncached_async(slug, conditional=False)
+            )
+            page = self.statement_pages.get(slug, count=False)
+            if page is None:
+                return None
+        loop = asyncio.get_running_loop()
+        with metrics.span("parse_statement"):
+            return await loop.run_in_executor(self.executor, page.section, section)
+    
+    def _share_page(self, slug: str, data: Dict[str, Optional[str]]):
+        """Publish parsed metrics to the other replicas through the state backend, in the background."""
+        if self.state is None:
+            return
+        ttl = self.page_cache.ttl_func() if self.page_cache.ttl_func else self.page_cache.ttl
+        self.executor.submit(self._write_shared_page, slug, json.dumps(data).encode("utf-8"), ttl)
+    
+    def _write_shared_page(self, slug: str, value: bytes, ttl: float):
         try:
-            # Find table rows
-            rows = soup.find_all("tr")
-            for row in rows:
-                cells = row.find_all("td")
-                if len(cells) >= 2:
-                    if row_label.lower() in cells[0].get_text(strip=True).lower():
-                        value = cells[1].get_text(strip=True)
-                        return value if value else None
+            self.state.set(f"page:{slug}", value, ttl=ttl)
         except Exception as e:
-            print(f"Error extracting from table {row_label}: {e}")
-        return None
+            print(f"Error sharing page {slug}: {e}")
+    
+    def _shared_page(self, slug: str) -> Optional[Dict[str, Optional[str]]]:
+        """Return metrics another replica scraped recently, caching them locally."""
+        if self.state is None:
+            return None
+        try:
+            value = self.state.get(f"page:{slug}")
+        except Exception as e:
+            print(f"Error reading shared page {slug}: {e}")
+            return None
+        if value is None:
+            return None
+        metrics.inc("shared_cache_hits")
+        data = json.loads(value)
+        self.page_cache.set(slug, data)
+        return data
+    
+    def _record_snapshot(self, slug: str, data: Dict[str, Optional[str]]):
+        """Keep a typed snapshot of scraped metrics and append it to the history store."""
+        snapshot = StockSnapshot.from_data(data, slug)
+        previous = self.snapshots.get(slug)
+        if previous is not None and not snapshot.symbol:
+            snapshot.symbol = previous.symbol
+        self.snapshots[slug] = snapshot
+        self.screen_table.update(snapshot)
+        for listener in self.snapshot_listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                print(f"Error in snapshot listener for {slug}: {e}")
+        if self.history is None:
+            return
+        try:
+            self.history.record_values(slug, snapshot.metrics(), snapshot.scraped_at)
+        except Exception as e:
+            print(f"Error recording history for {slug}: {e}")
+    
+    def _load_screen_table(self):
+        """Fill the screen table with the latest values in the history store."""
+        try:
+            stocks = {stock_info["slug"]: stock_info for stock_info in self.resolver.stocks}
+            for slug, latest in self.history.latest_all().items():
+                day = max(observation.day for observation in latest.values())
+                stock_info = stocks.get(slug, {})
+                self.screen_table.update_values(
+                    slug,
+                    {metric: observation.value for metric, observation in latest.items()},
+                    datetime.combine(day, dt_time(), IST).timestamp(),
+                    stock_info.get("symbol", ""),
+                    stock_info.get("name", ""),
+                )
+        except Exception as e:
+            print(f"Error loading screen table from history: {e}")
+    
+    def screen(self, query: str) -> ScreenResult:
+        """
+        Screen every stock with scraped metrics, without fetching anything.
+        
+        Args:
+            query: Screen query, e.g. "ROE > 20 and P/E < 30 and debt low top 10"
+                (see screening.parse_query)
+                
+        Returns:
+            ScreenResult
+            
+        Raises:
+            ValueError: If the query cannot be parsed
+        """
+        with metrics.span("screen"):
+            return self.screen_table.screen(query)
+    
+    def get_snapshot(self, slug: str) -> Optional[StockSnapshot]:
+        """
+        Return the typed snapshot from the last scrape of a slug.
+        
+        Args:
+            slug: Company slug
+            
+        Returns:
+            StockSnapshot, or None if the slug has not been scraped
+        """
+        return self.snapshots.get(slug)
     
-    def extract_from_key_metrics(self, soup: BeautifulSoup, label: str) -> Optional[str]:
+    def _conditional_request(self, slug: str) -> Tuple[Dict[str, str], Optional[Dict[str, Optional[str]]]]:
+        """Return conditional request headers for a slug and the metrics a 304 would confirm."""
+        entry = self.validator_cache.get(slug, count=False)
+        if entry is None:
+            return {}, None
+        validators, data = entry
+        return validators.request_headers(), data
+    
+    def _revalidated(self, slug: str, data: Dict[str, Optional[str]]) -> Dict[str, Optional[str]]:
+        """Re-cache metrics the server confirmed unchanged with a 304, without parsing."""
+        metrics.inc("not_modified")
+        self.page_cache.set(slug, data)
+        # Restart the validators' TTL along with the page
+        entry = self.validator_cache.get(slug, count=False)
+        if entry is not None:
+            self.validator_cache.set(slug, entry)
+        if self.statement_pages is not None:
+            page = self.statement_pages.get(slug, count=False)
+            if page is not None:
+                self.statement_pages.set(slug, page)
+        self._share_page(slug, data)
+        self._record_snapshot(slug, data)
+        return data
+    
+    def _check_breaker(self):
+        if not self.breaker.allow():
+            metrics.inc("circuit_rejections")
+            raise CircuitOpenError(
+                f"Screener.in is failing; requests paused for {self.breaker.retry_in():.0f}s"
+            )
+    
+    def _retry_delay(self, attempt: int, status: Optional[int], retry_after: Optional[str]) -> Optional[float]:
         """
-        Extract value from key metrics section using various selectors.
+        Decide whether to retry a failed attempt and how long to wait first.
         
         Args:
-            soup: BeautifulSoup object
-            label: Label to search for
+            attempt: Zero-based number of the attempt that failed
+            status: Response status, or None for a connection error or timeout
+            retry_after: Retry-After header of the response, if any
             
         Returns:
-            Value as string or None
-        """
-        # Try multiple strategies to find the metric
-        strategies = [
-            # Strategy 1: Look for data attributes
-            lambda: soup.find(attrs={"data-name": re.compile(label, re.I)}),
-            # Strategy 2: Look for spans with specific classes
-            lambda: soup.find("span", string=re.compile(f"^{label}", re.I)),
-            # Strategy 3: Look in key metrics divs
-            lambda: soup.find("div", class_=re.compile("key-metric", re.I)),
-        ]
-        
-        for strategy in strategies:
+            Seconds to wait, or None to give up
+        """
+        self.breaker.record_failure()
+        if attempt >= self.MAX_RETRIES:
+            return None
+        wait = retry_after_seconds(retry_after) if status is not None else None
+        if wait is None:
+            wait = backoff_delay(attempt, self.RETRY_BACKOFF, rng=self._rng)
+        elif wait > self.MAX_RETRY_WAIT:
+            return None
+        metrics.inc("fetch_retries", status=str(status or "error"))
+        return wait
+    
+    def _fetch_page(self, slug: str, headers: Dict[str, str]) -> FetchResult:
+        """
+        Download a company page with retries, honouring the circuit breaker.
+        
+        Args:
+            slug: Company slug
+            headers: Extra request headers (conditional validators)
+            
+        Returns:
+            FetchResult for a 200 or 304 response
+        """
+        url = self._company_url(slug)
+        attempt = 0
+        while True:
+            self._check_breaker()
             try:
-                elem = strategy()
-                if elem:
-                    # Try to find value near the element
-                    parent = elem.find_parent()
-                    if parent:
-                        # Look for number class
-                        value_elem = parent.find(class_=re.compile("number|value", re.I))
-                        if value_elem:
-                            return value_elem.get_text(strip=True)
-                        # Look for next sibling
-                        next_elem = parent.find_next_sibling()
-                        if next_elem:
-                            value_elem = next_elem.find(class_=re.compile("number|value", re.I))
-                            if value_elem:
-                                return value_elem.get_text(strip=True)
-            except:
-                continue
+                with metrics.span("fetch"):
+                    response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except requests.RequestException:
+                wait = self._retry_delay(attempt, None, None)
+                if wait is None:
+                    raise
+            except BaseException:
+                # Any other outcome still ends the attempt, so a half-open trial never stays in flight
+                self.breaker.record_failure()
+                raise
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    self.breaker.record_success()
+                    break
+                wait = self._retry_delay(attempt, response.status_code, response.headers.get("Retry-After"))
+                if wait is None:
+                    break
+            time.sleep(wait)
+            attempt += 1
         
-        return None
+        # Bytes pulled over the wire, before decompression
+        metrics.inc("fetched_bytes", response.raw.tell() if response.raw is not None else len(response.content))
+        if response.status_code == 304:
+            return FetchResult(b"", None, True)
+        response.raise_for_status()
+        return FetchResult(response.content, Validators.from_headers(response.headers), False)
+    
+    async def _fetch_page_async(self, slug: str, headers: Dict[str, str]) -> FetchResult:
+        """Async version of _fetch_page; backoff waits do not hold a connection slot."""
+        url = self._company_url(slug)
+        client = self._get_async_client()
+        attempt = 0
+        while True:
+            self._check_breaker()
+            try:
+                async with self._host_semaphore:
+                    with metrics.span("fetch"):
+                        response = await client.get(url, headers=headers)
+            except httpx.TransportError:
+                wait = self._retry_delay(attempt, None, None)
+                if wait is None:
+                    raise
+            except asyncio.CancelledError:
+                # A cancelled query says nothing about Screener.in, but its trial must not block others
+                self.breaker.abandon_trial()
+                raise
+            except BaseException:
+                self.breaker.record_failure()
+                raise
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    self.breaker.record_success()
+                    break
+                wait = self._retry_delay(attempt, response.status_code, response.headers.get("Retry-After"))
+                if wait is None:
+                    break
+            await asyncio.sleep(wait)
+            attempt += 1
+        
+        metrics.inc("fetched_bytes", response.num_bytes_downloaded)
+        if response.status_code == 304:
+            return FetchResult(b"", None, True)
+        response.raise_for_status()
+        return FetchResult(response.content, Validators.from_headers(response.headers), False)
+    
+    def get_cached_html(self, slug: str) -> Optional[bytes]:
+        """
+        Return the cached raw HTML for a slug, if HTML caching is enabled.
+        
+        Args:
+            slug: Company slug
+            
+        Returns:
+            Decompressed page HTML or None
+        """
+        if self.html_cache is None:
+            return None
+        compressed = self.html_cache.get(slug)
+        return zlib.decompress(compressed) if compressed is not None else None
+    
+    def cache_stats(self) -> Dict[str, float]:
+        """Return page cache counters, including coalesced in-flight requests."""
+        stats = self.page_cache.stats()
+        stats["coalesced"] = self._inflight.coalesced
+        return stats
     
     def scrape_company_data(self, slug: str) -> Dict[str, Optional[str]]:
         """
         Scrape company data from Screener.in.
         
+        Results are served from the page cache while fresh. Once a page
+        expires it is re-requested conditionally, and a 304 reuses the
+        previously parsed metrics without downloading or parsing the page.
+        
         Args:
             slug: Company slug from search
             
         Returns:
             Dictionary containing scraped metrics
         """
-        url = f"{self.BASE_URL}/company/{slug}/"
+        cached = self.page_cache.get(slug)
+        if cached is not None:
+            metrics.inc("page_cache_hits")
+            return dict(cached)
+        metrics.inc("page_cache_misses")
+        shared = self._shared_page(slug)
+        if shared is not None:
+            return dict(shared)
         
         try:
-            response = self.session.get(url, timeout=15)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, "lxml")
-            
-            data = {}
-            
-            # Try to get company name first
-            name_elem = soup.find("h1")
-            if name_elem:
-                data["Company Name"] = name_elem.get_text(strip=True)
-            
-            # Extract Current Price (multiple methods)
-            price_elem = soup.find("span", id="top-price")
-            if not price_elem:
-                price_elem = soup.find("span", class_=re.compile("price", re.I))
-            if not price_elem:
-                # Look for price in key metrics
-                price_elem = soup.find(string=re.compile("Current Price", re.I))
-                if price_elem:
-                    parent = price_elem.find_parent()
-                    if parent:
-                        price_elem = parent.find_next_sibling()
-            if price_elem:
-                price_text = price_elem.get_text(strip=True) if hasattr(price_elem, 'get_text') else str(price_elem)
-                # Clean price text
-                price_text = re.sub(r'[^\d.,]', '', price_text)
-                if price_text:
-                    data["Current Price"] = f"₹{price_text}" if not price_text.startswith('₹') else price_text
-            
-            # Extract metrics using multiple strategies
-            metrics_to_extract = {
-                "Market Cap": ["Market Cap", "Market capitalization"],
-                "P/E": ["P/E", "PE", "Price to Earnings"],
-                "ROCE": ["ROCE", "Return on Capital Employed"],
-                "ROE": ["ROE", "Return on Equity"],
-                "Debt": ["Debt", "Total Debt"],
-                "High / Low": ["High / Low", "52W High / Low"],
-                "Profit Growth": ["Profit Growth", "Net Profit Growth"],
-                "Sales Growth": ["Sales Growth", "Revenue Growth"],
-                "Cash Flows": ["Cash", "Cash Flow", "Operating Cash Flow"]
-            }
-            
-            for metric_key, search_terms in metrics_to_extract.items():
-                value = None
-                for term in search_terms:
-                    # Try different extraction methods
-                    value = (self.extract_from_key_metrics(soup, term) or 
-                            self.extract_value(soup, term) or 
-                            self.extract_from_table(soup, term))
-                    if value:
-                        break
-                
-                if value:
-                    data[metric_key] = value
-            
-            # Special handling for High/Low if not found together
-            if "High / Low" not in data or not data["High / Low"]:
-                high = None
-                low = None
-                for term in ["High", "52W High"]:
-                    high = self.extract_from_table(soup, term) or self.extract_value(soup, term)
-                    if high:
-                        break
-                for term in ["Low", "52W Low"]:
-                    low = self.extract_from_table(soup, term) or self.extract_value(soup, term)
-                    if low:
-                        break
-                if high and low:
-                    data["High / Low"] = f"{high} / {low}"
+            headers, previous = self._conditional_request(slug)
+            result = self._fetch_page(slug, headers)
+            if result.not_modified and previous is not None:
+                return dict(self._revalidated(slug, previous))
+            data = self.parse_company_page(result.content)
+            self._store_page(slug, result.content, data, result.validators)
+            return dict(data)
             
+        except Exception as e:
+            metrics.inc("scrape_errors")
+            print(f"Error scraping company data: {e}")
+            return {}
+    
+    async def _scrape_uncached_async(self, slug: str, conditional: bool = True) -> Dict[str, Optional[str]]:
+        """Download (or revalidate) and parse a company page, then cache the result."""
+        try:
+            headers, previous = self._conditional_request(slug) if conditional else ({}, None)
+            result = await self._fetch_page_async(slug, headers)
+            if result.not_modified and previous is not None:
+                return self._revalidated(slug, previous)
+            data = await self._parse_async(result.content)
+            self._store_page(slug, result.content, data, result.validators)
             return data
             
         except Exception as e:
+            metrics.inc("scrape_errors")
             print(f"Error scraping company data: {e}")
             return {}
     
-    def get_stock_data(self, query: str) -> Dict[str, Optional[str]]:
+    async def scrape_company_data_async(self, slug: str) -> Dict[str, Optional[str]]:
         """
-        Complete workflow: search and scrape stock data.
+        Scrape company data without blocking the event loop.
+        
+        The page is downloaded with httpx and parsed in the scraper's thread (or process) pool.
+        Fresh results come from the page cache, and a burst of requests for the
+        same slug triggers exactly one fetch.
         
         Args:
-            query: Stock name or symbol
+            slug: Company slug from search
             
         Returns:
             Dictionary containing scraped metrics
         """
-        stock_info = self.search_stock(query)
-        if not stock_info:
-            return {"error": f"Stock '{query}' not found in Nifty 50. Please use company name or NSE symbol (e.g., 'tcs', 'reliance', 'hdfcbank')."}
+        cached = self.page_cache.get(slug)
+        if cached is not None:
+            metrics.inc("page_cache_hits")
+            return dict(cached)
+        metrics.inc("page_cache_misses")
+        if self.state is not None:
+            # The backend may wait on other replicas for its lock
+            shared = await asyncio.get_running_loop().run_in_executor(self.executor, self._shared_page, slug)
+            if shared is not None:
+                return dict(shared)
+        if self._inflight.in_flight(slug):
+            metrics.inc("coalesced_fetches")
+        
+        data = await self._inflight.run(slug, lambda: self._scrape_uncached_async(slug))
+        return dict(data)
+    
+    async def refresh_company_data_async(self, slug: str) -> bool:
+        """
+        Re-download and cache a company page even if a cached copy is still fresh.
+        
+        Used by the background prefetcher; shares the fetch with any
+        interactive request for the same slug that is already in flight.
         
-        slug = stock_info['slug']
-        data = self.scrape_company_data(slug)
+        Args:
+            slug: Company slug
+            
+        Returns:
+            True if the page was fetched and parsed successfully
+        """
+        data = await self._inflight.run(slug, lambda: self._scrape_uncached_async(slug))
+        return bool(data)
+    
+    def universe_slugs(self) -> List[str]:
+        """Return every distinct slug in the stock universe, in spreadsheet order."""
+        return [stock_info["slug"] for stock_info in self.resolver.stocks]
+    
+    def _not_found_error(self, query: str) -> Dict[str, Optional[str]]:
+        """Build the error result for a query that matched no stock, with suggestions."""
+        return {
+            "error": f"Stock '{query}' not found in Nifty 50. Please use company name or NSE symbol (e.g., 'tcs', 'reliance', 'hdfcbank').",
+            "suggestions": self.suggest_stocks(query, limit=3),
+        }
+    
+    def _finalize_stock_data(self, query: str, stock_info: Dict[str, str],
+                             data: Dict[str, Optional[str]]) -> Dict[str, Optional[str]]:
+        """Attach stock info to scraped metrics, or return an error result."""
         if not data or len(data) == 0:
             return {"error": f"Could not scrape data for '{query}'"}
         
         # Add stock info
-        data["slug"] = slug
+        data["slug"] = stock_info['slug']
         if "Company Name" not in data or not data["Company Name"]:
             data["Company Name"] = stock_info['name']
         data["NSE Symbol"] = stock_info['symbol']
+        snapshot = self.snapshots.get(stock_info['slug'])
+        if snapshot is not None:
+            snapshot.symbol = stock_info['symbol']
+            snapshot.name = snapshot.name or stock_info['name']
+        self.screen_table.set_label(stock_info['slug'], stock_info['symbol'], stock_info['name'])
         
         return data
-
+    
+    def get_stock_data(self, query: str) -> Dict[str, Optional[str]]:
+        """
+        Complete workflow: search and scrape stock data.
+        
+        Args:
+            query: Stock name or symbol
+            
+        Returns:
+            Dictionary containing scraped metrics
+        """
+        stock_info = self.search_stock(query)
+        if not stock_info:
+            return self._not_found_error(query)
+        
+        self.popularity[stock_info['slug']] += 1
+        data = self.scrape_company_data(stock_info['slug'])
+        return self._finalize_stock_data(query, stock_info, data)
+    
+    async def get_stock_data_async(self, query: str) -> Dict[str, Optional[str]]:
+        """
+        Async version of get_stock_data for use inside the bot's event loop.
+        
+        Args:
+            query: Stock name or symbol
+            
+        Returns:
+            Dictionary containing scraped metrics
+        """
+        stock_info = self.search_stock(query)
+        if not stock_info:
+            return self._not_found_error(query)
+        
+        self.popularity[stock_info['slug']] += 1
+        data = await self.scrape_company_data_async(stock_info['slug'])
+        return self._finalize_stock_data(query, stock_info, data)
+    
+    def find_sector(self, name: str) -> Optional[Tuple[str, List[Dict[str, str]]]]:
+        """
+        Find a sector group by name (case-insensitive, exact or prefix).
+        
+        Args:
+            name: Sector name as typed by the user
+            
+        Returns:
+            Tuple of (sector name, stock infos) or None
+        """
+        wanted = name.lower().strip()
+        if not wanted:
+            return None
+        for sector, stocks in self.sectors.items():
+            if sector.lower() == wanted:
+                return sector, stocks
+        for sector, stocks in self.sectors.items():
+            if sector.lower().startswith(wanted):
+                return sector, stocks
+        return None
+    
+    async def iter_many(self, queries: Iterable[str]) -> AsyncIterator[Tuple[str, Dict[str, Optional[str]]]]:
+        """
+        Fetch several stocks concurrently, yielding each result as it finishes.
+        
+        Fetches share one connection pool and never exceed the per-host
+        concurrency cap; queries resolving to the same company share one fetch.
+        
+        Args:
+            queries: Stock names or symbols
+            
+        Yields:
+            Tuples of (query, stock data or error dict) in completion order
+        """
+        async def fetch(query: str) -> Tuple[str, Dict[str, Optional[str]]]:
+            return query, await self.get_stock_data_async(query)
+        
+        tasks = [asyncio.ensure_future(fetch(query)) for query in dict.fromkeys(queries)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    async def get_many(self, queries: Iterable[str]) -> Dict[str, Dict[str, Optional[str]]]:
+        """
+        Fetch several stocks concurrently.
+        
+        Args:
+            queries: Stock names or symbols
+            
+        Returns:
+            Dictionary of query -> stock data or error dict, in input order
+        """
+        queries = list(dict.fromkeys(queries))
+        results = {query: data async for query, data in self.iter_many(queries)}
+        return {query: results[query] for query in queries}
+    
+    async def aclose(self):
+        """Release the async HTTP client and the parse thread and process pools."""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+        self.executor.shutdown(wait=False)
+        if self.parse_pool is not None:
+            self.parse_pool.close()
@@ -0,0 +1,362 @@
+"""Vectorized screening of the stock universe over the latest scraped metrics."""
+import re
+import threading
+from array import array
+from functools import lru_cache
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+
+from history_store import METRIC_UNITS, parse_number
+from snapshot import FIELD_INDEX, FIELDS, StockSnapshot
+
+# Names a query may use for each metric, besides the metric names themselves
+METRIC_ALIASES = {
+    "price": "Current Price",
+    "cmp": "Current Price",
+    "mcap": "Market Cap",
+    "market capitalisation": "Market Cap",
+    "market capitalization": "Market Cap",
+    "pe": "P/E",
+    "pe ratio": "P/E",
+    "p/e ratio": "P/E",
+    "52wk high": "52W High",
+    "52wk low": "52W Low",
+    "revenue growth": "Sales Growth",
+    "cash flow": "Cash Flows",
+}
+_METRIC_NAMES = {**{name.lower(): name for name in FIELDS}, **METRIC_ALIASES}
+_LONGEST_NAME = max(len(name.split()) for name in _METRIC_NAMES)
+
+# "low" and "high" select a metric's bottom and top third across the screened stocks
+QUALITATIVE_PERCENTILE = 100 / 3
+DEFAULT_SORT = "Market Cap"
+DEFAULT_LIMIT = 20
+
+_TOKEN_RE = re.compile(
+    r"\s*(?:"
+    r"(?P<word>\d+wk?\b|[a-z][a-z0-9/]*)"
+    r"|(?P<number>[-+]?(?:\d{1,3}(?:,\d{2,3})+|\d+)(?:\.\d+)?(?:\s*(?:%|lakh\s*cr[a-z]*|cr[a-z]*))?)"
+    r"|(?P<op>>=|<=|!=|==|=|>|<|&&?|\|\|?|,)"
+    r"|(?P<paren>[()])"
+    r")"
+)
+_COMPARISONS = {
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+    "=": np.equal,
+    "==": np.equal,
+    "!=": np.not_equal,
+}
+_AND = {"and", "&", "&&", ","}
+_OR = {"or", "|", "||"}
+
+# A compiled filter maps the table's columns (one row per field) to a boolean mask
+Mask = Callable[[np.ndarray], np.ndarray]
+
+
+class ScreenQuery(NamedTuple):
+    text: str
+    condition: Optional[Mask]
+    metrics: Tuple[str, ...]
+    sort_by: str
+    descending: bool
+    limit: int
+
+
+class ScreenResult(NamedTuple):
+    query: ScreenQuery
+    matches: List[StockSnapshot]
+    matched: int
+    screened: int
+
+
+def resolve_metric(name: str) -> Optional[str]:
+    """Return the metric a name or alias refers to (e.g. "pe" -> "P/E"), or None."""
+    return _METRIC_NAMES.get(" ".join(name.lower().split()))
+
+
+def _tokenize(text: str) -> List[Tuple[str, str]]:
+    tokens = []
+    position = 0
+    text = text.lower().replace("−", "-").strip()
+    while position < len(text):
+        match = _TOKEN_RE.match(text, position)
+        if match is None or match.end() == position:
+            raise ValueError(f"Cannot read '{text[position:].strip()[:20]}'")
+        position = match.end()
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+    return tokens
+
+
+class _Parser:
+    """Recursive-descent parser compiling a screen query into numpy operations."""
+    
+    def __init__(self, text: str):
+        self.tokens = _tokenize(text)
+        self.position = 0
+        self.metrics: List[str] = []
+    
+    def peek(self, offset: int = 0) -> Tuple[Optional[str], Optional[str]]:
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+    
+    def next(self) -> Tuple[Optional[str], Optional[str]]:
+        token = self.peek()
+        self.position += 1
+        return token
+    
+    def metric(self) -> Optional[str]:
+        """Consume the longest metric name at the current position, if any."""
+        for length in range(_LONGEST_NAME, 0, -1):
+            words = [self.peek(i) for i in range(length)]
+            if any(kind != "word" for kind, _ in words):
+                continue
+            name = _METRIC_NAMES.get(" ".join(text for _, text in words))
+            if name is not None:
+                self.position += length
+                if name not in self.metrics:
+                    self.metrics.append(name)
+                return name
+        return None
+    
+    def expect_metric(self) -> str:
+        name = self.metric()
+        if name is None:
+            found = self.peek()[1]
+            raise ValueError(f"Unknown metric '{found}'" if found else "Expected a metric")
+        return name
+    
+    def starts_condition(self) -> bool:
+        kind, text = self.peek()
+        return kind == "word" and text not in _AND | _OR | {"sort", "order", "top", "limit"} or text == "("
+    
+    def parse_or(self) -> Mask:
+        terms = [self.parse_and()]
+        while self.peek()[1] in _OR:
+            self.next()
+            terms.append(self.parse_and())
+        return terms[0] if len(terms) == 1 else lambda columns: np.logical_or.reduce([t(columns) for t in terms])
+    
+    def parse_and(self) -> Mask:
+        terms = [self.parse_term()]
+        while True:
+            if self.peek()[1] in _AND:
+                self.next()
+            elif not self.starts_condition():
+                break
+            terms.append(self.parse_term())
+        return terms[0] if len(terms) == 1 else lambda columns: np.logical_and.reduce([t(columns) for t in terms])
+    
+    def parse_term(self) -> Mask:
+        if self.peek()[1] == "(":
+            self.next()
+            condition = self.parse_or()
+            if self.next()[1] != ")":
+                raise ValueError("Missing ')'")
+            return condition
+        if self.peek()[1] in ("low", "high"):
+            level = self.next()[1]
+            return _qualitative(self.expect_metric(), level)
+        name = self.expect_metric()
+        kind, text = self.next()
+        if text in ("low", "high"):
+            return _qualitative(name, text)
+        if kind != "op" or text not in _COMPARISONS:
+            raise ValueError(f"Expected a comparison after {name}, e.g. {name} > 10")
+        kind, number = self.next()
+        value = parse_number(number, METRIC_UNITS[name]) if kind == "number" else None
+        if value is None:
+            raise ValueError(f"Expected a number after {name} {text}")
+        return _comparison(name, text, value)
+    
+    def parse(self) -> ScreenQuery:
+        condition = None
+        if self.starts_condition():
+            condition = self.parse_or()
+        sort_by, descending, limit = DEFAULT_SORT, True, DEFAULT_LIMIT
+        while self.peek()[0] is not None:
+            _, keyword = self.next()
+            if keyword in ("sort", "order"):
+                if self.peek()[1] == "by":
+                    self.next()
+                sort_by = self.expect_metric()
+                descending = True
+                if self.peek()[1] in ("asc", "ascending", "desc", "descending"):
+                    descending = self.next()[1].startswith("desc")
+            elif keyword in ("top", "limit"):
+                kind, number = self.next()
+                if kind != "number" or not number.isdigit() or int(number) < 1:
+                    raise ValueError(f"Expected a count after '{keyword}'")
+                limit = int(number)
+            else:
+                raise ValueError(f"Unexpected '{keyword}'")
+        metrics = tuple(self.metrics)
+        return ScreenQuery("", condition, metrics, sort_by, descending, limit)
+
+
+def _comparison(name: str, op: str, value: float) -> Mask:
+    index = FIELD_INDEX[name]
+    compare = _COMPARISONS[op]
+    if op == "!=":
+        # Missing values (NaN) compare unequal to everything; leave them out
+        return lambda columns: compare(columns[index], value) & ~np.isnan(columns[index])
+    return lambda columns: compare(columns[index], value)
+
+
+def _qualitative(name: str, level: str) -> Mask:
+    index = FIELD_INDEX[name]
+    
+    def mask(columns: np.ndarray) -> np.ndarray:
+        column = columns[index]
+        if not np.isfinite(column).any():
+            return np.zeros(column.shape, dtype=bool)
+        if level == "low":
+            return column <= np.nanpercentile(column, QUALITATIVE_PERCENTILE)
+        return column >= np.nanpercentile(column, 100 - QUALITATIVE_PERCENTILE)
+    return mask
+
+
+@lru_cache(maxsize=256)
+def parse_query(text: str) -> ScreenQuery:
+    """
+    Compile a screen query such as "ROE > 20 and P/E < 30 and debt low top 10".
+    
+    Conditions compare a metric with a number written as on Screener.in
+    (percentages for ROE/ROCE/growth, crores for Market Cap/Debt/Cash Flows),
+    or pick a metric's bottom or top third with "low"/"high". They combine
+    with "and" (also "," or nothing), "or" and parentheses. Results are
+    sorted by Market Cap unless "sort by <metric> [asc|desc]" is given, and
+    "top N" or "limit N" caps how many are returned. Compiled queries are
+    cached, so repeating a screen costs only the numpy evaluation.
+    
+    Args:
+        text: Query text (case-insensitive)
+        
+    Returns:
+        ScreenQuery
+        
+    Raises:
+        ValueError: If the query cannot be parsed
+    """
+    query = _Parser(text).parse()
+    return query._replace(text=" ".join(text.split()))
+
+
+class ScreenTable:
+    """
+    Columnar table of the latest typed metrics of every scraped stock.
+    
+    Values are kept in a numpy array with one contiguous row per field (in
+    snapshot FIELDS order) and one column per stock, so a filter is a few
+    vectorized comparisons over the whole universe. Stocks are updated in
+    place as their pages are scraped; screens never touch the network.
+    """
+    
+    def __init__(self, capacity: int = 64):
+        """
+        Create an empty table.
+        
+        Args:
+            capacity: Stocks to allocate room for (the table grows as needed)
+        """
+        self._values = np.full((len(FIELDS), capacity), np.nan)
+        self._scraped_at = np.zeros(capacity)
+        self._slugs: List[str] = []
+        self._symbols: List[str] = []
+        self._names: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._slugs)
+    
+    def __contains__(self, slug: str) -> bool:
+        return slug in self._rows
+    
+    def _row(self, slug: str) -> int:
+        row = self._rows.get(slug)
+        if row is not None:
+            return row
+        row = len(self._slugs)
+        if row == self._values.shape[1]:
+            values = np.full((len(FIELDS), row * 2), np.nan)
+            values[:, :row] = self._values
+            self._values = values
+            self._scraped_at = np.concatenate([self._scraped_at, np.zeros(row)])
+        self._rows[slug] = row
+        self._slugs.append(slug)
+        self._symbols.append("")
+        self._names.append("")
+        return row
+    
+    def update(self, snapshot: StockSnapshot):
+        """Replace a stock's row with a freshly scraped snapshot."""
+        with self._lock:
+            row = self._row(snapshot.slug)
+            self._values[:, row] = snapshot.values
+            self._scraped_at[row] = snapshot.scraped_at
+            self._symbols[row] = snapshot.symbol or self._symbols[row]
+            self._names[row] = snapshot.name or self._names[row]
+    
+    def update_values(self, slug: str, values: Dict[str, float], scraped_at: float,
+                      symbol: str = "", name: str = ""):
+        """
+        Replace a stock's row with typed metric values.
+        
+        Args:
+            slug: Company slug
+            values: Metric name -> value in the unit from METRIC_UNITS
+            scraped_at: Unix time the values were scraped
+            symbol: NSE symbol, if known
+            name: Company name, if known
+        """
+        snapshot = StockSnapshot(slug, symbol, name, scraped_at)
+        for metric, value in values.items():
+            if metric in FIELD_INDEX:
+                snapshot.set(metric, value)
+        self.update(snapshot)
+    
+    def set_label(self, slug: str, symbol: str, name: str):
+        """Record a stock's symbol and name, which pages do not always carry."""
+        with self._lock:
+            row = self._rows.get(slug)
+            if row is not None:
+                self._symbols[row] = symbol or self._symbols[row]
+                self._names[row] = self._names[row] or name
+    
+    def screen(self, query: Union[str, ScreenQuery]) -> ScreenResult:
+        """
+        Filter, sort and cap the stocks in the table.
+        
+        Stocks missing a metric used in a condition do not match it, and
+        stocks missing the sort metric come last.
+        
+        Args:
+            query: Query text (see parse_query) or a parsed ScreenQuery
+            
+        Returns:
+            ScreenResult with the top matches as snapshots
+        """
+        if isinstance(query, str):
+            query = parse_query(query)
+        with self._lock:
+            count = len(self._slugs)
+            columns = self._values[:, :count]
+            if query.condition is None:
+                rows = np.arange(count)
+            else:
+                rows = np.flatnonzero(query.condition(columns))
+            keys = columns[FIELD_INDEX[query.sort_by], rows]
+            # NaN sorts last either way, since negating it leaves NaN
+            order = np.argsort(-keys if query.descending else keys, kind="stable")
+            top = rows[order[:query.limit]]
+            matches = [
+                StockSnapshot(self._slugs[row], self._symbols[row], self._names[row],
+                              float(self._scraped_at[row]), array("d", columns[:, row]))
+                for row in top
+            ]
+        return ScreenResult(query, matches, len(rows), count)
@@ -0,0 +1,93 @@
+"""Compact, typed snapshot of a stock's scraped metrics."""
+import math
+import time
+from array import array
+from typing import Dict, Optional, Tuple
+
+from history_store import METRIC_UNITS, typed_metrics
+
+# Numeric fields in storage order; a snapshot holds one double per field (NaN if missing)
+FIELDS: Tuple[str, ...] = tuple(METRIC_UNITS)
+FIELD_INDEX = {name: i for i, name in enumerate(FIELDS)}
+_NAN = float("nan")
+
+
+class StockSnapshot:
+    """
+    A stock's metrics as numbers in the units of METRIC_UNITS.
+    
+    Values live in a single array of doubles, so a snapshot costs a few
+    hundred bytes instead of a dict of formatted strings.
+    """
+    
+    __slots__ = ("slug", "symbol", "name", "scraped_at", "values")
+    
+    def __init__(self, slug: str, symbol: str = "", name: str = "",
+                 scraped_at: Optional[float] = None, values: Optional[array] = None):
+        """
+        Create a snapshot.
+        
+        Args:
+            slug: Company slug
+            symbol: NSE symbol
+            name: Company name
+            scraped_at: Unix time of the scrape (defaults to now)
+            values: Array of doubles in FIELDS order (defaults to all missing)
+        """
+        self.slug = slug
+        self.symbol = symbol
+        self.name = name
+        self.scraped_at = time.time() if scraped_at is None else scraped_at
+        self.values = values if values is not None else array("d", [_NAN] * len(FIELDS))
+    
+    @classmethod
+    def from_data(cls, data: Dict[str, Optional[str]], slug: Optional[str] = None,
+                  scraped_at: Optional[float] = None) -> "StockSnapshot":
+        """
+        Build a snapshot from the scraper's string metrics.
+        
+        Args:
+            data: Metrics as returned by the scraper
+            slug: Company slug (defaults to data["slug"])
+            scraped_at: Unix time of the scrape (defaults to now)
+            
+        Returns:
+            StockSnapshot
+        """
+        snapshot = cls(
+            slug or data.get("slug") or "",
+            data.get("NSE Symbol") or "",
+            data.get("Company Name") or "",
+            scraped_at,
+        )
+        for metric, value in typed_metrics(data).items():
+            snapshot.values[FIELD_INDEX[metric]] = value
+        return snapshot
+    
+    def get(self, metric: str) -> Optional[float]:
+        """Return a metric's value, or None if it is missing."""
+        value = self.values[FIELD_INDEX[metric]]
+        return None if math.isnan(value) else value
+    
+    def __getitem__(self, metric: str) -> Optional[float]:
+        return self.get(metric)
+    
+    def __contains__(self, metric: str) -> bool:
+        return metric in FIELD_INDEX and not math.isnan(self.values[FIELD_INDEX[metric]])
+    
+    def set(self, metric: str, value: Optional[float]):
+        """Set a metric's value (None marks it missing)."""
+        self.values[FIELD_INDEX[metric]] = _NAN if value is None else value
+    
+    def metrics(self) -> Dict[str, float]:
+        """Return the present metrics as a dict, in FIELDS order."""
+        return {name: value for name, value in zip(FIELDS, self.values) if not math.isnan(value)}
+    
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, StockSnapshot):
+            return NotImplemented
+        return (self.slug, self.symbol, self.name, self.scraped_at, self.metrics()) == (
+            other.slug, other.symbol, other.name, other.scraped_at, other.metrics())
+    
+    def __repr__(self) -> str:
+        return f"StockSnapshot({self.slug!r}, {self.metrics()!r})"
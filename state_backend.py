@@ -0,0 +1,207 @@
+"""Pluggable key/value store for state shared between bot replicas."""
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# An update function receives the current value (None if missing) and returns (new value, result)
+Updater = Callable[[Optional[bytes]], Tuple[Optional[bytes], Any]]
+
+
+class StateBackend(ABC):
+    """
+    Byte-valued key/value store with optional TTLs and atomic updates.
+    
+    ``update`` is the building block for counters and token buckets that
+    must stay consistent when several processes use them at once. Calls
+    may block while another process holds a lock, so async code runs
+    them in a worker thread.
+    """
+    
+    # True if other processes see the same data
+    shared = True
+    
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the value of a live key, or None."""
+    
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        """Store a value, expiring after ttl seconds if given."""
+    
+    @abstractmethod
+    def delete(self, key: str):
+        """Remove a key if present."""
+    
+    @abstractmethod
+    def update(self, key: str, func: Updater, ttl: Optional[float] = None) -> Any:
+        """
+        Atomically read, transform and write a key.
+        
+        Args:
+            key: Key to update
+            func: Called with the current value (None if missing or expired);
+                returns (new value or None to delete, result to return)
+            ttl: Expiry in seconds for the new value
+            
+        Returns:
+            The result returned by func
+        """
+    
+    def close(self):
+        """Release resources."""
+
+
+class MemoryBackend(StateBackend):
+    """In-process backend; the default for a single bot instance."""
+    
+    shared = False
+    
+    def __init__(self, clock: Callable[[], float] = time.time):
+        """
+        Initialize an empty store.
+        
+        Args:
+            clock: Wall-clock time source for expiry
+        """
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> (expires_at or None, value)
+        self._data: Dict[str, Tuple[Optional[float], bytes]] = {}
+    
+    def _live(self, key: str) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] is not None and entry[0] <= self._clock():
+            del self._data[key]
+            return None
+        return entry[1]
+    
+    def _write(self, key: str, value: Optional[bytes], ttl: Optional[float]):
+        if value is None:
+            self._data.pop(key, None)
+        else:
+            self._data[key] = (self._clock() + ttl if ttl is not None else None, value)
+    
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            return self._live(key)
+    
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        with self._lock:
+            self._write(key, value, ttl)
+    
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+    
+    def update(self, key: str, func: Updater, ttl: Optional[float] = None) -> Any:
+        with self._lock:
+            value, result = func(self._live(key))
+            self._write(key, value, ttl)
+            return result
+
+
+class SQLiteBackend(StateBackend):
+    """
+    Backend in a local SQLite file, shared by every replica on the host.
+    
+    Updates run inside ``BEGIN IMMEDIATE`` transactions, so concurrent
+    processes serialize on the write lock instead of overwriting each other.
+    """
+    
+    # Expired keys are purged every this many writes
+    PURGE_INTERVAL = 500
+    
+    def __init__(self, path: str = "finsight_state.sqlite3", clock: Callable[[], float] = time.time):
+        """
+        Open (or create) the state database.
+        
+        Args:
+            path: SQLite database file
+            clock: Wall-clock time source for expiry
+        """
+        self.path = path
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._writes = 0
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS state ("
+            " key TEXT PRIMARY KEY,"
+            " value BLOB NOT NULL,"
+            " expires REAL)"
+        )
+    
+    def _read(self, key: str, now: float) -> Optional[bytes]:
+        row = self._conn.execute("SELECT value, expires FROM state WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] <= now):
+            return None
+        return row[0]
+    
+    def _write(self, key: str, value: Optional[bytes], ttl: Optional[float], now: float):
+        if value is None:
+            self._conn.execute("DELETE FROM state WHERE key = ?", (key,))
+        else:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO state (key, value, expires) VALUES (?, ?, ?)",
+                (key, value, now + ttl if ttl is not None else None),
+            )
+        self._writes += 1
+        if self._writes % self.PURGE_INTERVAL == 0:
+            self._conn.execute("DELETE FROM state WHERE expires IS NOT NULL AND expires <= ?", (now,))
+    
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            return self._read(key, self._clock())
+    
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        with self._lock:
+            self._write(key, value, ttl, self._clock())
+    
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM state WHERE key = ?", (key,))
+    
+    def update(self, key: str, func: Updater, ttl: Optional[float] = None) -> Any:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = self._clock()
+                value, result = func(self._read(key, now))
+                self._write(key, value, ttl, now)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            return result
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_backend(url: str) -> StateBackend:
+    """
+    Create a backend from a STATE_BACKEND setting.
+    
+    Args:
+        url: "memory" or "sqlite:<path>"
+        
+    Returns:
+        StateBackend
+    """
+    if not url or url == "memory":
+        return MemoryBackend()
+    if url.startswith("sqlite:"):
+        return SQLiteBackend(url[len("sqlite:"):] or "finsight_state.sqlite3")
+    raise ValueError(f"Unknown state backend '{url}' (use 'memory' or 'sqlite:<path>')")
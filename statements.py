@@ -0,0 +1,254 @@
+"""Lazy, section-level extraction of the financial statement tables on a company page."""
+import math
+import re
+import threading
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from lxml import etree
+
+from extractor import _lxml_parser, _text
+from history_store import parse_number
+
+# Statement sections of a Screener.in company page: section id -> title
+SECTIONS = {
+    "quarters": "Quarterly Results",
+    "profit-loss": "Profit & Loss",
+    "balance-sheet": "Balance Sheet",
+    "cash-flow": "Cash Flows",
+    "ratios": "Ratios",
+    "shareholding": "Shareholding Pattern",
+}
+
+# Phrases users may ask for each section with
+SECTION_ALIASES = {
+    "quarterly results": "quarters",
+    "quarterly result": "quarters",
+    "quarterly": "quarters",
+    "quarters": "quarters",
+    "results": "quarters",
+    "profit & loss": "profit-loss",
+    "profit and loss": "profit-loss",
+    "p&l": "profit-loss",
+    "pnl": "profit-loss",
+    "income statement": "profit-loss",
+    "annual results": "profit-loss",
+    "balance sheet": "balance-sheet",
+    "cash flows": "cash-flow",
+    "cash flow": "cash-flow",
+    "cashflow": "cash-flow",
+    "ratios": "ratios",
+    "shareholding pattern": "shareholding",
+    "shareholding": "shareholding",
+    "share holding": "shareholding",
+}
+_ALIASES_LONGEST_FIRST = sorted(SECTION_ALIASES, key=len, reverse=True)
+
+_SECTION_RES = {name: re.compile(rb'<section\b[^>]*\bid="' + name.encode() + rb'"') for name in SECTIONS}
+_SECTION_END = b"</section>"
+_NAN = float("nan")
+
+
+def split_section_query(text: str) -> Tuple[str, Optional[str]]:
+    """
+    Split a query like "TCS quarterly results" into the stock and the section asked for.
+    
+    Args:
+        text: User query
+        
+    Returns:
+        Tuple of (stock part, section id), with section None if the query names no section
+    """
+    query = " ".join(text.lower().split())
+    for alias in _ALIASES_LONGEST_FIRST:
+        if query.endswith(" " + alias):
+            stock = query[:-len(alias)].strip()
+        elif query.startswith(alias + " "):
+            stock = query[len(alias):].strip()
+            for word in ("of ", "for "):
+                if stock.startswith(word):
+                    stock = stock[len(word):]
+        else:
+            continue
+        if stock:
+            return stock, SECTION_ALIASES[alias]
+    return text.strip(), None
+
+
+def _row_unit(section: str, label: str, cells: List[str]) -> str:
+    """Pick the METRIC_UNITS-style unit of a statement row."""
+    if "%" in label or any(cell.endswith("%") for cell in cells):
+        return "fraction"
+    if "in rs" in label.lower():
+        return "inr"
+    if section in ("ratios", "shareholding"):
+        return "ratio"
+    return "crore"
+
+
+class FinancialTable:
+    """
+    One statement section as numbers: line items x periods.
+    
+    Values are stored row by row in an array of doubles (NaN where the page
+    has no number), in the unit of each row: crores for amounts, fractions
+    for percentages (21% -> 0.21), rupees for per-share figures and plain
+    numbers otherwise.
+    """
+    
+    __slots__ = ("section", "title", "periods", "items", "units", "values")
+    
+    def __init__(self, section: str, periods: Tuple[str, ...], items: Tuple[str, ...],
+                 units: Tuple[str, ...], values: array):
+        """
+        Create a table.
+        
+        Args:
+            section: Section id from SECTIONS
+            periods: Column headings, oldest first (e.g. "Jun 2024", "TTM")
+            items: Line item labels
+            units: Unit of each line item
+            values: len(items) * len(periods) doubles, row by row
+        """
+        self.section = section
+        self.title = SECTIONS[section]
+        self.periods = periods
+        self.items = items
+        self.units = units
+        self.values = values
+    
+    def _item_index(self, item: str) -> int:
+        wanted = item.lower()
+        for i, name in enumerate(self.items):
+            if name.lower() == wanted:
+                return i
+        raise KeyError(item)
+    
+    def row(self, item: str) -> List[Optional[float]]:
+        """Return a line item's values in period order (None where missing)."""
+        start = self._item_index(item) * len(self.periods)
+        return [None if math.isnan(v) else v for v in self.values[start:start + len(self.periods)]]
+    
+    def get(self, item: str, period: Optional[str] = None) -> Optional[float]:
+        """Return a line item's value for a period (default the latest one with a value)."""
+        values = self.row(item)
+        if period is not None:
+            return values[self.periods.index(period)]
+        return next((v for v in reversed(values) if v is not None), None)
+    
+    def unit(self, item: str) -> str:
+        """Return the unit of a line item."""
+        return self.units[self._item_index(item)]
+    
+    def to_dict(self) -> Dict[str, Dict[str, float]]:
+        """Return line item -> period -> value, leaving out missing values."""
+        return {
+            item: {period: value for period, value in zip(self.periods, self.row(item)) if value is not None}
+            for item in self.items
+        }
+    
+    def __repr__(self) -> str:
+        return f"FinancialTable({self.section!r}, {len(self.items)} items x {len(self.periods)} periods)"
+
+
+def parse_section(content: bytes, section: str) -> Optional[FinancialTable]:
+    """
+    Parse one statement section of a company page.
+    
+    Only the bytes of that section are handed to lxml, so reading one table
+    costs a small fraction of parsing the whole page.
+    
+    Args:
+        content: Raw HTML of the company page
+        section: Section id from SECTIONS
+        
+    Returns:
+        FinancialTable, or None if the page has no such table
+    """
+    match = _SECTION_RES[section].search(content)
+    if match is None:
+        return None
+    end = content.find(_SECTION_END, match.end())
+    fragment = content[match.start():end + len(_SECTION_END) if end != -1 else len(content)]
+    try:
+        root = etree.fromstring(fragment, _lxml_parser())
+    except (etree.LxmlError, ValueError):
+        return None
+    table = next(root.iter("table"), None) if root is not None else None
+    if table is None:
+        return None
+    
+    periods: Tuple[str, ...] = ()
+    items: List[str] = []
+    units: List[str] = []
+    values = array("d")
+    for tr in table.iter("tr"):
+        headings = list(tr.iter("th"))
+        if headings and not periods:
+            periods = tuple(_text(th) for th in headings[1:])
+            continue
+        cells = list(tr.iter("td"))
+        if len(cells) < 2 or not periods:
+            continue
+        # Expandable rows end their label with a "+" button
+        label = _text(cells[0]).replace("\xa0", " ").rstrip("+").strip()
+        texts = [_text(td) for td in cells[1:len(periods) + 1]]
+        texts += [""] * (len(periods) - len(texts))
+        unit = _row_unit(section, label, texts)
+        numbers = [parse_number(text, unit) for text in texts]
+        if not label or all(number is None for number in numbers):
+            continue
+        items.append(label)
+        units.append(unit)
+        values.extend(_NAN if number is None else number for number in numbers)
+    if not items:
+        return None
+    return FinancialTable(section, periods, tuple(items), tuple(units), values)
+
+
+class StatementPage:
+    """
+    A downloaded company page whose statement sections are parsed on first use.
+    
+    Keeping the page costs nothing but memory; each section is parsed the
+    first time it is asked for and memoized for as long as this page version
+    is current.
+    """
+    
+    def __init__(self, content: bytes, version: str):
+        """
+        Wrap a page.
+        
+        Args:
+            content: Raw HTML of the company page
+            version: Identifies the page's content (ETag, Last-Modified or checksum)
+        """
+        self.content = content
+        self.version = version
+        self.size = len(content)
+        self._tables: Dict[str, Optional[FinancialTable]] = {}
+        self._lock = threading.Lock()
+    
+    def section(self, section: str) -> Optional[FinancialTable]:
+        """
+        Return a statement section, parsing it on first access.
+        
+        Args:
+            section: Section id from SECTIONS
+            
+        Returns:
+            FinancialTable, or None if the page has no such table
+            
+        Raises:
+            KeyError: If section is not a SECTIONS id
+        """
+        if section not in SECTIONS:
+            raise KeyError(section)
+        with self._lock:
+            if section not in self._tables:
+                self._tables[section] = parse_section(self.content, section)
+            return self._tables[section]
+    
+    def parsed_sections(self) -> List[str]:
+        """Return the sections parsed so far."""
+        return list(self._tables)
@@ -0,0 +1,223 @@
+"""
+Precompiled stock universe for fast startup.
+
+The Screener.in links spreadsheet is compiled once into a compact JSON index
+stamped with the spreadsheet's content hash. At startup the scraper loads
+the index directly and only falls back to parsing the spreadsheet (which
+needs pandas and openpyxl) when the spreadsheet has changed.
+
+Usage:
+    python stock_universe.py build [--excel "screener links.xlsx"] [--output stock_universe.json]
+    python stock_universe.py info [--output stock_universe.json]
+"""
+import argparse
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+EXCEL_PATH = "screener links.xlsx"
+INDEX_PATH = "stock_universe.json"
+INDEX_VERSION = 2
+
+
+def file_hash(path: str) -> str:
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_excel_rows(excel_path: str) -> List[Tuple[str, str, str, Optional[str]]]:
+    """
+    Read (company name, NSE symbol, Screener link, category) rows from the spreadsheet.
+    
+    Rows without an NSE symbol are category headers (e.g. a sector name); they
+    are not returned themselves but set the category of the rows below them.
+    
+    Args:
+        excel_path: Path to the Screener.in links spreadsheet
+        
+    Returns:
+        List of row tuples
+    """
+    # pandas/openpyxl are only needed on this slow path
+    import pandas as pd
+    
+    df = pd.read_excel(excel_path)
+    
+    df = df[df['Company Name'].notna()]
+    if 'Screener.in Link (Template)' not in df.columns:
+        df = df.assign(**{'Screener.in Link (Template)': ''})
+    df = df.fillna({'Screener.in Link (Template)': ''})
+    
+    rows = []
+    category = None
+    columns = ['Company Name', 'NSE Symbol', 'Screener.in Link (Template)']
+    for name, symbol, link in df[columns].itertuples(index=False, name=None):
+        if pd.isna(symbol):
+            # Category header row
+            category = str(name).strip() or None
+            continue
+        rows.append((str(name).strip(), str(symbol).strip(), str(link).strip(), category))
+    return rows
+
+
+def compile_rows(rows: Iterable[Tuple[str, str, str, Optional[str]]]) -> Dict:
+    """
+    Compile spreadsheet rows into the compact index structure.
+    
+    Args:
+        rows: (company name, NSE symbol, Screener link, category) tuples
+        
+    Returns:
+        Dict with a list of [slug, name, symbol] stocks, a term -> stock position
+        map and a category -> stock positions map
+    """
+    stocks: List[List[str]] = []
+    positions: Dict[str, int] = {}
+    terms: Dict[str, int] = {}
+    sectors: Dict[str, List[int]] = {}
+    
+    for company_name, nse_symbol, screener_link, category in rows:
+        # Extract slug from link (format: https://www.screener.in/company/SLUG/)
+        slug = None
+        if screener_link and 'company/' in screener_link:
+            slug = screener_link.split('company/')[-1].rstrip('/')
+        elif nse_symbol:
+            slug = nse_symbol
+        
+        if not slug:
+            continue
+        
+        if slug not in positions:
+            positions[slug] = len(stocks)
+            stocks.append([slug, company_name, nse_symbol])
+        position = positions[slug]
+        if category and position not in sectors.setdefault(category, []):
+            sectors[category].append(position)
+        
+        # Create searchable terms
+        search_terms = [
+            company_name.lower(),
+            nse_symbol.lower(),
+            # Add partial matches for common names
+            company_name.split()[0].lower() if company_name else None,
+        ]
+        
+        for term in search_terms:
+            if term:
+                # Store with original query format
+                terms[term] = position
+                # Also store without common suffixes
+                if term.endswith(' ltd.') or term.endswith(' ltd'):
+                    terms[term.replace(' ltd.', '').replace(' ltd', '')] = position
+                if term.endswith(' limited'):
+                    terms[term.replace(' limited', '')] = position
+    
+    return {"stocks": stocks, "terms": terms, "sectors": sectors}
+
+
+def build_index(excel_path: str = EXCEL_PATH, index_path: str = INDEX_PATH) -> Dict:
+    """
+    Compile the spreadsheet and write the JSON index.
+    
+    Args:
+        excel_path: Path to the Screener.in links spreadsheet
+        index_path: Where to write the compiled index
+        
+    Returns:
+        The compiled index
+    """
+    index = compile_rows(read_excel_rows(excel_path))
+    index["version"] = INDEX_VERSION
+    index["source"] = os.path.basename(excel_path)
+    index["source_hash"] = file_hash(excel_path)
+    
+    tmp_path = f"{index_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, index_path)
+    return index
+
+
+def read_index(index_path: str = INDEX_PATH) -> Optional[Dict]:
+    """Read a compiled index, or None if missing, unreadable or from another version."""
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if index.get("version") != INDEX_VERSION:
+        return None
+    return index
+
+
+def index_to_universe(index: Dict) -> Tuple[Dict[str, Dict[str, str]], Dict[str, List[Dict[str, str]]]]:
+    """Expand a compiled index into the query term -> stock info mapping and sector groups."""
+    stocks = [{'slug': slug, 'name': name, 'symbol': symbol} for slug, name, symbol in index["stocks"]]
+    mapping = {term: stocks[position] for term, position in index["terms"].items()}
+    sectors = {name: [stocks[p] for p in members] for name, members in index.get("sectors", {}).items()}
+    return mapping, sectors
+
+
+def load_universe(excel_path: str = EXCEL_PATH, index_path: str = INDEX_PATH
+                  ) -> Tuple[Dict[str, Dict[str, str]], Dict[str, List[Dict[str, str]]], str]:
+    """
+    Load the stock mapping and sector groups, preferring the compiled index.
+    
+    The index is used when its source hash matches the spreadsheet (or when
+    the spreadsheet is absent). Otherwise the spreadsheet is parsed and the
+    index rebuilt.
+    
+    Args:
+        excel_path: Path to the Screener.in links spreadsheet
+        index_path: Path to the compiled index
+        
+    Returns:
+        Tuple of (mapping, sectors, description of where it came from)
+    """
+    index = read_index(index_path)
+    excel_exists = os.path.exists(excel_path)
+    
+    if index is not None and (not excel_exists or index.get("source_hash") == file_hash(excel_path)):
+        return (*index_to_universe(index), "compiled index")
+    
+    if not excel_exists:
+        return {}, {}, "nothing"
+    
+    try:
+        index = build_index(excel_path, index_path)
+    except OSError:
+        # Read-only deployments still work, they just parse the spreadsheet each boot
+        index = compile_rows(read_excel_rows(excel_path))
+    return (*index_to_universe(index), "Excel file")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile the Screener.in links spreadsheet into a fast index.")
+    parser.add_argument("command", choices=["build", "info"])
+    parser.add_argument("--excel", default=EXCEL_PATH, help="Spreadsheet to compile")
+    parser.add_argument("--output", default=INDEX_PATH, help="Compiled index path")
+    args = parser.parse_args()
+    
+    if args.command == "build":
+        index = build_index(args.excel, args.output)
+        print(f"Compiled {len(index['stocks'])} stocks ({len(index['terms'])} search terms, "
+              f"{len(index['sectors'])} sectors) into {args.output}")
+        return
+    
+    index = read_index(args.output)
+    if index is None:
+        print(f"No compiled index at {args.output}")
+        return
+    stale = os.path.exists(args.excel) and index.get("source_hash") != file_hash(args.excel)
+    print(f"{args.output}: {len(index['stocks'])} stocks, {len(index['terms'])} search terms, "
+          f"{len(index['sectors'])} sectors")
+    print(f"Source: {index.get('source')} ({index.get('source_hash', '')[:12]}){' - STALE, rebuild needed' if stale else ''}")
+
+
+if __name__ == "__main__":
+    main()
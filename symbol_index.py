@@ -0,0 +1,249 @@
+"""Indexed stock symbol resolver with prefix and typo-tolerant lookups."""
+import heapq
+import re
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+_WHITESPACE_RE = re.compile(r"\s+")
+_SUFFIXES = (" limited", " ltd.", " ltd")
+
+
+def normalize_term(text: str) -> str:
+    """Lower-case, collapse whitespace and drop company suffixes like 'Ltd'."""
+    term = _WHITESPACE_RE.sub(" ", text.lower()).strip().rstrip(".")
+    for suffix in _SUFFIXES:
+        if term.endswith(suffix):
+            term = term[: -len(suffix)].rstrip()
+    return term
+
+
+def compact_term(text: str) -> str:
+    """Strip everything but letters and digits ('HDFC Bank' -> 'hdfcbank')."""
+    return _NON_ALNUM_RE.sub("", text.lower())
+
+
+def trigrams(term: str) -> set:
+    """Return the padded character trigrams of a term."""
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """
+    Levenshtein distance between two strings, capped at max_distance + 1.
+    
+    Args:
+        a: First string
+        b: Second string
+        max_distance: Distance beyond which the exact value is not needed
+        
+    Returns:
+        Edit distance, or max_distance + 1 if it is larger
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+class SymbolResolver:
+    """
+    Resolve free-text stock queries to stocks using precomputed indexes.
+    
+    Lookups go exact term -> query words -> prefix (sorted array + bisect) ->
+    trigram candidates re-ranked by edit distance, so cost depends on the
+    query rather than the size of the universe.
+    """
+    
+    MIN_PREFIX_LENGTH = 2
+    MAX_PREFIX_SCAN = 64
+    MAX_TRIGRAM_CANDIDATES = 48
+    MAX_FUZZY_CANDIDATES = 8
+    # A fuzzy/prefix best match is only trusted above this score and margin
+    CONFIDENT_SCORE = 0.8
+    CONFIDENT_MARGIN = 0.08
+    
+    def __init__(self, mapping: Dict[str, Dict[str, str]]):
+        """
+        Build the indexes.
+        
+        Args:
+            mapping: Query term -> stock info (slug, name, symbol), as loaded by ScreenerScraper
+        """
+        self.stocks: List[Dict[str, str]] = []
+        slug_ids: Dict[str, int] = {}
+        exact: Dict[str, int] = {}
+        terms: Dict[str, int] = {}
+        
+        for stock_info in mapping.values():
+            if stock_info["slug"] not in slug_ids:
+                slug_ids[stock_info["slug"]] = len(self.stocks)
+                self.stocks.append(stock_info)
+        
+        # Derived aliases such as a bare first word ("tata") are ambiguous when
+        # several companies share them, so they are left out; the full names
+        # still match them by prefix
+        first_words = Counter(normalize_term(s["name"]).split(" ")[0] for s in self.stocks)
+        
+        def add_term(term: str, stock_id: int, alias: bool):
+            for variant in (normalize_term(term), compact_term(term)):
+                if not variant:
+                    continue
+                if alias and first_words[variant] > 1:
+                    continue
+                terms.setdefault(variant, stock_id)
+                exact.setdefault(variant, stock_id)
+        
+        # Symbols and names first so they win over derived aliases on collisions
+        for stock_id, stock_info in enumerate(self.stocks):
+            add_term(stock_info["symbol"], stock_id, alias=False)
+            add_term(stock_info["name"], stock_id, alias=False)
+        for term, stock_info in mapping.items():
+            add_term(term, slug_ids[stock_info["slug"]], alias=True)
+        
+        self._exact = exact
+        self._sorted_terms = sorted(terms)
+        self._sorted_ids = [terms[t] for t in self._sorted_terms]
+        
+        # The trigram index is only needed for fuzzy lookups, so it is built on
+        # first use to keep startup fast for large universes
+        self._trigram_postings: Optional[Dict[str, List[int]]] = None
+        self._term_trigram_counts: List[int] = []
+    
+    def _build_trigram_index(self):
+        postings: Dict[str, List[int]] = defaultdict(list)
+        counts: List[int] = []
+        for position, term in enumerate(self._sorted_terms):
+            grams = trigrams(term)
+            counts.append(len(grams))
+            for gram in grams:
+                postings[gram].append(position)
+        self._term_trigram_counts = counts
+        self._trigram_postings = postings
+    
+    def __len__(self) -> int:
+        return len(self.stocks)
+    
+    def _prefix_matches(self, query: str) -> Dict[int, float]:
+        scores: Dict[int, float] = {}
+        if len(query) < self.MIN_PREFIX_LENGTH:
+            return scores
+        start = bisect_left(self._sorted_terms, query)
+        end = min(len(self._sorted_terms), start + self.MAX_PREFIX_SCAN)
+        for position in range(start, end):
+            term = self._sorted_terms[position]
+            if not term.startswith(query):
+                break
+            # Longer completions of the same prefix are weaker matches
+            score = 0.7 + 0.25 * len(query) / len(term)
+            stock_id = self._sorted_ids[position]
+            if score > scores.get(stock_id, 0.0):
+                scores[stock_id] = score
+        return scores
+    
+    def _fuzzy_matches(self, query: str) -> Dict[int, float]:
+        scores: Dict[int, float] = {}
+        if self._trigram_postings is None:
+            self._build_trigram_index()
+        query_grams = trigrams(query)
+        shared: Counter = Counter()
+        for gram in query_grams:
+            postings = self._trigram_postings.get(gram)
+            if postings:
+                shared.update(postings)
+        if not shared:
+            return scores
+        
+        # Shared trigram counts pick candidates, the Dice coefficient ranks them
+        # and edit distance rescues short typos that break many trigrams
+        gram_count = len(query_grams)
+        counts = self._term_trigram_counts
+        candidates = [
+            (2 * count / (gram_count + counts[position]), position)
+            for position, count in shared.most_common(self.MAX_TRIGRAM_CANDIDATES)
+        ]
+        max_distance = max(1, len(query) // 4)
+        for rank, (dice, position) in enumerate(heapq.nlargest(self.MAX_FUZZY_CANDIDATES * 2, candidates)):
+            score = dice
+            if rank < self.MAX_FUZZY_CANDIDATES:
+                term = self._sorted_terms[position]
+                distance = edit_distance(query, term, max_distance)
+                if distance <= max_distance:
+                    score = max(score, 1 - distance / max(len(query), len(term)))
+            # Only an exact match scores 1.0
+            score = min(score, 0.99)
+            stock_id = self._sorted_ids[position]
+            if score > scores.get(stock_id, 0.0):
+                scores[stock_id] = score
+        return scores
+    
+    def suggest(self, query: str, limit: int = 5) -> List[Tuple[Dict[str, str], float]]:
+        """
+        Return the best matching stocks for a query, highest score first.
+        
+        Args:
+            query: Stock name or symbol, possibly partial or misspelt
+            limit: Maximum number of suggestions
+            
+        Returns:
+            List of (stock info, score in [0, 1]) tuples
+        """
+        term = normalize_term(query)
+        if not term:
+            return []
+        
+        scores: Dict[int, float] = {}
+        for candidate in (term, compact_term(term)):
+            stock_id = self._exact.get(candidate)
+            if stock_id is not None:
+                scores[stock_id] = 1.0
+        for matches in (self._prefix_matches(term), self._fuzzy_matches(term)):
+            for stock_id, score in matches.items():
+                if score > scores.get(stock_id, 0.0):
+                    scores[stock_id] = score
+        
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [(self.stocks[stock_id], round(score, 3)) for stock_id, score in ranked]
+    
+    def resolve(self, query: str) -> Optional[Dict[str, str]]:
+        """
+        Resolve a query to a single stock, or None when the match is ambiguous.
+        
+        Args:
+            query: Stock name or symbol (e.g., "reliance", "tcs share price", "infosis")
+            
+        Returns:
+            Stock info dict with slug, name, symbol if confidently found, None otherwise
+        """
+        term = normalize_term(query)
+        if not term:
+            return None
+        stock_id = self._exact.get(term)
+        if stock_id is None:
+            stock_id = self._exact.get(compact_term(term))
+        if stock_id is not None:
+            return self.stocks[stock_id]
+        
+        # A known symbol or name inside a longer query, e.g. "tcs share price"
+        words = term.split()
+        for size in range(min(3, len(words)), 0, -1):
+            for i in range(len(words) - size + 1):
+                phrase = " ".join(words[i:i + size])
+                if len(phrase) >= self.MIN_PREFIX_LENGTH and phrase in self._exact:
+                    return self.stocks[self._exact[phrase]]
+        
+        suggestions = self.suggest(term, limit=2)
+        if not suggestions or suggestions[0][1] < self.CONFIDENT_SCORE:
+            return None
+        if len(suggestions) > 1 and suggestions[0][1] - suggestions[1][1] < self.CONFIDENT_MARGIN:
+            return None
+        return suggestions[0][0]
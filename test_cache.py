@@ -0,0 +1,50 @@
+"""Regression tests for coalescing concurrent calls."""
+import asyncio
+
+from cache import SingleFlight
+
+
+def test_call_is_cancelled_with_its_last_caller():
+    """Cancelling one of two callers keeps the call; cancelling both stops it."""
+    cancelled = []
+    
+    async def fetch():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+    
+    async def main():
+        flight = SingleFlight()
+        first = asyncio.ensure_future(flight.run("tcs", fetch))
+        second = asyncio.ensure_future(flight.run("tcs", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0.01)
+        assert not cancelled and flight.in_flight("tcs")
+        second.cancel()
+        await asyncio.sleep(0.01)
+        assert cancelled and not flight.in_flight("tcs")
+    
+    asyncio.run(main())
+
+
+def test_new_caller_does_not_attach_to_a_cancelled_call():
+    """A caller arriving just after the last one was cancelled starts a fresh call."""
+    calls = []
+    
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01 if len(calls) > 1 else 10)
+        return len(calls)
+    
+    async def main():
+        flight = SingleFlight()
+        first = asyncio.ensure_future(flight.run("tcs", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        return await flight.run("tcs", fetch)
+    
+    assert asyncio.run(main()) == 2
@@ -0,0 +1,29 @@
+"""Tests for the insight cache key."""
+from insight_cache import insight_key
+
+PAGE = """Company Name: Reliance Industries Ltd
+Current Price: ₹{price}
+Market Cap: ₹ {market_cap} Cr.
+P/E: {pe}
+High / Low: ₹ 3,218 / 2,221
+ROE: {roe}%"""
+
+
+def key(price="2,456.30", market_cap="16,61,234", pe="24.1", roe="8.9"):
+    data = PAGE.format(price=price, market_cap=market_cap, pe=pe, roe=roe)
+    return insight_key("gemini", "v1", data)
+
+
+def test_scrapes_a_tick_apart_share_a_key():
+    assert key() == key(price="2,461.05", market_cap="16,64,432", pe="24.2")
+
+
+def test_key_ignores_order_and_spacing():
+    reordered = "\n".join(reversed(PAGE.splitlines())).replace(": ", ":   ")
+    data = reordered.format(price="2,456.30", market_cap="16,61,234", pe="24.1", roe="8.9")
+    assert insight_key("gemini", "v1", data) == key()
+
+
+def test_key_changes_with_fundamentals_and_large_moves():
+    assert key(roe="9.4") != key()
+    assert key(price="2,756.30", market_cap="18,64,432", pe="27.0") != key()
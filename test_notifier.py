@@ -0,0 +1,54 @@
+"""Regression tests for the Telegram send queue."""
+import asyncio
+
+from telegram.error import RetryAfter
+
+from notifier import BatchedSender
+
+
+def test_call_is_retried_after_retry_after():
+    """A call re-queued after RetryAfter is made even when nothing else is sent."""
+    attempts = []
+    
+    async def request():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RetryAfter(0)
+        return "sent"
+    
+    async def main():
+        sender = BatchedSender(lambda chat_id, text: asyncio.sleep(0))
+        sender.start()
+        try:
+            return await asyncio.wait_for(sender.call(1, request), timeout=5)
+        finally:
+            await sender.stop()
+    
+    assert asyncio.run(main()) == "sent"
+    assert len(attempts) == 2
+
+
+def test_notification_is_retried_after_retry_after():
+    """A notification put back after RetryAfter is delivered without other traffic."""
+    delivered = []
+    
+    async def send(chat_id, text):
+        if not delivered and not getattr(send, "failed", False):
+            send.failed = True
+            raise RetryAfter(0)
+        delivered.append((chat_id, text))
+    
+    async def main():
+        sender = BatchedSender(send, chat_interval=0)
+        sender.start()
+        sender.submit(1, "alert")
+        try:
+            for _ in range(100):
+                if delivered:
+                    break
+                await asyncio.sleep(0.05)
+        finally:
+            await sender.stop()
+    
+    asyncio.run(main())
+    assert delivered == [(1, "alert")]
@@ -0,0 +1,176 @@
+"""Tests for the Gemini request scheduler, driven by a fake clock."""
+import asyncio
+
+from rate_limiter import Priority, RequestScheduler, TokenBucket
+
+
+class FakeClock:
+    """Monotonic clock that only moves when the scheduler sleeps."""
+    
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self) -> float:
+        return self.now
+    
+    async def sleep(self, seconds: float):
+        self.now += seconds
+        await asyncio.sleep(0)
+
+
+def make_scheduler(clock: FakeClock, **kwargs) -> RequestScheduler:
+    return RequestScheduler(clock=clock, sleep=clock.sleep, **kwargs)
+
+
+async def grant_times(scheduler, clock, requests):
+    """Queue (chat_id, priority) requests together; return (granted, seconds from start) for each."""
+    start = clock.now
+    
+    async def one(chat_id, priority):
+        granted = await scheduler.acquire(chat_id, priority)
+        return granted, round(clock.now - start, 6)
+    
+    try:
+        return await asyncio.gather(*(one(chat_id, priority) for chat_id, priority in requests))
+    finally:
+        scheduler.close()
+
+
+def test_token_bucket_refills_with_the_clock():
+    clock = FakeClock()
+    bucket = TokenBucket(2, 60.0, clock)
+    bucket.take()
+    bucket.take()
+    assert round(bucket.time_until(), 6) == 30.0
+    clock.now += 15
+    assert round(bucket.available(), 6) == 0.5
+    bucket.drain(hold=100)
+    assert bucket.time_until() == 100.0
+
+
+def test_per_minute_quota_spaces_out_requests():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, requests_per_minute=2, max_wait=120)
+    results = asyncio.run(grant_times(scheduler, clock, [(1, Priority.INTERACTIVE)] * 4))
+    assert results == [(True, 0.0), (True, 0.0), (True, 30.0), (True, 60.0)]
+    assert scheduler.granted == 4
+
+
+def test_exhausted_daily_quota_fails_requests_at_once():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, requests_per_day=2)
+    results = asyncio.run(grant_times(scheduler, clock, [(1, Priority.INTERACTIVE)] * 3))
+    # The next daily token is 12 hours away, far past the 30s maximum wait
+    assert results == [(True, 0.0), (True, 0.0), (False, 0.0)]
+    assert scheduler.shed == 1
+
+
+def test_chats_take_turns_within_a_priority():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, requests_per_minute=1, max_wait=600)
+    order = []
+    
+    async def one(chat_id):
+        await scheduler.acquire(chat_id, Priority.BATCH)
+        order.append(chat_id)
+    
+    async def main():
+        try:
+            await asyncio.gather(one("a"), one("a"), one("a"), one("b"), one("c"))
+        finally:
+            scheduler.close()
+    
+    asyncio.run(main())
+    assert order == ["a", "b", "c", "a", "a"]
+
+
+def test_higher_priority_is_granted_first():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, requests_per_minute=1, max_wait=600, max_background_wait=600)
+    results = asyncio.run(grant_times(scheduler, clock, [
+        (1, Priority.BACKGROUND), (2, Priority.BACKGROUND), (3, Priority.BATCH), (4, Priority.INTERACTIVE),
+    ]))
+    assert results == [(True, 120.0), (True, 180.0), (True, 60.0), (True, 0.0)]
+
+
+def test_background_is_shed_to_keep_the_daily_reserve():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, requests_per_day=10, background_reserve=9)
+    
+    async def main():
+        try:
+            return [
+                await scheduler.acquire(1, Priority.BACKGROUND),
+                await scheduler.acquire(1, Priority.BACKGROUND),
+                await scheduler.acquire(1, Priority.INTERACTIVE),
+            ]
+        finally:
+            scheduler.close()
+    
+    assert asyncio.run(main()) == [True, False, True]
+    assert scheduler.shed == 1
+
+
+def test_background_expecting_a_long_wait_is_shed():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, requests_per_minute=1, max_wait=600, max_background_wait=90)
+    results = asyncio.run(grant_times(scheduler, clock, [
+        (1, Priority.INTERACTIVE), (2, Priority.INTERACTIVE), (3, Priority.BACKGROUND),
+    ]))
+    # Behind one queued interactive request the background one would wait 120s
+    assert results == [(True, 0.0), (True, 60.0), (False, 0.0)]
+
+
+def test_estimate_wait_matches_the_actual_wait():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, requests_per_minute=6, max_wait=600)
+    
+    async def main():
+        for _ in range(6):
+            await scheduler.acquire("a")
+        assert await scheduler.estimate_wait("c") == 10.0
+        start = clock.now
+        queued = [asyncio.ensure_future(scheduler.acquire("b")) for _ in range(2)]
+        await asyncio.sleep(0)
+        # One of b's requests is served before c's turn comes round
+        estimate = await scheduler.estimate_wait("c")
+        await scheduler.acquire("c")
+        waited = round(clock.now - start, 6)
+        await asyncio.gather(*queued)
+        scheduler.close()
+        return estimate, waited
+    
+    estimate, waited = asyncio.run(main())
+    assert round(estimate, 6) == waited == 20.0
+
+
+def test_queued_request_expires_at_its_deadline():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, requests_per_minute=2, max_wait=40)
+    results = asyncio.run(grant_times(scheduler, clock, [(1, Priority.INTERACTIVE)] * 4))
+    # The fourth request's turn (60s) is past its 40s deadline; it fails once the third is granted
+    assert results == [(True, 0.0), (True, 0.0), (True, 30.0), (False, 30.0)]
+
+
+def test_reported_quota_exhaustion_fails_queued_requests():
+    clock = FakeClock()
+    
+    async def never(seconds):
+        await asyncio.Event().wait()
+    
+    # Only the report can settle the queued request, since the dispatcher's sleeps never end
+    scheduler = RequestScheduler(requests_per_minute=2, max_wait=50, clock=clock, sleep=never)
+    
+    async def main():
+        try:
+            await scheduler.acquire(1)
+            await scheduler.acquire(1)
+            queued = asyncio.ensure_future(scheduler.acquire(2))
+            await asyncio.sleep(0)
+            # The next daily token is about 58s away, past the 50s deadline
+            await scheduler.report_quota_exhausted()
+            return await asyncio.wait_for(queued, timeout=5)
+        finally:
+            scheduler.close()
+    
+    assert asyncio.run(main()) is False